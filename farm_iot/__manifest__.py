@@ -10,13 +10,16 @@
         - Storage Environment Monitoring and Alerts [US-14-06]
     """,
     'author': 'Jeffery',
-    'depends': ['farm_core', 'project', 'industrial_iot'],
+    'depends': ['farm_core', 'farm_breeding', 'farm_equipment', 'farm_waste_mgmt', 'project', 'industrial_iot'],
     'data': [
         'security/ir.model.access.csv',
         'data/iot_cron_data.xml',
         'views/iot_mapping_views.xml',
         'views/farm_telemetry_views.xml',
         'views/farm_automation_views.xml',
+        'views/farm_telemetry_rollup_views.xml',
+        'views/farm_telemetry_retention_views.xml',
+        'views/farm_telemetry_import_views.xml',
         'views/storage_env_views.xml',
         'views/iiot_device_views.xml',
     ],
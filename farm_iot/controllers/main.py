@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import logging
+from odoo import http
+from odoo.http import request
+
+_logger = logging.getLogger(__name__)
+
+
+class FarmIotController(http.Controller):
+    """HTTP controllers used by the MQTT bridge for edge automation"""
+
+    @http.route('/farm/automation/ruleset', type='json', auth='public', methods=['POST'], csrf=False)
+    def automation_ruleset(self, **post):
+        """
+        Compiled edge automation rules
+        Expected payload: {"version": "<version the bridge already has>"}
+        The rules are only returned when the bridge's version is outdated.
+        """
+        try:
+            data = request.jsonrequest or {}
+            ruleset = request.env['farm.automation.rule'].sudo().get_edge_ruleset()
+
+            if data.get('version') == ruleset['version']:
+                return {
+                    'status': 'success',
+                    'version': ruleset['version'],
+                    'changed': False
+                }
+
+            return {
+                'status': 'success',
+                'version': ruleset['version'],
+                'changed': True,
+                'rules': ruleset['rules']
+            }
+
+        except Exception as e:
+            _logger.error(f"Error in automation ruleset endpoint: {str(e)}")
+            return {
+                'error': str(e),
+                'status': 'error'
+            }
+
+    @http.route('/farm/automation/triggers', type='json', auth='public', methods=['POST'], csrf=False)
+    def automation_triggers(self, **post):
+        """
+        Rules fired by the MQTT bridge
+        Expected payload: {"triggers": [{"rule_id": 1, "command_id": "...", "source_device_id": "do_01",
+                                         "sensor_type": "dissolved_oxygen", "value": 3.5}]}
+        """
+        try:
+            data = request.jsonrequest or {}
+            triggers = data.get('triggers') or []
+
+            if not isinstance(triggers, list):
+                return {
+                    'error': 'Triggers must be a JSON array',
+                    'status': 'error'
+                }
+
+            recorded = request.env['farm.automation.rule'].sudo().record_edge_triggers(triggers)
+
+            _logger.info(f"Automation triggers received: {len(triggers)} triggers, {recorded} recorded")
+            return {
+                'status': 'success',
+                'recorded': recorded
+            }
+
+        except Exception as e:
+            _logger.error(f"Error in automation triggers endpoint: {str(e)}")
+            return {
+                'error': str(e),
+                'status': 'error'
+            }
@@ -1,5 +1,8 @@
 from . import iiot_device
 from . import farm_telemetry
-from . import farm_automation
+from . import farm_telemetry_rollup
+from . import farm_telemetry_retention
+from . import farm_automation_rule
+from . import farm_command_log
 from . import farm_iot_mapping
 from . import iot_telemetry_buffer
\ No newline at end of file
@@ -1,4 +1,27 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import timedelta
+import hashlib
+import json
+import logging
+import requests
+
+_logger = logging.getLogger(__name__)
+
+# 规则索引条目, 每个工作进程缓存一份
+RuleEntry = namedtuple('RuleEntry', [
+    'id', 'name', 'operator', 'threshold', 'rearm_at', 'debounce', 'evaluation',
+    'target_device_id', 'command', 'params',
+])
+# 按传感器类型与比较符的有序索引: 触发阈值与重新布防点各自排序
+RuleIndex = namedtuple('RuleIndex', ['thresholds', 'by_threshold', 'rearm_points', 'by_rearm'])
+
+# 影响规则索引的字段
+INDEX_FIELDS = (
+    'active', 'sensor_type', 'operator', 'threshold', 'hysteresis', 'debounce_seconds',
+    'evaluation', 'target_device_id', 'command_to_send', 'command_params',
+)
 
 class FarmAutomationRule(models.Model):
     _name = 'farm.automation.rule'
@@ -6,46 +29,297 @@ class FarmAutomationRule(models.Model):
 
     name = fields.Char("Rule Name", required=True)
     active = fields.Boolean(default=True)
-    
+
     sensor_type = fields.Selection([
         ('temperature', 'Temperature'),
         ('ph', 'pH Level'),
         ('dissolved_oxygen', 'Dissolved Oxygen'),
     ], string="Trigger Sensor", required=True)
-    
+
     operator = fields.Selection([
         ('<', 'Less Than'),
         ('>', 'Greater Than')
     ], string="Operator", default='<', required=True)
-    
+
     threshold = fields.Float("Threshold", required=True)
-    
+
     target_device_id = fields.Many2one('iiot.device', string="Action Device", required=True)
     command_to_send = fields.Char("Command/Action", default='power_on', required=True)
     command_params = fields.Char("Params (JSON)", default='{"state": "on"}')
 
+    # 迟滞与去抖: 触发后需读数回到阈值另一侧 (加迟滞量) 才重新布防,
+    # 且两次触发至少间隔去抖时间, 避免泵随每个采样反复启停
+    hysteresis = fields.Float("Hysteresis", default=0.0,
+                              help="Once fired, the rule fires again only after the reading went back past "
+                                   "the threshold by this amount")
+    debounce_seconds = fields.Integer("Debounce (s)", default=0,
+                                      help="Minimum time between two firings of the rule")
+    armed = fields.Boolean("Armed", default=True, readonly=True, copy=False)
+    last_triggered = fields.Datetime("Last Triggered", readonly=True, copy=False)
+
+    # 边缘执行 [US-06-02]：规则下发到 MQTT 桥接服务，在遥测到达时毫秒级触发
+    evaluation = fields.Selection([
+        ('edge', 'On the MQTT Bridge'),
+        ('odoo', 'In Odoo')
+    ], string="Evaluated", default='edge', required=True,
+        help="Edge rules are compiled into the ruleset of the MQTT bridge, which checks every device "
+             "reading and publishes the command itself. Telemetry from devices is then not checked "
+             "again in Odoo; manually recorded telemetry still is.")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        rules = super().create(vals_list)
+        rules._notify_bridge()
+        self.env.registry.clear_cache()
+        return rules
+
+    def write(self, vals):
+        if any(field in vals for field in ('sensor_type', 'operator', 'threshold', 'hysteresis')):
+            # 条件改变后重新布防
+            vals = dict(vals, armed=True)
+        res = super().write(vals)
+        self._notify_bridge()
+        if any(field in vals for field in INDEX_FIELDS):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        self._notify_bridge()
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    def _notify_bridge(self):
+        """ 提交后通知桥接服务重新拉取规则集 """
+        mqtt_bridge_url = self.env['ir.config_parameter'].sudo().get_param('iiot.mqtt_bridge_url')
+        if not mqtt_bridge_url:
+            return
+
+        @self.env.cr.postcommit.add
+        def refresh_bridge_ruleset():
+            # Best effort: the bridge also polls the ruleset version periodically
+            try:
+                requests.post(f"{mqtt_bridge_url}/api/v1/automation/refresh", timeout=2)
+            except Exception as e:
+                _logger.warning(f"Could not notify the MQTT bridge of automation rule changes: {str(e)}")
+
+    def _compile_edge_rule(self):
+        """ 编译为桥接服务可直接执行的规则：比较条件 + 已渲染的指令 """
+        self.ensure_one()
+        params = json.loads(self.command_params or '{}')
+        topic, payload = self.target_device_id._prepare_command(self.command_to_send, params)
+        return {
+            'id': self.id,
+            'sensor_type': self.sensor_type,
+            'operator': self.operator,
+            'threshold': self.threshold,
+            'device_id': self.target_device_id.device_id,
+            'action': self.command_to_send,
+            'params': params,
+            'topic': topic,
+            'payload': payload,
+        }
+
+    @api.model
+    def get_edge_ruleset(self):
+        """
+        Compile the active edge rules for the MQTT bridge.
+        The version is a digest of the compiled rules, so it changes whenever a rule,
+        its target device or the device's command template changes.
+        """
+        compiled = []
+        for rule in self.search([('evaluation', '=', 'edge')], order='id'):
+            try:
+                compiled.append(rule._compile_edge_rule())
+            except Exception as e:
+                _logger.error(f"Automation rule {rule.id} cannot be compiled for the MQTT bridge: {str(e)}")
+
+        version = hashlib.sha1(json.dumps(compiled, sort_keys=True).encode()).hexdigest()
+        return {'version': version, 'rules': compiled}
+
+    @api.model
+    def record_edge_triggers(self, triggers):
+        """
+        Record rules fired by the MQTT bridge in the command audit log.
+        The command_id of each trigger is the one the bridge published, so the
+        device acknowledgement later completes the same log.
+        Returns the number of logs created.
+        """
+        triggers = [t for t in triggers if isinstance(t, dict) and t.get('rule_id') and t.get('command_id')]
+        rules = self.with_context(active_test=False).browse({t['rule_id'] for t in triggers}).exists()
+        rules_by_id = {rule.id: rule for rule in rules}
+
+        already_logged = set(self.env['farm.command.log'].search([
+            ('command_id', 'in', [t['command_id'] for t in triggers])
+        ]).mapped('command_id'))
+
+        vals_list = []
+        for trigger in triggers:
+            rule = rules_by_id.get(trigger['rule_id'])
+            if not rule or trigger['command_id'] in already_logged:
+                continue
+            already_logged.add(trigger['command_id'])
+            vals_list.append({
+                'device_id': rule.target_device_id.id,
+                'command': rule.command_to_send,
+                'params': rule.command_params,
+                'command_id': trigger['command_id'],
+                'status': 'sent',
+                'user_id': False,
+            })
+            _logger.info(f"AUTOMATION: Rule '{rule.name}' fired on the MQTT bridge: {rule.sensor_type} of "
+                         f"{trigger.get('source_device_id')} was {trigger.get('value')} {rule.operator} {rule.threshold}")
+
+        self.env['farm.command.log'].create(vals_list)
+        self.env['iiot.device'].browse({vals['device_id'] for vals in vals_list}).write({
+            'last_command': fields.Datetime.now()
+        })
+        return len(vals_list)
+
+    @api.model
+    @tools.ormcache()
+    def _get_rule_index(self):
+        """
+        启用规则的索引: {(传感器类型, 比较符): RuleIndex}.
+        '<' 规则在读数低于阈值时触发, 读数不低于 阈值+迟滞 时重新布防; '>' 规则相反.
+        """
+        entries = {}
+        for rule in self.sudo().search([]):
+            if rule.operator == '<':
+                rearm_at = rule.threshold + rule.hysteresis
+            else:
+                rearm_at = rule.threshold - rule.hysteresis
+            entries.setdefault((rule.sensor_type, rule.operator), []).append(RuleEntry(
+                rule.id, rule.name, rule.operator, rule.threshold, rearm_at, rule.debounce_seconds,
+                rule.evaluation, rule.target_device_id.id, rule.command_to_send, rule.command_params,
+            ))
+        index = {}
+        for key, rules in entries.items():
+            by_threshold = tuple(sorted(rules, key=lambda entry: entry.threshold))
+            by_rearm = tuple(sorted(rules, key=lambda entry: entry.rearm_at))
+            index[key] = RuleIndex(
+                tuple(entry.threshold for entry in by_threshold), by_threshold,
+                tuple(entry.rearm_at for entry in by_rearm), by_rearm,
+            )
+        return index
+
+    @api.model
+    def _match_reading(self, sensor_type, value):
+        """ 二分查找读数触发与重新布防的规则, 返回 (触发的规则, 重新布防的规则) """
+        index = self._get_rule_index()
+        fired, rearmed = [], []
+        below = index.get((sensor_type, '<'))
+        if below:
+            fired += below.by_threshold[bisect_right(below.thresholds, value):]
+            rearmed += below.by_rearm[:bisect_right(below.rearm_points, value)]
+        above = index.get((sensor_type, '>'))
+        if above:
+            fired += above.by_threshold[:bisect_left(above.thresholds, value)]
+            rearmed += above.by_rearm[bisect_left(above.rearm_points, value):]
+        return fired, rearmed
+
+    @api.model
+    def _evaluate_telemetry(self, telemetries):
+        """
+        批量判定一批遥测: 按时间顺序用规则索引匹配, 模拟每条规则的布防状态与去抖,
+        只写回状态改变的规则. 每个目标设备每批只下发一次指令 (最新读数触发的那条).
+        Returns the rules fired.
+        """
+        events = []
+        for telemetry in telemetries.sorted(lambda t: (t.timestamp, t.id)):
+            fired, rearmed = self._match_reading(telemetry.sensor_type, telemetry.value)
+            # 设备遥测已由桥接服务在边缘判定
+            if telemetry.device_id:
+                fired = [entry for entry in fired if entry.evaluation != 'edge']
+            if fired or rearmed:
+                events.append((telemetry, fired, rearmed))
+        if not events:
+            return self.browse()
+
+        # 不加锁读取规则状态: 多数读数只确认已有状态 (已布防的规则重新布防, 未布防的规则再次越限)
+        rule_ids = sorted({entry.id for event in events for entry in event[1] + event[2]})
+        self.env.cr.execute("""
+            SELECT id, armed, last_triggered FROM farm_automation_rule WHERE id = ANY(%s)
+        """, [rule_ids])
+        state = {rule_id: [armed, last_triggered] for rule_id, armed, last_triggered in self.env.cr.fetchall()}
+        initial = {rule_id: tuple(values) for rule_id, values in state.items()}
+
+        firings = []
+        for telemetry, fired, rearmed in events:
+            for entry in rearmed:
+                if entry.id in state:
+                    state[entry.id][0] = True
+            for entry in fired:
+                if entry.id not in state:
+                    continue
+                armed, last_triggered = state[entry.id]
+                if not armed:
+                    continue
+                if last_triggered and entry.debounce and telemetry.timestamp < last_triggered + timedelta(seconds=entry.debounce):
+                    continue
+                state[entry.id] = [False, telemetry.timestamp]
+                firings.append((entry, telemetry))
+
+        # 仅状态改变的规则加锁: 条件更新只在状态仍是读取时的值时生效, 按 id 顺序逐条更新避免死锁.
+        # 并发批次已改变状态时本批对该规则的判定作废, 以先提交的批次为准
+        changed = [rule_id for rule_id in rule_ids if rule_id in state and tuple(state[rule_id]) != initial[rule_id]]
+        applied = set()
+        for rule_id in changed:
+            self.env.cr.execute("""
+                UPDATE farm_automation_rule
+                   SET armed = %s, last_triggered = %s
+                 WHERE id = %s AND armed IS NOT DISTINCT FROM %s AND last_triggered IS NOT DISTINCT FROM %s
+             RETURNING id
+            """, [state[rule_id][0], state[rule_id][1], rule_id, initial[rule_id][0], initial[rule_id][1]])
+            applied.update(row[0] for row in self.env.cr.fetchall())
+        if changed:
+            self.browse(changed).invalidate_recordset(['armed', 'last_triggered'])
+
+        firings = [(entry, telemetry) for entry, telemetry in firings if entry.id in applied]
+        commands = {entry.target_device_id: entry for entry, telemetry in firings}
+        for device_id, entry in commands.items():
+            params = json.loads(entry.params or '{}')
+            try:
+                self.env['iiot.device'].browse(device_id).send_command(entry.command, **params)
+            except Exception as e:
+                _logger.error(f"AUTOMATION: Rule '{entry.name}' could not send '{entry.command}' to device {device_id}: {str(e)}")
+
+        for entry, telemetry in firings:
+            # 地块消息流中记录自动触发
+            if telemetry.production_id:
+                telemetry.production_id.message_post(
+                    body=_("AUTOMATION: Rule '%s' triggered. Command '%s' sent to %s because %s was %s %s.") % (
+                        entry.name, entry.command, self.env['iiot.device'].browse(entry.target_device_id).name,
+                        telemetry.sensor_type, entry.operator, entry.threshold
+                    )
+                )
+        return self.browse(sorted({entry.id for entry, telemetry in firings}))
+
     def check_and_trigger(self, telemetry):
         """ 检查并触发规则 """
         self.ensure_one()
         if telemetry.sensor_type != self.sensor_type:
             return False
-            
+
+        # 设备遥测已由桥接服务在边缘判定
+        if self.evaluation == 'edge' and telemetry.device_id:
+            return False
+
         triggered = False
         if self.operator == '<' and telemetry.value < self.threshold:
             triggered = True
         elif self.operator == '>' and telemetry.value > self.threshold:
             triggered = True
-            
+
         if triggered:
-            import json
             params = json.loads(self.command_params or '{}')
             self.target_device_id.send_command(self.command_to_send, **params)
-            
+
             # 地块消息流中记录自动触发
             if telemetry.production_id:
                 telemetry.production_id.message_post(
                     body=_("AUTOMATION: Rule '%s' triggered. Command '%s' sent to %s because %s was %s %s.") % (
-                        self.name, self.command_to_send, self.target_device_id.name, 
+                        self.name, self.command_to_send, self.target_device_id.name,
                         self.sensor_type, self.operator, self.threshold
                     )
                 )
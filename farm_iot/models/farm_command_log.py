@@ -8,13 +8,54 @@ class FarmCommandLog(models.Model):
     device_id = fields.Many2one('iiot.device', string="Device", required=True)
     command = fields.Char("Command", required=True)
     params = fields.Text("Parameters")
-    
+    command_id = fields.Char("Command ID", index=True, readonly=True, copy=False,
+                             help="Identifier echoed back by the device to acknowledge the command")
+
     status = fields.Selection([
         ('sent', 'Sent'),
         ('success', 'Success'),
-        ('failed', 'Failed')
+        ('failed', 'Failed'),
+        ('timeout', 'Timeout')
     ], default='sent')
-    
-    execution_time_ms = fields.Integer("Latency (ms)", help="Response latency in milliseconds")
+
+    execution_time_ms = fields.Integer("Latency (ms)", help="Round trip from publishing the command until the device acknowledged it, measured by the MQTT bridge")
     user_id = fields.Many2one('res.users', string="Triggered By", default=lambda self: self.env.user)
-    create_date = fields.Datetime("Timestamp", readonly=True)
\ No newline at end of file
+    create_date = fields.Datetime("Timestamp", readonly=True)
+
+    @api.model
+    def apply_command_results(self, results):
+        """
+        Record the outcome of acknowledged or timed out commands reported by the MQTT bridge.
+        Only logs still in the 'sent' state are updated, so a retried report is harmless.
+        Returns the number of logs updated.
+        """
+        statuses = dict(self._fields['status'].selection)
+        results = {
+            result['command_id']: result for result in results
+            if isinstance(result, dict) and result.get('command_id') and result.get('status') in statuses
+        }
+        if not results:
+            return 0
+
+        command_ids = list(results)
+        self.env.cr.execute("""
+            UPDATE farm_command_log AS log
+               SET status = result.status,
+                   execution_time_ms = result.latency_ms,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM (SELECT unnest(%s::varchar[]) AS command_id,
+                           unnest(%s::varchar[]) AS status,
+                           unnest(%s::int[]) AS latency_ms) AS result
+             WHERE log.command_id = result.command_id
+               AND log.status = 'sent'
+         RETURNING log.id
+        """, [
+            self.env.uid,
+            command_ids,
+            [results[command_id]['status'] for command_id in command_ids],
+            [int(results[command_id].get('latency_ms') or 0) for command_id in command_ids],
+        ])
+        logs = self.browse([row[0] for row in self.env.cr.fetchall()])
+        logs.invalidate_recordset(['status', 'execution_time_ms', 'write_uid', 'write_date'])
+        return len(logs)
@@ -1,5 +1,26 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
+
+# Fields that change which mapping a topic resolves to
+TOPIC_INDEX_FIELDS = ('mqtt_topic', 'active')
+
+
+def _topic_matches(node, levels, index, found):
+    """ Collect the mapping ids of the trie `node` matching `levels[index:]` into `found` """
+    # Wildcards do not match system topics ($SYS/...) at the first level
+    system = index == 0 and levels[0].startswith('$')
+    if '#' in node and not system:
+        # '#' matches the parent level and everything below it
+        found.extend(node['#'])
+    if index == len(levels):
+        found.extend(node.get(None, ()))
+        return
+    level = levels[index]
+    if level in node:
+        _topic_matches(node[level], levels, index + 1, found)
+    if '+' in node and not system:
+        _topic_matches(node['+'], levels, index + 1, found)
+
 
 class IotDeviceMapping(models.Model):
     _name = 'iot.device.mapping'
@@ -7,7 +28,9 @@ class IotDeviceMapping(models.Model):
 
     name = fields.Char(string='Mapping Name', required=True)
     device_id = fields.Many2one('iiot.device', string='Source Device', required=True)
-    mqtt_topic = fields.Char(string='MQTT Telemetry Topic', required=True, help="Topic to listen for (e.g. farm/meter/01/reading)")
+    mqtt_topic = fields.Char(string='MQTT Telemetry Topic', required=True,
+                             help="Topic to listen for (e.g. farm/meter/01/reading). "
+                                  "MQTT wildcards are supported: + for one level, # for all remaining levels")
     
     mapping_type = fields.Selection([
         ('field', 'Direct Field Update'),
@@ -32,6 +55,77 @@ class IotDeviceMapping(models.Model):
     
     active = fields.Boolean(default=True)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if any(field in vals for field in TOPIC_INDEX_FIELDS):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _get_topic_index(self):
+        """
+        Index of the active mappings by topic, cached per worker: a dict of exact
+        topics and a trie of wildcard patterns, one nested dict per topic level.
+        A pattern ending in the trie is stored under the None key, '#' under '#'.
+        Mapping ids are listed in ascending order, the lowest id wins.
+        """
+        self.env.cr.execute("""
+            SELECT id, mqtt_topic FROM iot_device_mapping
+             WHERE active AND mqtt_topic IS NOT NULL
+             ORDER BY id
+        """)
+        exact = {}
+        trie = {}
+        for mapping_id, topic in self.env.cr.fetchall():
+            levels = topic.split('/')
+            if '+' not in levels and '#' not in levels:
+                exact.setdefault(topic, mapping_id)
+                continue
+            node = trie
+            for position, level in enumerate(levels):
+                if level == '#':
+                    if position == len(levels) - 1:
+                        node.setdefault('#', []).append(mapping_id)
+                    break
+                node = node.setdefault(level, {})
+            else:
+                node.setdefault(None, []).append(mapping_id)
+        return exact, trie
+
+    @api.model
+    def _resolve_topics(self, topics):
+        """
+        Resolve MQTT topics to mapping ids without querying the database once the
+        index is cached: exact topics are a dict lookup, other topics walk the
+        wildcard trie. An exact mapping wins over wildcard ones, otherwise the
+        lowest matching id. Returns {topic: mapping_id} for the topics with a mapping.
+        """
+        exact, trie = self._get_topic_index()
+        resolved = {}
+        for topic in set(topics):
+            if not topic:
+                continue
+            if topic in exact:
+                resolved[topic] = exact[topic]
+            elif trie:
+                found = []
+                _topic_matches(trie, topic.split('/'), 0, found)
+                if found:
+                    resolved[topic] = min(found)
+        return resolved
+
     def process_telemetry(self, value, record_id=False):
         """ US-TECH-03-01: Entry point for processing arriving MQTT data. """
         self.ensure_one()
@@ -49,3 +143,38 @@ class IotDeviceMapping(models.Model):
                 record = target_model.browse(record_id)
                 if hasattr(record, self.method_name):
                     getattr(record, self.method_name)(value)
+
+    def _get_target_records(self, topic=None):
+        """
+        Target records of the mapping: records in progress whose match field holds
+        the topic. For wildcard mappings, `topic` is the topic the values arrived on.
+        """
+        self.ensure_one()
+        target_model = self.env[self.target_model_id.model]
+        domain = []
+        if 'state' in target_model._fields:
+            domain.append(('state', '=', 'progress'))  # Default to active orders
+        if self.match_field_id:
+            # Find records where target field matches device/topic context
+            domain.append((self.match_field_id.name, '=', topic or self.mqtt_topic))
+        return target_model.search(domain)
+
+    def _apply_buffered_values(self, values, topic=None):
+        """
+        Apply the buffered values of the mapping received on `topic`, oldest first,
+        with one target search.
+        A field mapping only keeps the latest value, written once to all targets;
+        a method mapping is called for every value.
+        """
+        self.ensure_one()
+        targets = self._get_target_records(topic)
+        if not targets or not values:
+            return
+        if self.mapping_type == 'field' and self.target_field_id:
+            targets.write({self.target_field_id.name: values[-1]})
+        elif self.mapping_type == 'method' and self.method_name:
+            for record in targets:
+                if hasattr(record, self.method_name):
+                    method = getattr(record, self.method_name)
+                    for value in values:
+                        method(value)
@@ -1,4 +1,10 @@
-from odoo import models, fields, api, _
+import logging
+import re
+from dateutil.relativedelta import relativedelta
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import AccessError, UserError
+
+_logger = logging.getLogger(__name__)
 
 class FarmLocation(models.Model):
     _inherit = 'stock.location'
@@ -46,18 +52,19 @@ class FarmTelemetry(models.Model):
     gps_lat = fields.Float("Latitude", digits=(10, 7))
     gps_lng = fields.Float("Longitude", digits=(10, 7))
 
+    # 影响汇总的字段, 修改时从汇总中减去旧值并计入新值
+    ROLLUP_FIELDS = ('value', 'timestamp', 'sensor_type', 'device_id', 'land_parcel_id', 'production_id')
+
     @api.model_create_multi
     def create(self, vals_list):
         records = super().create(vals_list)
+        records.flush_recordset(list(self.ROLLUP_FIELDS))
+        self.env['farm.telemetry.rollup'].sudo()._add_telemetry(records.ids)
+
+        # 1. 自动化规则触发: 整批一次判定
+        self.env['farm.automation.rule'].sudo()._evaluate_telemetry(records)
+
         for record in records:
-            # 1. 自动化规则触发
-            rules = self.env['farm.automation.rule'].search([
-                ('active', '=', True),
-                ('sensor_type', '=', record.sensor_type)
-            ])
-            for rule in rules:
-                rule.check_and_trigger(record)
-            
             # 2. 地理围栏越界判定 [US-23-02, US-23-06]
             if record.device_id and record.device_id.geofence_id and record.gps_lat and record.gps_lng:
                 fence = record.device_id.geofence_id
@@ -81,6 +88,177 @@ class FarmTelemetry(models.Model):
                     ))
         return records
 
+    # 分区存储 (可选): 按月分区, BRIN 时间索引与复合 B-tree 索引
+    def init(self):
+        super().init()
+        if self._is_partitioned():
+            self._sync_partitioned_columns()
+            self._create_partitioned_indexes()
+
+    def _is_partitioned(self):
+        self.env.cr.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [self._table])
+        row = self.env.cr.fetchone()
+        return bool(row) and row[0] == 'p'
+
+    def _partition_name(self, month):
+        return f"{self._table}_{month:%Y_%m}"
+
+    def _sync_partitioned_columns(self):
+        """ 分区表的新字段列: ORM 不管理分区表结构时由此补齐, 子分区自动继承 """
+        columns = tools.table_columns(self.env.cr, self._table)
+        for field in self._fields.values():
+            if field.store and field.column_type and field.name not in columns:
+                tools.create_column(self.env.cr, self._table, field.name, field.column_type[1], field.string)
+
+    def _create_partitioned_indexes(self):
+        """ 在分区父表上建索引, 现有与新建分区自动获得同样的索引 """
+        table = self._table
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS {table}_timestamp_brin
+                ON {table} USING brin ("timestamp");
+            CREATE INDEX IF NOT EXISTS {table}_production_timestamp_index
+                ON {table} (production_id, "timestamp");
+            CREATE INDEX IF NOT EXISTS {table}_parcel_sensor_timestamp_index
+                ON {table} (land_parcel_id, sensor_type, "timestamp");
+        """)
+
+    def _create_partition(self, month):
+        """
+        创建某月的分区. 默认分区中已落入该月的数据先移入新表再挂载,
+        否则挂载会因默认分区存在该范围的数据而失败.
+        """
+        table = self._table
+        name = self._partition_name(month)
+        self.env.cr.execute("SELECT to_regclass(%s)", [name])
+        if self.env.cr.fetchone()[0]:
+            return False
+        start, end = month, month + relativedelta(months=1)
+        self.env.cr.execute(f"""
+            CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+            WITH moved AS (
+                DELETE FROM {table}_default WHERE "timestamp" >= %(start)s AND "timestamp" < %(end)s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved;
+            ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%(start)s) TO (%(end)s);
+        """, {'start': start, 'end': end})
+        return True
+
+    @api.model
+    def action_enable_partitioning(self):
+        """
+        将遥测表转换为按月的声明式分区表 (不可逆). 数据、序列与外键约束保留,
+        主键变为 (id, timestamp). 转换期间表被锁定, 数据量大时应在维护窗口执行.
+        """
+        if not self.env.user.has_group('base.group_system'):
+            raise AccessError(_("Only administrators can change the telemetry storage mode."))
+        if self._is_partitioned():
+            raise UserError(_("Telemetry storage is already partitioned."))
+
+        cr = self.env.cr
+        table = self._table
+        old = f"{table}_unpartitioned"
+        cr.execute("SELECT conrelid::regclass::text FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'", [table])
+        referencing = [row[0] for row in cr.fetchall()]
+        if referencing:
+            raise UserError(_("Telemetry storage cannot be partitioned while referenced by: %s", ", ".join(referencing)))
+
+        cr.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        cr.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cr.fetchone()[0]
+        cr.execute("""
+            SELECT conname, pg_get_constraintdef(oid), contype FROM pg_constraint
+             WHERE conrelid = %s::regclass AND contype IN ('p', 'f', 'c')
+        """, [table])
+        constraints = cr.fetchall()
+        cr.execute(f'SELECT min("timestamp") FROM {table}')
+        first = cr.fetchone()[0]
+
+        # 旧表改名, 释放表名与主键索引名
+        cr.execute(f"ALTER TABLE {table} RENAME TO {old}")
+        for name, definition, kind in constraints:
+            if kind == 'p':
+                cr.execute(f'ALTER TABLE {old} RENAME CONSTRAINT "{name}" TO {old}_pkey')
+
+        # 分区键必须包含在主键中
+        cr.execute(f"""
+            CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING COMMENTS) PARTITION BY RANGE ("timestamp");
+            ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, "timestamp");
+            CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;
+        """)
+        for name, definition, kind in constraints:
+            if kind != 'p':
+                cr.execute(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+
+        this_month = fields.Date.today().replace(day=1)
+        month = first.date().replace(day=1) if first else this_month
+        while month <= this_month + relativedelta(months=self._partition_months_ahead()):
+            self._create_partition(month)
+            month += relativedelta(months=1)
+
+        cr.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+        cr.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+        cr.execute(f"DROP TABLE {old}")
+        self._create_partitioned_indexes()
+        _logger.info(f"Telemetry table {table} converted to monthly partitions")
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Partitioned Storage Enabled'),
+                'message': _('Telemetry is now stored in monthly partitions.'),
+                'type': 'success',
+            }
+        }
+
+    def _partition_months_ahead(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('farm_iot.telemetry_partition_months_ahead', 3))
+
+    @api.model
+    def _cron_maintain_partitions(self):
+        """
+        预先创建未来月份的分区, 并卸载超过保留月数的分区.
+        卸载的分区保留为独立的表 (<表名>_YYYY_MM), 不再被 ORM 查询.
+        """
+        if not self._is_partitioned():
+            return
+        this_month = fields.Date.today().replace(day=1)
+        for offset in range(self._partition_months_ahead() + 1):
+            if self._create_partition(this_month + relativedelta(months=offset)):
+                _logger.info(f"Telemetry partition {self._partition_name(this_month + relativedelta(months=offset))} created")
+
+        retention = int(self.env['ir.config_parameter'].sudo().get_param('farm_iot.telemetry_partition_retention_months', 0))
+        if not retention:
+            return
+        cutoff = this_month - relativedelta(months=retention)
+        self.env.cr.execute("""
+            SELECT child.relname FROM pg_inherits
+              JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+             WHERE pg_inherits.inhparent = %s::regclass
+        """, [self._table])
+        pattern = re.compile(rf"^{self._table}_(\d{{4}})_(\d{{2}})$")
+        for (name,) in self.env.cr.fetchall():
+            match = pattern.match(name)
+            if match and fields.Date.to_date(f"{match[1]}-{match[2]}-01") < cutoff:
+                self.env.cr.execute(f"ALTER TABLE {self._table} DETACH PARTITION {name}")
+                _logger.info(f"Telemetry partition {name} detached")
+
+    def write(self, vals):
+        if not any(field in vals for field in self.ROLLUP_FIELDS):
+            return super().write(vals)
+        Rollup = self.env['farm.telemetry.rollup'].sudo()
+        self.flush_recordset(list(self.ROLLUP_FIELDS))
+        Rollup._remove_telemetry(self.ids)
+        res = super().write(vals)
+        self.flush_recordset(list(self.ROLLUP_FIELDS))
+        Rollup._add_telemetry(self.ids)
+        return res
+
+    def unlink(self):
+        self.flush_recordset(list(self.ROLLUP_FIELDS))
+        self.env['farm.telemetry.rollup'].sudo()._remove_telemetry(self.ids)
+        return super().unlink()
+
     def _trigger_geofence_alarm(self, telemetry, fence):
         """ 创建越界告警活动与消息推送 """
         msg_body = _("GEOFENCE ALERT: Device %s has LEFT the assigned fence '%s' at [%s, %s]!") % (
@@ -0,0 +1,189 @@
+import gzip
+import json
+import logging
+from datetime import timedelta
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+# 归档文件中的遥测列, 按列存储: {"columns": [...], "data": {列: [值, ...]}}
+ARCHIVE_COLUMNS = (
+    'id', 'name', 'sensor_type', 'value', 'timestamp', 'production_id', 'drone_id',
+    'device_id', 'land_parcel_id', 'adopted_lot_id', 'gps_lat', 'gps_lng',
+)
+
+
+class FarmTelemetryRetention(models.Model):
+    """
+    遥测保留策略, 按传感器类型分层: 原始遥测保留 raw_days 天, 之后只保留汇总,
+    汇总保留 rollup_days 天. 清理前原始遥测导出为压缩的列式文件存入文件存储.
+    未指定传感器类型的策略适用于没有专门策略的类型.
+    """
+    _name = 'farm.telemetry.retention'
+    _description = 'Telemetry Retention Policy'
+    _order = 'sensor_type'
+
+    sensor_type = fields.Selection(
+        selection=lambda self: self.env['farm.telemetry']._fields['sensor_type'].selection,
+        string="Sensor Type", help="Leave empty for the default policy of all other sensor types"
+    )
+    raw_days = fields.Integer("Keep Raw Data (Days)", default=90, required=True)
+    rollup_days = fields.Integer("Keep Rollups (Days)", default=0, help="0 keeps rollups forever")
+    archive = fields.Boolean("Archive Raw Data", default=True,
+                             help="Export raw telemetry to compressed files in the filestore before it is purged")
+    active = fields.Boolean(default=True)
+
+    last_run = fields.Datetime("Last Run", readonly=True)
+    purged_count = fields.Integer("Purged Readings", readonly=True)
+    archive_ids = fields.One2many('ir.attachment', 'res_id', string="Archives",
+                                  domain=[('res_model', '=', 'farm.telemetry.retention')])
+    archive_count = fields.Integer("Archive Files", compute='_compute_archive_count')
+
+    _sql_constraints = [
+        ('sensor_type_unique', 'unique(sensor_type)', 'Only one retention policy per sensor type is allowed.'),
+        ('raw_days_positive', 'CHECK(raw_days > 0)', 'Raw data must be kept for at least one day.'),
+    ]
+
+    @api.constrains('sensor_type', 'active')
+    def _check_single_default(self):
+        if self.search_count([('sensor_type', '=', False)]) > 1:
+            raise ValidationError(_("Only one default retention policy is allowed."))
+
+    def _compute_archive_count(self):
+        for policy in self:
+            policy.archive_count = len(policy.archive_ids)
+
+    def _get_sensor_types(self):
+        """ 策略覆盖的传感器类型: 默认策略覆盖所有没有专门策略的类型 """
+        self.ensure_one()
+        if self.sensor_type:
+            return [self.sensor_type]
+        specific = set(self.search([('sensor_type', '!=', False)]).mapped('sensor_type'))
+        selection = self.env['farm.telemetry']._fields['sensor_type'].selection
+        return [value for value, label in selection if value not in specific]
+
+    def _purge_raw_batch(self, batch_size):
+        """ 清理一批过期的原始遥测, 被锁定的行跳过, 返回清理的条数 """
+        self.ensure_one()
+        cutoff = fields.Datetime.now() - timedelta(days=self.raw_days)
+        columns = ", ".join(f'"{column}"' for column in ARCHIVE_COLUMNS)
+        # 外层也按时间过滤, 分区存储时只扫描过期的分区
+        self.env.cr.execute(f"""
+            DELETE FROM farm_telemetry
+             WHERE "timestamp" < %(cutoff)s
+               AND id IN (SELECT id FROM farm_telemetry
+                           WHERE sensor_type = ANY(%(sensor_types)s) AND "timestamp" < %(cutoff)s
+                           ORDER BY "timestamp"
+                           LIMIT %(limit)s
+                             FOR UPDATE SKIP LOCKED)
+         RETURNING {columns}
+        """, {'cutoff': cutoff, 'sensor_types': self._get_sensor_types(), 'limit': batch_size})
+        rows = self.env.cr.fetchall()
+        if rows and self.archive:
+            self._write_archive(rows)
+        return len(rows)
+
+    def _purge_rollup_batch(self, batch_size):
+        self.ensure_one()
+        if not self.rollup_days:
+            return 0
+        cutoff = fields.Datetime.now() - timedelta(days=self.rollup_days)
+        self.env.cr.execute("""
+            DELETE FROM farm_telemetry_rollup
+             WHERE id IN (SELECT id FROM farm_telemetry_rollup
+                           WHERE sensor_type = ANY(%(sensor_types)s) AND period_start < %(cutoff)s
+                           LIMIT %(limit)s
+                             FOR UPDATE SKIP LOCKED)
+        """, {'cutoff': cutoff, 'sensor_types': self._get_sensor_types(), 'limit': batch_size})
+        return self.env.cr.rowcount
+
+    def _write_archive(self, rows):
+        """ 将一批遥测按列写入 gzip 压缩的 JSON 文件, 作为附件存入文件存储 """
+        data = {column: [] for column in ARCHIVE_COLUMNS}
+        for row in rows:
+            for column, value in zip(ARCHIVE_COLUMNS, row):
+                data[column].append(fields.Datetime.to_string(value) if column == 'timestamp' else value)
+        first, last = min(data['timestamp']), max(data['timestamp'])
+        content = gzip.compress(json.dumps({'columns': list(ARCHIVE_COLUMNS), 'data': data}).encode())
+        return self.env['ir.attachment'].create({
+            'name': f"telemetry_{self.sensor_type or 'default'}_{first[:10]}_{last[:10]}_{min(data['id'])}.json.gz",
+            'raw': content,
+            'mimetype': 'application/gzip',
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+
+    @api.model
+    def read_archive(self, attachment):
+        """ 读取归档文件, 返回遥测行的字典列表 """
+        archive = json.loads(gzip.decompress(attachment.raw))
+        columns = archive['columns']
+        return [dict(zip(columns, values)) for values in zip(*(archive['data'][column] for column in columns))]
+
+    @api.model
+    def _purge_buffer_batch(self, batch_size):
+        """ 清理已处理且超过保留天数的原始缓冲 """
+        days = int(self.env['ir.config_parameter'].sudo().get_param('farm_iot.buffer_retention_days', 7))
+        self.env.cr.execute("""
+            DELETE FROM iot_telemetry_buffer
+             WHERE id IN (SELECT id FROM iot_telemetry_buffer
+                           WHERE processed AND COALESCE(processed_date, write_date) < %(cutoff)s
+                           LIMIT %(limit)s
+                             FOR UPDATE SKIP LOCKED)
+        """, {'cutoff': fields.Datetime.now() - timedelta(days=days), 'limit': batch_size})
+        return self.env.cr.rowcount
+
+    @api.model
+    def _apply_retention(self, batch_size=5000, max_batches=100, auto_commit=True):
+        """
+        按批清理: 每批一个短事务 (auto_commit), 跳过被锁定的行, 不阻塞遥测写入.
+        达到 max_batches 时返回 False, 由定时任务尽快再次执行.
+        """
+        batches = 0
+
+        def run(purge):
+            nonlocal batches
+            total = 0
+            while batches < max_batches:
+                count = purge()
+                batches += 1
+                total += count
+                if auto_commit:
+                    self.env.cr.commit()
+                if count < batch_size:
+                    break
+            return total
+
+        for policy in self.search([]):
+            purged = run(lambda: policy._purge_raw_batch(batch_size))
+            run(lambda: policy._purge_rollup_batch(batch_size))
+            policy.write({'last_run': fields.Datetime.now(), 'purged_count': policy.purged_count + purged})
+            if purged:
+                _logger.info(f"Telemetry retention: {purged} {policy.sensor_type or 'default'} readings purged")
+        buffer_purged = run(lambda: self._purge_buffer_batch(batch_size))
+        if buffer_purged:
+            _logger.info(f"Telemetry retention: {buffer_purged} processed buffer rows purged")
+        if auto_commit:
+            self.env.cr.commit()
+        return batches < max_batches
+
+    @api.model
+    def _cron_apply_retention(self):
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        done = self._apply_retention(
+            batch_size=int(get_param('farm_iot.retention_batch_size', 5000)),
+            max_batches=int(get_param('farm_iot.retention_max_batches', 100)),
+        )
+        if not done:
+            self.env.ref('farm_iot.ir_cron_farm_telemetry_retention')._trigger()
+
+    def action_view_archives(self):
+        self.ensure_one()
+        return {
+            'name': _('Telemetry Archives'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'ir.attachment',
+            'view_mode': 'list,form',
+            'domain': [('res_model', '=', self._name), ('res_id', '=', self.id)],
+        }
@@ -0,0 +1,287 @@
+from datetime import timedelta
+from odoo import models, fields, api
+
+ROLLUP_KEY = (
+    'period, period_start, sensor_type, COALESCE(device_id, 0), '
+    'COALESCE(land_parcel_id, 0), COALESCE(production_id, 0)'
+)
+# 待合并的遥测增量: 只追加的 UNLOGGED 表, 写入遥测时不锁定汇总行.
+# sign 为 1 时并入一条读数, 为 -1 时减去一条被修改或删除的读数
+DELTA_TABLE = 'farm_telemetry_rollup_delta'
+DELTA_COLUMNS = 'sign, telemetry_id, sensor_type, device_id, land_parcel_id, production_id, "timestamp", value'
+# 一批增量中被减去的读数, 按汇总键与时间桶分组
+REMOVED_GROUPS = """
+    SELECT period.name AS period, date_trunc(period.name, delta."timestamp") AS period_start,
+           delta.sensor_type, delta.device_id, delta.land_parcel_id, delta.production_id,
+           min(delta.value) AS value_min, max(delta.value) AS value_max, max(delta."timestamp") AS last_timestamp
+      FROM farm_telemetry_rollup_batch AS delta
+     CROSS JOIN (VALUES ('hour'), ('day')) AS period(name)
+     WHERE delta.sign < 0
+     GROUP BY 1, 2, 3, 4, 5, 6
+"""
+REMOVED_GROUP_MATCH = """
+    rollup.period = removed.period AND rollup.period_start = removed.period_start
+    AND rollup.sensor_type = removed.sensor_type
+    AND COALESCE(rollup.device_id, 0) = COALESCE(removed.device_id, 0)
+    AND COALESCE(rollup.land_parcel_id, 0) = COALESCE(removed.land_parcel_id, 0)
+    AND COALESCE(rollup.production_id, 0) = COALESCE(removed.production_id, 0)
+"""
+
+
+class FarmTelemetryRollup(models.Model):
+    """
+    遥测小时/日汇总: 每个 (传感器类型, 设备, 地块, 生产任务) 每小时与每天一行,
+    记录最小值、最大值、总和、条数、平均值与最新值. 图表与指标读取汇总而非原始遥测.
+    时间桶按 UTC 划分. farm.telemetry 的创建、修改与删除只向增量表追加增量, 由每分钟的
+    定时任务批量合并, 并发写入的事务不再争用同一小时/日的汇总行. 增量表不写 WAL,
+    数据库崩溃后未合并的增量丢失, 可按原始遥测调用 _rebuild 重建.
+    """
+    _name = 'farm.telemetry.rollup'
+    _description = 'Telemetry Hourly/Daily Rollup'
+    _order = 'period_start desc'
+
+    period = fields.Selection([
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ], string="Period", required=True, readonly=True)
+    period_start = fields.Datetime("Period Start", required=True, readonly=True)
+    sensor_type = fields.Selection(
+        selection=lambda self: self.env['farm.telemetry']._fields['sensor_type'].selection,
+        string="Sensor Type", required=True, readonly=True
+    )
+    device_id = fields.Many2one('iiot.device', string="IIoT Device", readonly=True)
+    land_parcel_id = fields.Many2one('stock.location', string="Land Parcel/Pond", readonly=True)
+    production_id = fields.Many2one('project.task', string="Production Task", readonly=True)
+
+    value_min = fields.Float("Min", readonly=True, aggregator='min')
+    value_max = fields.Float("Max", readonly=True, aggregator='max')
+    value_avg = fields.Float("Average", readonly=True, aggregator='avg')
+    value_sum = fields.Float("Sum", readonly=True)
+    value_count = fields.Integer("Readings", readonly=True)
+    value_last = fields.Float("Last Value", readonly=True, aggregator=None)
+    last_timestamp = fields.Datetime("Last Reading", readonly=True)
+
+    def init(self):
+        super().init()
+        # 汇总键: 可为空的关联以 0 参与唯一性, 供增量写入的 ON CONFLICT 使用
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS farm_telemetry_rollup_key_index
+                ON {self._table} ({ROLLUP_KEY})
+        """)
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS farm_telemetry_rollup_production_index
+                ON {self._table} (production_id, period, period_start)
+        """)
+        self.env.cr.execute(f"""
+            CREATE INDEX IF NOT EXISTS farm_telemetry_rollup_parcel_index
+                ON {self._table} (land_parcel_id, sensor_type, period, period_start)
+        """)
+        self.env.cr.execute(f"""
+            CREATE UNLOGGED TABLE IF NOT EXISTS {DELTA_TABLE} (
+                id bigserial PRIMARY KEY,
+                sign smallint NOT NULL DEFAULT 1,
+                telemetry_id integer NOT NULL,
+                sensor_type varchar NOT NULL,
+                device_id integer,
+                land_parcel_id integer,
+                production_id integer,
+                "timestamp" timestamp NOT NULL,
+                value double precision
+            )
+        """)
+        # 安装时回填已有的遥测
+        self.env.cr.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {self._table}) AND EXISTS (SELECT 1 FROM farm_telemetry)")
+        if self.env.cr.fetchone()[0]:
+            self._rebuild()
+
+    @api.model
+    def _add_telemetry(self, telemetry_ids):
+        """ 记录新遥测的增量, 由 _merge_deltas 并入汇总 """
+        self._queue_deltas(telemetry_ids, 1)
+
+    @api.model
+    def _add_staged_telemetry(self, table):
+        """ 记录暂存表 (与 farm_telemetry 同结构) 中新遥测的增量, 用于批量导入 """
+        self.env.cr.execute(f"""
+            INSERT INTO {DELTA_TABLE} ({DELTA_COLUMNS})
+            SELECT 1, id, sensor_type, device_id, land_parcel_id, production_id, "timestamp", value
+              FROM {table}
+        """)
+
+    @api.model
+    def _remove_telemetry(self, telemetry_ids):
+        """ 在修改或删除之前记录遥测的当前值, 由 _merge_deltas 从汇总中减去 """
+        self._queue_deltas(telemetry_ids, -1)
+
+    def _queue_deltas(self, telemetry_ids, sign):
+        if not telemetry_ids:
+            return
+        self.env.cr.execute(f"""
+            INSERT INTO {DELTA_TABLE} ({DELTA_COLUMNS})
+            SELECT %s, id, sensor_type, device_id, land_parcel_id, production_id, "timestamp", value
+              FROM farm_telemetry WHERE id = ANY(%s)
+        """, [sign, list(telemetry_ids)])
+
+    @api.model
+    def _merge_deltas(self, batch_size=50000, max_batches=20, auto_commit=True):
+        """
+        将增量按批并入汇总: 每批一条 upsert 按汇总键聚合每小时与每天两个桶,
+        总和与条数直接加减, 不重新读取原始遥测, 已被保留策略清理的数据仍保留在汇总中.
+        合并由事务级咨询锁串行, 只有一个事务更新汇总行; 返回合并的增量条数.
+        """
+        merged = 0
+        for batch in range(max_batches):
+            self.env.cr.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", [DELTA_TABLE])
+            if not self.env.cr.fetchone()[0]:
+                break
+            # 领取一批增量到临时表: 删除与合并在同一事务中, 失败时增量随回滚保留
+            self.env.cr.execute(f"""
+                CREATE TEMPORARY TABLE IF NOT EXISTS farm_telemetry_rollup_batch
+                    (LIKE {DELTA_TABLE}) ON COMMIT DROP
+            """)
+            self.env.cr.execute("TRUNCATE farm_telemetry_rollup_batch")
+            self.env.cr.execute(f"""
+                WITH claimed AS (
+                    DELETE FROM {DELTA_TABLE}
+                     WHERE id IN (SELECT id FROM {DELTA_TABLE} ORDER BY id LIMIT %s)
+                 RETURNING *
+                )
+                INSERT INTO farm_telemetry_rollup_batch SELECT * FROM claimed
+            """, [batch_size])
+            count = self.env.cr.rowcount
+            if count:
+                self.env.cr.execute(self._upsert_query("""
+                    SELECT sign, telemetry_id AS id, sensor_type, device_id, land_parcel_id, production_id,
+                           "timestamp", value
+                      FROM farm_telemetry_rollup_batch
+                """), {'uid': self.env.uid})
+                self._correct_removed()
+            merged += count
+            if auto_commit:
+                self.env.cr.commit()
+            if count < batch_size:
+                break
+        self.invalidate_model()
+        return merged
+
+    def _correct_removed(self):
+        """
+        最小值、最大值与最新值无法减去: 被减去的读数恰为桶的极值或最新值时, 按桶内的原始遥测
+        重新取值. 桶内原始遥测已被保留策略部分清理 (条数少于汇总) 时保留原值, 只加减总和与条数,
+        避免按剩余读数收窄极值. 条数减为 0 的汇总删除.
+        """
+        self.env.cr.execute(f"""
+            UPDATE {self._table} AS rollup
+               SET value_min = CASE WHEN removed.value_min <= rollup.value_min
+                                    THEN raw.value_min ELSE rollup.value_min END,
+                   value_max = CASE WHEN removed.value_max >= rollup.value_max
+                                    THEN raw.value_max ELSE rollup.value_max END,
+                   value_last = CASE WHEN removed.last_timestamp >= rollup.last_timestamp
+                                     THEN raw.value_last ELSE rollup.value_last END,
+                   last_timestamp = CASE WHEN removed.last_timestamp >= rollup.last_timestamp
+                                         THEN raw.last_timestamp ELSE rollup.last_timestamp END
+              FROM ({REMOVED_GROUPS}) AS removed
+             CROSS JOIN LATERAL (
+                    SELECT min(telemetry.value) AS value_min, max(telemetry.value) AS value_max,
+                           (array_agg(telemetry.value ORDER BY telemetry."timestamp" DESC, telemetry.id DESC))[1]
+                               AS value_last,
+                           max(telemetry."timestamp") AS last_timestamp, count(*) AS value_count
+                      FROM farm_telemetry AS telemetry
+                     WHERE telemetry.sensor_type = removed.sensor_type
+                       AND telemetry.device_id IS NOT DISTINCT FROM removed.device_id
+                       AND telemetry.land_parcel_id IS NOT DISTINCT FROM removed.land_parcel_id
+                       AND telemetry.production_id IS NOT DISTINCT FROM removed.production_id
+                       AND telemetry."timestamp" >= removed.period_start
+                       AND telemetry."timestamp" < removed.period_start + ('1 ' || removed.period)::interval
+                   ) AS raw
+             WHERE {REMOVED_GROUP_MATCH}
+               AND raw.value_count >= rollup.value_count AND rollup.value_count > 0
+        """)
+        self.env.cr.execute(f"""
+            DELETE FROM {self._table} AS rollup
+             USING ({REMOVED_GROUPS}) AS removed
+             WHERE {REMOVED_GROUP_MATCH} AND rollup.value_count <= 0
+        """)
+
+    @api.model
+    def _cron_merge_deltas(self):
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        self._merge_deltas(batch_size=int(get_param('farm_iot.rollup_merge_batch_size', 50000)))
+
+    @api.model
+    def _rebuild(self, date_from=None, date_to=None):
+        """
+        按原始遥测重建汇总, 范围对齐到整天 (UTC). 用于首次回填;
+        范围内已被保留策略清理的原始遥测不再计入汇总.
+        """
+        params = {'uid': self.env.uid, 'date_from': None, 'date_to': None}
+        if date_from:
+            params['date_from'] = fields.Datetime.to_datetime(date_from).replace(hour=0, minute=0, second=0, microsecond=0)
+        if date_to:
+            params['date_to'] = fields.Datetime.to_datetime(date_to).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        where = """
+            (%(date_from)s::timestamp IS NULL OR "timestamp" >= %(date_from)s)
+            AND (%(date_to)s::timestamp IS NULL OR "timestamp" < %(date_to)s)
+        """
+        # 范围内未合并的增量已包含在原始遥测中
+        self.env.cr.execute(f"DELETE FROM {DELTA_TABLE} WHERE {where}", params)
+        self.env.cr.execute(f"""
+            DELETE FROM {self._table}
+             WHERE (%(date_from)s::timestamp IS NULL OR period_start >= %(date_from)s)
+               AND (%(date_to)s::timestamp IS NULL OR period_start < %(date_to)s)
+        """, params)
+        self.env.cr.execute(self._upsert_query(f"SELECT 1 AS sign, * FROM farm_telemetry WHERE {where}"), params)
+        self.invalidate_model()
+
+    def _upsert_query(self, source):
+        # source 返回遥测列与 sign: 被减去的读数只计入总和与条数, 极值与最新值由 _correct_removed 修正.
+        # 按汇总键排序写入, 并发写入的事务以相同顺序加锁
+        return f"""
+            INSERT INTO {self._table} AS rollup (
+                period, period_start, sensor_type, device_id, land_parcel_id, production_id,
+                value_min, value_max, value_sum, value_count, value_avg, value_last, last_timestamp,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT period.name, date_trunc(period.name, telemetry."timestamp") AS period_start,
+                   telemetry.sensor_type, telemetry.device_id, telemetry.land_parcel_id, telemetry.production_id,
+                   min(telemetry.value) FILTER (WHERE telemetry.sign > 0),
+                   max(telemetry.value) FILTER (WHERE telemetry.sign > 0),
+                   sum(telemetry.sign * telemetry.value), sum(telemetry.sign),
+                   sum(telemetry.sign * telemetry.value) / NULLIF(sum(telemetry.sign), 0),
+                   (array_agg(telemetry.value ORDER BY telemetry."timestamp" DESC, telemetry.id DESC)
+                        FILTER (WHERE telemetry.sign > 0))[1],
+                   max(telemetry."timestamp") FILTER (WHERE telemetry.sign > 0),
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM ({source}) AS telemetry
+             CROSS JOIN (VALUES ('hour'), ('day')) AS period(name)
+             GROUP BY 1, 2, 3, 4, 5, 6
+             ORDER BY 1, 2, 3, 4, 5, 6
+                ON CONFLICT ({ROLLUP_KEY}) DO UPDATE SET
+                   value_min = LEAST(rollup.value_min, EXCLUDED.value_min),
+                   value_max = GREATEST(rollup.value_max, EXCLUDED.value_max),
+                   value_sum = rollup.value_sum + EXCLUDED.value_sum,
+                   value_count = rollup.value_count + EXCLUDED.value_count,
+                   value_avg = (rollup.value_sum + EXCLUDED.value_sum)
+                               / NULLIF(rollup.value_count + EXCLUDED.value_count, 0),
+                   value_last = CASE WHEN EXCLUDED.last_timestamp >= rollup.last_timestamp
+                                     THEN EXCLUDED.value_last ELSE rollup.value_last END,
+                   last_timestamp = GREATEST(rollup.last_timestamp, EXCLUDED.last_timestamp),
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """
+
+    @api.model
+    def get_average(self, sensor_type, domain=None, group_by=None):
+        """
+        按条数加权的平均值, 基于日汇总. group_by 为汇总字段名时返回 {分组值: 平均值},
+        否则返回整体平均值 (无数据时为 None).
+        """
+        domain = [('period', '=', 'day'), ('sensor_type', '=', sensor_type)] + (domain or [])
+        groupby = [group_by] if group_by else []
+        results = self._read_group(domain, groupby, ['value_sum:sum', 'value_count:sum'])
+        averages = {
+            (group[0].id if isinstance(group[0], models.BaseModel) else group[0]) if group_by else None:
+                total / count
+            for *group, total, count in results if count
+        }
+        return averages if group_by else averages.get(None)
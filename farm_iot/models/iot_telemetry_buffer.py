@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, _
+from collections import defaultdict
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -13,48 +14,143 @@ class IotTelemetryBuffer(models.Model):
     raw_value = fields.Char(string='Raw Value', required=True)
     processed = fields.Boolean(string='Is Processed', default=False, index=True)
     processed_date = fields.Datetime(string='Processed On')
+    attempts = fields.Integer(string='Failed Attempts', default=0)
+    error_message = fields.Text(string='Last Error')
     
     mapping_id = fields.Many2one('iot.device.mapping', string='Applied Mapping', compute='_compute_mapping', store=True)
 
     @api.depends('mqtt_topic')
     def _compute_mapping(self):
-        """ US-TECH-03-02: Link buffer to mapping rule based on topic matching. """
+        """
+        US-TECH-03-02: Link buffer to mapping rule based on topic matching.
+        All records are resolved at once against the cached topic index,
+        so a batch of inserts costs no mapping query.
+        """
+        Mapping = self.env['iot.device.mapping']
+        resolved = Mapping._resolve_topics(self.mapped('mqtt_topic'))
         for rec in self:
-            mapping = self.env['iot.device.mapping'].search([
-                ('mqtt_topic', '=', rec.mqtt_topic),
-                ('active', '=', True)
-            ], limit=1)
-            rec.mapping_id = mapping
+            rec.mapping_id = Mapping.browse(resolved.get(rec.mqtt_topic))
+
+    def init(self):
+        super().init()
+        # Workers claim the oldest unprocessed rows; processed rows are not indexed
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS iot_telemetry_buffer_unprocessed_index
+                ON iot_telemetry_buffer (id) WHERE NOT processed
+        """)
 
     def cron_process_buffer(self):
-        """ US-TECH-03-02: Scheduled action to process telemetry batches asynchronously. """
-        buffers = self.search([('processed', '=', False)], limit=1000) # Process in chunks
-        _logger.info("IoT Async: Processing %d telemetry records from buffer.", len(buffers))
-        
-        for buf in buffers:
-            if buf.mapping_id:
-                try:
-                    # Execute logic defined in US-TECH-03-01
-                    # Note: We need a strategy to find the right Record ID.
-                    # For MOs, we might match by 'state=progress' and device mapping.
-                    target_model = buf.mapping_id.target_model_id.model
-                    match_field = buf.mapping_id.match_field_id.name if buf.mapping_id.match_field_id else False
-                    
-                    domain = [('state', '=', 'progress')] # Default to active orders
-                    if match_field:
-                        # Find records where target field matches device/topic context
-                        domain.append((match_field, '=', buf.mqtt_topic))
-                    
-                    target_records = self.env[target_model].search(domain)
-                    for rec in target_records:
-                        buf.mapping_id.process_telemetry(buf.raw_value, record_id=rec.id)
-                    
-                    buf.write({
-                        'processed': True,
-                        'processed_date': fields.Datetime.now()
-                    })
-                except Exception as e:
-                    _logger.error("IoT Async Error: Failed to process buffer %d: %s", buf.id, str(e))
+        """
+        US-TECH-03-02: Scheduled action to process telemetry batches asynchronously.
+        Rows are claimed in chunks with FOR UPDATE SKIP LOCKED and each chunk is committed
+        on its own; when the run ends with rows left, the cron is triggered again right away.
+        """
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        chunk_size = int(get_param('farm_iot.buffer_chunk_size', 5000))
+        max_chunks = int(get_param('farm_iot.buffer_max_chunks', 20))
+        processed = 0
+        drained = False
+        for chunk in range(max_chunks):
+            count = self._process_buffer_chunk(chunk_size)
+            self.env.cr.commit()
+            processed += count
+            if count < chunk_size:
+                drained = True
+                break
+        if not drained:
+            self.env.ref('farm_iot.ir_cron_iot_buffer_processor')._trigger()
+        _logger.info("IoT Async: Processed %d telemetry records from buffer.", processed)
+        return processed
+
+    @api.model
+    def _process_buffer_chunk(self, limit=5000):
+        """
+        Claim up to `limit` unprocessed rows, skipping rows claimed by other workers,
+        and process them grouped by mapping and topic: target records are resolved
+        once per group and written once. Processed rows are flagged with a single UPDATE.
+        When a group fails, its rows are applied one at a time, so one bad value does not
+        hold back the others; failing rows are retried up to `farm_iot.buffer_max_attempts`
+        times and then flagged as processed with their error.
+        Returns the number of rows claimed.
+        """
+        self.env.cr.execute("""
+            SELECT id, mapping_id, mqtt_topic, raw_value FROM iot_telemetry_buffer
+             WHERE NOT processed
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [limit])
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return 0
+
+        values_by_group = defaultdict(list)
+        done_ids = []
+        for buffer_id, mapping_id, topic, raw_value in rows:
+            if mapping_id:
+                # Wildcard mappings match targets on the actual topic
+                values_by_group[mapping_id, topic].append((buffer_id, raw_value))
             else:
                 # No mapping found, mark as processed anyway to avoid clogging the buffer
-                buf.processed = True
+                done_ids.append(buffer_id)
+
+        Mapping = self.env['iot.device.mapping']
+        Mapping.browse([mapping_id for mapping_id, topic in values_by_group]).fetch(
+            ['mapping_type', 'target_model_id', 'target_field_id', 'method_name', 'match_field_id', 'mqtt_topic'])
+        errors = {}
+        for (mapping_id, topic), values in values_by_group.items():
+            mapping = Mapping.browse(mapping_id)
+            try:
+                with self.env.cr.savepoint():
+                    mapping._apply_buffered_values([raw_value for buffer_id, raw_value in values], topic)
+            except Exception as e:
+                _logger.warning("IoT Async: Failed to process %d buffered values of mapping %d, "
+                                "retrying them one by one: %s", len(values), mapping_id, str(e))
+                for buffer_id, raw_value in values:
+                    try:
+                        with self.env.cr.savepoint():
+                            mapping._apply_buffered_values([raw_value], topic)
+                    except Exception as e:
+                        errors[buffer_id] = str(e)
+                    else:
+                        done_ids.append(buffer_id)
+                continue
+            done_ids.extend(buffer_id for buffer_id, raw_value in values)
+
+        if done_ids:
+            self.env.cr.execute("""
+                UPDATE iot_telemetry_buffer
+                   SET processed = true, processed_date = %s, write_uid = %s, write_date = %s
+                 WHERE id = ANY(%s)
+            """, [fields.Datetime.now(), self.env.uid, fields.Datetime.now(), done_ids])
+            self.browse(done_ids).invalidate_recordset(['processed', 'processed_date', 'write_uid', 'write_date'])
+        if errors:
+            self._record_errors(errors)
+        return len(rows)
+
+    def _record_errors(self, errors):
+        """
+        Count a failed attempt for the rows {id: error}; rows out of attempts are
+        flagged as processed, so they leave the claim window and are purged in time.
+        """
+        max_attempts = int(self.env['ir.config_parameter'].sudo().get_param('farm_iot.buffer_max_attempts', 3))
+        now = fields.Datetime.now()
+        self.env.cr.execute("""
+            UPDATE iot_telemetry_buffer b
+               SET attempts = COALESCE(b.attempts, 0) + 1, error_message = e.error,
+                   processed = COALESCE(b.attempts, 0) + 1 >= %(max_attempts)s,
+                   processed_date = CASE WHEN COALESCE(b.attempts, 0) + 1 >= %(max_attempts)s THEN %(now)s END,
+                   write_uid = %(uid)s, write_date = %(now)s
+              FROM unnest(%(ids)s::int[], %(errors)s::text[]) AS e(id, error)
+             WHERE b.id = e.id
+         RETURNING b.id, b.processed
+        """, {
+            'max_attempts': max_attempts, 'now': now, 'uid': self.env.uid,
+            'ids': list(errors), 'errors': list(errors.values()),
+        })
+        abandoned = [buffer_id for buffer_id, processed in self.env.cr.fetchall() if processed]
+        if abandoned:
+            _logger.error("IoT Async Error: Gave up on %d buffered values after %d attempts, e.g. %s",
+                          len(abandoned), max_attempts, errors[abandoned[0]])
+        self.browse(list(errors)).invalidate_recordset(
+            ['attempts', 'error_message', 'processed', 'processed_date', 'write_uid', 'write_date'])
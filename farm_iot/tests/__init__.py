@@ -1 +1,8 @@
 from . import test_iot_automation
+from . import test_command_log
+from . import test_telemetry_partitioning
+from . import test_telemetry_rollup
+from . import test_telemetry_retention
+from . import test_telemetry_buffer
+from . import test_iot_mapping
+from . import test_telemetry_import
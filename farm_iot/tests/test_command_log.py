@@ -0,0 +1,61 @@
+import json
+from odoo.tests.common import TransactionCase
+
+class TestCommandLog(TransactionCase):
+
+    def setUp(self):
+        super(TestCommandLog, self).setUp()
+        self.Log = self.env['farm.command.log']
+        profile = self.env['iiot.device.profile'].create({
+            'name': 'Pump Profile',
+            'telemetry_topic_template': 't/{device}',
+            'command_topic_template': 'c/{device}',
+            'command_template': '{"a": "{{action}}"}'
+        })
+        self.pump = self.env['iiot.device'].create({
+            'name': 'Water Pump 1',
+            'serial_number': 'PUMP-001',
+            'device_id': 'pump01',
+            'profile_id': profile.id
+        })
+
+    def _log(self, command_id):
+        return self.Log.create({
+            'device_id': self.pump.id,
+            'command': 'power_on',
+            'command_id': command_id,
+        })
+
+    def test_01_apply_command_results(self):
+        """ 测试桥接服务回写指令确认结果与往返延迟 [US-06-03] """
+        acked, timed_out, pending = self._log('cmd_1'), self._log('cmd_2'), self._log('cmd_3')
+
+        updated = self.Log.apply_command_results([
+            {'command_id': 'cmd_1', 'status': 'success', 'latency_ms': 180},
+            {'command_id': 'cmd_2', 'status': 'timeout', 'latency_ms': 30000},
+            {'command_id': 'cmd_unknown', 'status': 'success', 'latency_ms': 5},
+            {'command_id': 'cmd_3', 'status': 'bogus'},
+        ])
+
+        self.assertEqual(updated, 2)
+        self.assertEqual((acked.status, acked.execution_time_ms), ('success', 180))
+        self.assertEqual((timed_out.status, timed_out.execution_time_ms), ('timeout', 30000))
+        self.assertEqual(pending.status, 'sent')
+
+        # 重复上报不会覆盖已确认的结果
+        self.assertEqual(self.Log.apply_command_results([
+            {'command_id': 'cmd_1', 'status': 'timeout', 'latency_ms': 30000},
+        ]), 0)
+        self.assertEqual(acked.status, 'success')
+
+    def test_02_send_command_outbox(self):
+        """ 测试下发指令写入发件箱, 事务内不调用网关; 放弃重试后日志记为失败 """
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_bridge_url', 'http://127.0.0.1:9')
+        self.env['ir.config_parameter'].sudo().set_param('iiot.command_max_attempts', '1')
+        log = self.pump.send_command('power_on', state='on')
+        outbox = self.env['iiot.command.outbox'].search([('command_id', '=', log.command_id)])
+        self.assertEqual((log.status, outbox.state), ('sent', 'pending'))
+        self.assertEqual(json.loads(outbox.payload), {'a': 'power_on'})
+
+        outbox._retry_later({log.command_id: 'bridge down'})
+        self.assertEqual((outbox.state, log.status), ('failed', 'failed'))
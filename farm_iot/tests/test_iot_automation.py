@@ -32,7 +32,9 @@ class TestIotAutomation(TransactionCase):
             'target_device_id': self.pump.id,
             'command_to_send': 'power_on'
         })
-        
+        # 指令写入发件箱, 提交后才发送
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_bridge_url', 'http://127.0.0.1:9')
+
         # 模拟产生一条低溶氧遥测数据 (3.5 < 4.0)
         # 注意：实际代码会在 create 时触发 check_and_trigger
         # 我们在这里模拟 telemetry 记录
@@ -46,3 +48,144 @@ class TestIotAutomation(TransactionCase):
         log = self.env['farm.command.log'].search([('device_id', '=', self.pump.id)])
         self.assertTrue(log)
         self.assertEqual(log[0].command, 'power_on')
+
+    def test_02_edge_ruleset(self):
+        """ 测试规则编译为桥接服务规则集并记录边缘触发 [US-06-02] """
+        rule = self.Rule.create({
+            'name': 'Oxygen Alert',
+            'sensor_type': 'dissolved_oxygen',
+            'operator': '<',
+            'threshold': 4.0,
+            'target_device_id': self.pump.id,
+            'command_to_send': 'power_on'
+        })
+        self.Rule.create({
+            'name': 'Manual pH',
+            'sensor_type': 'ph',
+            'threshold': 6.0,
+            'target_device_id': self.pump.id,
+            'evaluation': 'odoo'
+        })
+
+        ruleset = self.Rule.get_edge_ruleset()
+        compiled = [r for r in ruleset['rules'] if r['id'] == rule.id]
+        self.assertEqual(len(compiled), 1)
+        self.assertEqual(compiled[0]['device_id'], 'pump01')
+        self.assertTrue(compiled[0]['topic'].endswith('c/pump01'))
+        self.assertEqual(compiled[0]['payload'], {'a': 'power_on'})
+        self.assertNotIn('ph', [r['sensor_type'] for r in ruleset['rules']])
+
+        # 规则变更后版本随之变化
+        rule.threshold = 3.0
+        self.assertNotEqual(self.Rule.get_edge_ruleset()['version'], ruleset['version'])
+
+        triggers = [{'rule_id': rule.id, 'command_id': 'edge_1', 'source_device_id': 'do01', 'value': 2.5}]
+        self.assertEqual(self.Rule.record_edge_triggers(triggers), 1)
+        self.assertEqual(self.Rule.record_edge_triggers(triggers), 0)
+        log = self.env['farm.command.log'].search([('command_id', '=', 'edge_1')])
+        self.assertEqual((log.device_id, log.command, log.status), (self.pump, 'power_on', 'sent'))
+
+        # 设备遥测已在边缘判定，Odoo 不再重复下发
+        telemetry = self.Telemetry.create({
+            'name': 'Oxygen Sensor 1',
+            'sensor_type': 'dissolved_oxygen',
+            'value': 2.0,
+            'device_id': self.pump.id
+        })
+        self.assertFalse(rule.check_and_trigger(telemetry))
+
+    def test_03_batch_hysteresis_and_dedupe(self):
+        """ 测试整批判定: 迟滞与去抖避免反复触发, 每个目标设备每批只下发一次 [US-06-02] """
+        self.Rule.create({
+            'name': 'Low Oxygen',
+            'sensor_type': 'dissolved_oxygen',
+            'operator': '<',
+            'threshold': 4.0,
+            'hysteresis': 1.0,
+            'target_device_id': self.pump.id,
+            'command_to_send': 'power_on',
+            'evaluation': 'odoo',
+        })
+        rule_high = self.Rule.create({
+            'name': 'Very Low Oxygen',
+            'sensor_type': 'dissolved_oxygen',
+            'operator': '<',
+            'threshold': 3.0,
+            'debounce_seconds': 3600,
+            'target_device_id': self.pump.id,
+            'command_to_send': 'boost',
+            'evaluation': 'odoo',
+        })
+        Log = self.env['farm.command.log']
+        # 指令写入发件箱, 提交后才发送, 不影响遥测写入
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_bridge_url', 'http://127.0.0.1:9')
+
+        # 3.8 触发, 4.5 未超过 4.0 + 1.0 不重新布防, 3.9 不再触发; 2.5 触发第二条规则
+        # 两条规则都指向同一台泵, 本批只下发最新读数触发的指令
+        self.Telemetry.create([{
+            'name': 'Oxygen Sensor 1',
+            'sensor_type': 'dissolved_oxygen',
+            'value': value,
+            'timestamp': f'2024-05-01 08:0{minute}:00',
+        } for minute, value in enumerate([3.8, 4.5, 3.9, 2.5])])
+        logs = Log.search([('device_id', '=', self.pump.id)])
+        self.assertEqual(logs.mapped('command'), ['boost'])
+        self.assertFalse(rule_high.armed)
+
+        # 读数回到 5.0 以上后重新布防; 第二条规则在去抖时间内不再触发
+        self.Telemetry.create([{
+            'name': 'Oxygen Sensor 1',
+            'sensor_type': 'dissolved_oxygen',
+            'value': value,
+            'timestamp': f'2024-05-01 09:0{minute}:00',
+        } for minute, value in enumerate([5.2, 2.0, 3.5])])
+        logs = Log.search([('device_id', '=', self.pump.id)], order='id')
+        self.assertEqual(logs.mapped('command'), ['boost', 'power_on'])
+
+    def test_04_rule_index_queries(self):
+        """ 测试规则索引按工作进程缓存, 批量写入不再逐条查询规则 """
+        self.Rule.create({
+            'name': 'High Temperature',
+            'sensor_type': 'temperature',
+            'operator': '>',
+            'threshold': 35.0,
+            'target_device_id': self.pump.id,
+            'evaluation': 'odoo',
+        })
+        self.Rule._get_rule_index()
+        queries = self.env.cr.sql_log_count
+        self.assertEqual(self.Rule._match_reading('temperature', 36.0)[0][0].threshold, 35.0)
+        self.assertEqual(self.Rule._match_reading('temperature', 20.0), ([], []))
+        self.assertEqual(self.env.cr.sql_log_count, queries)
+
+    def test_05_unchanged_state_not_written(self):
+        """ 测试只确认已有状态的读数不更新规则, 只有状态改变时才写回 (并加锁) """
+        rule = self.Rule.create({
+            'name': 'Low Oxygen',
+            'sensor_type': 'dissolved_oxygen',
+            'operator': '<',
+            'threshold': 4.0,
+            'target_device_id': self.pump.id,
+            'command_to_send': 'power_on',
+            'evaluation': 'odoo',
+        })
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_bridge_url', 'http://127.0.0.1:9')
+        readings = self.Telemetry.create([{
+            'name': 'Oxygen Sensor 1',
+            'sensor_type': 'dissolved_oxygen',
+            'value': value,
+            'timestamp': f'2024-05-01 10:0{minute}:00',
+        } for minute, value in enumerate([6.0, 3.0])])
+        self.assertFalse(rule.armed)
+        self.env.flush_all()
+
+        # 已布防时重新布防与未布防时再次越限都只读取状态
+        self.env.cr.execute("UPDATE farm_automation_rule SET armed = true WHERE id = %s", [rule.id])
+        queries = self.env.cr.sql_log_count
+        self.assertFalse(self.Rule._evaluate_telemetry(readings[0]))
+        self.assertEqual(self.env.cr.sql_log_count - queries, 1)
+
+        self.env.cr.execute("UPDATE farm_automation_rule SET armed = false WHERE id = %s", [rule.id])
+        queries = self.env.cr.sql_log_count
+        self.assertFalse(self.Rule._evaluate_telemetry(readings[1]))
+        self.assertEqual(self.env.cr.sql_log_count - queries, 1)
@@ -0,0 +1,63 @@
+from .test_telemetry_buffer import TestTelemetryBufferCommon
+
+class TestIotMappingTopicIndex(TestTelemetryBufferCommon):
+
+    def _mapping(self, topic, **values):
+        return self.env['iot.device.mapping'].create(dict({
+            'name': topic,
+            'device_id': self.meters[0].id,
+            'mqtt_topic': topic,
+            'target_model_id': self.env['ir.model']._get('iiot.device').id,
+            'target_field_id': self.env['ir.model.fields']._get('iiot.device', 'firmware_version').id,
+            'match_field_id': self.env['ir.model.fields']._get('iiot.device', 'site').id,
+        }, **values))
+
+    def test_01_wildcards(self):
+        """ 测试精确主题优先, + 匹配单层, # 匹配其余所有层级 """
+        single = self._mapping('farm/meter/+/reading')
+        multi = self._mapping('farm/#')
+        Mapping = self.env['iot.device.mapping']
+        resolved = Mapping._resolve_topics([
+            'farm/meter/01/reading', 'farm/meter/02/reading', 'farm/pond/01/ph', 'farm', 'lab/meter', '$SYS/farm',
+        ])
+        self.assertEqual(resolved, {
+            'farm/meter/01/reading': self.mapping.id,
+            'farm/meter/02/reading': single.id,
+            'farm/pond/01/ph': multi.id,
+            'farm': multi.id,
+        })
+
+    def test_02_bulk_resolution(self):
+        """ 测试批量写入缓冲时基于缓存索引解析映射, 不逐行查询 """
+        single = self._mapping('farm/meter/+/reading')
+        self.env['iot.device.mapping']._resolve_topics([])
+        queries = self.env.cr.sql_log_count
+        buffers = self.Buffer.create([
+            {'mqtt_topic': f'farm/meter/0{index}/reading', 'raw_value': str(index)} for index in range(1, 51)
+        ])
+        # 一次插入, 映射解析不产生查询
+        self.assertLessEqual(self.env.cr.sql_log_count - queries, 3)
+        self.assertEqual(buffers[0].mapping_id, self.mapping)
+        self.assertEqual(buffers[1:].mapping_id, single)
+
+    def test_03_invalidation(self):
+        """ 测试映射变更后主题索引失效 """
+        Mapping = self.env['iot.device.mapping']
+        self.assertFalse(Mapping._resolve_topics(['farm/meter/02/reading']))
+        single = self._mapping('farm/meter/+/reading')
+        self.assertEqual(Mapping._resolve_topics(['farm/meter/02/reading']), {'farm/meter/02/reading': single.id})
+        single.mqtt_topic = 'farm/pond/+/reading'
+        self.assertFalse(Mapping._resolve_topics(['farm/meter/02/reading']))
+        self.mapping.active = False
+        self.assertFalse(Mapping._resolve_topics(['farm/meter/01/reading']))
+
+    def test_04_wildcard_targets(self):
+        """ 测试通配映射按实际主题匹配目标记录 """
+        self.mapping.mqtt_topic = 'farm/meter/+/reading'
+        self.meters[2].site = 'farm/meter/02/reading'
+        self.Buffer.create([
+            {'mqtt_topic': 'farm/meter/01/reading', 'raw_value': 'a'},
+            {'mqtt_topic': 'farm/meter/02/reading', 'raw_value': 'b'},
+        ])
+        self.Buffer._process_buffer_chunk(limit=100)
+        self.assertEqual(self.meters.mapped('firmware_version'), ['a', 'a', 'b'])
@@ -0,0 +1,117 @@
+import logging
+import time
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+class TestTelemetryBufferCommon(TransactionCase):
+
+    def setUp(self):
+        super(TestTelemetryBufferCommon, self).setUp()
+        self.Buffer = self.env['iot.telemetry.buffer']
+        profile = self.env['iiot.device.profile'].create({
+            'name': 'Meter Profile',
+            'telemetry_topic_template': 't/{device}',
+            'command_topic_template': 'c/{device}',
+            'command_template': '{"a": "{{action}}"}'
+        })
+        self.meters = self.env['iiot.device'].create([{
+            'serial_number': f'METER-00{index}',
+            'device_id': f'meter0{index}',
+            'profile_id': profile.id,
+            'site': 'farm/meter/01/reading',
+        } for index in range(3)])
+        self.mapping = self.env['iot.device.mapping'].create({
+            'name': 'Meter Reading',
+            'device_id': self.meters[0].id,
+            'mqtt_topic': 'farm/meter/01/reading',
+            'mapping_type': 'field',
+            'target_model_id': self.env['ir.model']._get('iiot.device').id,
+            'target_field_id': self.env['ir.model.fields']._get('iiot.device', 'firmware_version').id,
+            'match_field_id': self.env['ir.model.fields']._get('iiot.device', 'site').id,
+        })
+
+
+class TestTelemetryBuffer(TestTelemetryBufferCommon):
+
+    def test_01_process_chunk(self):
+        """ 测试按映射分组处理缓冲: 每个映射一次查询与一次写入, 处理标记一次更新 [US-TECH-03-02] """
+        buffers = self.Buffer.create([
+            {'mqtt_topic': 'farm/meter/01/reading', 'raw_value': f'v{index}'} for index in range(5)
+        ])
+        unmapped = self.Buffer.create({'mqtt_topic': 'farm/unknown', 'raw_value': 'x'})
+        self.assertEqual(buffers.mapping_id, self.mapping)
+
+        queries = self.env.cr.sql_log_count
+        self.assertEqual(self.Buffer._process_buffer_chunk(limit=100), 6)
+        # 领取, 映射读取, 目标查询, 写入, 处理标记: 与行数无关
+        self.assertLessEqual(self.env.cr.sql_log_count - queries, 12)
+
+        self.assertEqual(self.meters.mapped('firmware_version'), ['v4'] * 3)
+        self.assertTrue(all((buffers | unmapped).mapped('processed')))
+        self.assertTrue(all(buffers.mapped('processed_date')))
+        self.assertEqual(self.Buffer._process_buffer_chunk(limit=100), 0)
+
+    def test_02_chunk_limit(self):
+        """ 测试每次只领取一块, 剩余行留给下一块或其他工作进程 """
+        self.Buffer.create([
+            {'mqtt_topic': 'farm/meter/01/reading', 'raw_value': f'v{index}'} for index in range(5)
+        ])
+        self.assertEqual(self.Buffer._process_buffer_chunk(limit=3), 3)
+        self.assertEqual(self.meters[0].firmware_version, 'v2')
+        self.assertEqual(self.Buffer._process_buffer_chunk(limit=3), 2)
+        self.assertEqual(self.meters[0].firmware_version, 'v4')
+
+    def test_03_bad_value(self):
+        """ 测试组内一个错误值不阻塞其他行, 错误行重试到上限后不再领取 """
+        self.env['ir.config_parameter'].sudo().set_param('farm_iot.buffer_max_attempts', 2)
+        self.mapping.target_field_id = self.env['ir.model.fields']._get('iiot.device', 'last_command')
+        good, bad = self.Buffer.create([
+            {'mqtt_topic': 'farm/meter/01/reading', 'raw_value': '2024-05-01 08:00:00'},
+            {'mqtt_topic': 'farm/meter/01/reading', 'raw_value': 'not a date'},
+        ])
+
+        self.assertEqual(self.Buffer._process_buffer_chunk(limit=100), 2)
+        self.assertTrue(good.processed)
+        self.assertEqual(str(self.meters[0].last_command), '2024-05-01 08:00:00')
+        self.assertFalse(bad.processed)
+        self.assertEqual(bad.attempts, 1)
+        self.assertTrue(bad.error_message)
+
+        self.assertEqual(self.Buffer._process_buffer_chunk(limit=100), 1)
+        self.assertTrue(bad.processed)
+        self.assertEqual(bad.attempts, 2)
+        self.assertEqual(self.Buffer._process_buffer_chunk(limit=100), 0)
+
+
+@tagged('post_install', '-at_install', '-standard', 'farm_iot_throughput')
+class TestTelemetryBufferThroughput(TestTelemetryBufferCommon):
+    """ 吞吐测试, 默认不运行: --test-tags farm_iot_throughput """
+
+    ROWS = 1000000
+    CHUNK = 10000
+
+    def test_throughput(self):
+        """ 测试 100 万行缓冲的消费吞吐 """
+        self.env.cr.execute("""
+            INSERT INTO iot_telemetry_buffer (mqtt_topic, raw_value, processed, mapping_id, create_date, write_date)
+            SELECT %s, 'v' || n, false, %s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM generate_series(1, %s) AS n
+        """, [self.mapping.mqtt_topic, self.mapping.id, self.ROWS])
+
+        started = time.time()
+        processed = 0
+        while True:
+            count = self.Buffer._process_buffer_chunk(limit=self.CHUNK)
+            if not count:
+                break
+            processed += count
+        elapsed = time.time() - started
+
+        _logger.info("Telemetry buffer throughput: %d rows in %.1f s, %.0f rows/s",
+                     processed, elapsed, processed / elapsed)
+        self.assertEqual(processed, self.ROWS)
+        self.assertEqual(self.meters[0].firmware_version, f'v{self.ROWS}')
+        self.env.cr.execute("SELECT count(*) FROM iot_telemetry_buffer WHERE NOT processed")
+        self.assertEqual(self.env.cr.fetchone()[0], 0)
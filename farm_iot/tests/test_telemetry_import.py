@@ -0,0 +1,119 @@
+import base64
+import io
+import logging
+import time
+from datetime import datetime, timedelta
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+class TestTelemetryImportCommon(TransactionCase):
+
+    def setUp(self):
+        super(TestTelemetryImportCommon, self).setUp()
+        self.Import = self.env['farm.telemetry.import']
+        self.Telemetry = self.env['farm.telemetry']
+        self.task = self.env['project.task'].create({'name': 'Pond 05 Management'})
+        self.parcel = self.env['stock.location'].create({'name': 'Pond 05', 'barcode': 'POND-05'})
+        profile = self.env['iiot.device.profile'].create({
+            'name': 'Logger Profile',
+            'telemetry_topic_template': 't/{device}',
+            'command_topic_template': 'c/{device}',
+            'command_template': '{"a": "{{action}}"}'
+        })
+        self.logger_device = self.env['iiot.device'].create({
+            'serial_number': 'LOGGER-005',
+            'device_id': 'logger05',
+            'profile_id': profile.id,
+        })
+
+
+class TestTelemetryImport(TestTelemetryImportCommon):
+
+    def test_01_import_csv(self):
+        """ 测试 CSV 导入: 查找表解析设备与地块, 无法解析的行跳过, 汇总增量合并 """
+        content = "\n".join([
+            "timestamp,sensor_type,value,device,parcel",
+            "2021-03-01 08:10:00,temperature,20.5,logger05,POND-05",
+            "2021-03-01T08:50:00+08:00,temperature,22.5,LOGGER-005,Pond 05",
+            "2021-03-01 09:00:00,temperature,abc,logger05,POND-05",
+            "2021-03-01 09:00:00,wind,1.0,logger05,POND-05",
+            "2021-03-01 09:00:00,temperature,1.0,unknown,POND-05",
+        ])
+        result = self.Import.import_file(io.BytesIO(content.encode()), defaults={'production_id': self.task.id})
+
+        self.assertEqual((result['imported'], result['skipped']), (2, 3))
+        self.assertEqual(len(result['errors']), 3)
+        readings = self.Telemetry.search([('production_id', '=', self.task.id)], order='timestamp')
+        self.assertEqual(readings.mapped('value'), [22.5, 20.5])
+        # 带时区的时间戳转换为 UTC
+        self.assertEqual(readings[0].timestamp, datetime(2021, 3, 1, 0, 50))
+        self.assertEqual(readings.device_id, self.logger_device)
+        self.assertEqual(readings.land_parcel_id, self.parcel)
+
+        # 导入的读数由合并任务并入汇总
+        Rollup = self.env['farm.telemetry.rollup']
+        self.assertFalse(Rollup.search([('production_id', '=', self.task.id)]))
+        Rollup._merge_deltas(auto_commit=False)
+        day = Rollup.search([
+            ('production_id', '=', self.task.id), ('period', '=', 'day'),
+        ])
+        self.assertEqual((day.value_count, day.value_min, day.value_max), (2, 20.5, 22.5))
+
+        # 再次导入同一天的数据并入已有汇总
+        self.Import.import_rows([
+            {'timestamp': '2021-03-01 12:00:00', 'sensor_type': 'temperature', 'value': 30.0},
+        ], defaults={'production_id': self.task.id, 'device_id': self.logger_device.id,
+                     'land_parcel_id': self.parcel.id})
+        Rollup._merge_deltas(auto_commit=False)
+        self.assertEqual((day.value_count, day.value_max, day.value_last), (3, 30.0, 30.0))
+
+    def test_02_no_side_effects(self):
+        """ 测试导入不触发自动化规则 """
+        self.env['farm.automation.rule'].create({
+            'name': 'Historic Oxygen',
+            'sensor_type': 'dissolved_oxygen',
+            'operator': '<',
+            'threshold': 4.0,
+            'target_device_id': self.logger_device.id,
+            'evaluation': 'odoo',
+        })
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_bridge_url', 'http://127.0.0.1:9')
+        wizard = self.Import.create({
+            'file': base64.b64encode(b"timestamp,value\n2021-03-01 08:00:00,1.0\n"),
+            'filename': 'oxygen.csv',
+            'sensor_type': 'dissolved_oxygen',
+            'sensor_name': 'Oxygen Logger',
+            'production_id': self.task.id,
+        })
+        wizard.action_import()
+
+        self.assertEqual((wizard.state, wizard.imported_count), ('done', 1))
+        reading = self.Telemetry.search([('production_id', '=', self.task.id)])
+        self.assertEqual((reading.name, reading.value), ('Oxygen Logger', 1.0))
+        self.assertFalse(self.env['farm.command.log'].search([('device_id', '=', self.logger_device.id)]))
+
+
+@tagged('post_install', '-at_install', '-standard', 'farm_iot_throughput')
+class TestTelemetryImportThroughput(TestTelemetryImportCommon):
+    """ 吞吐测试, 默认不运行: --test-tags farm_iot_throughput """
+
+    ROWS = 1000000
+
+    def test_throughput(self):
+        """ 测试 100 万行 CSV 的导入吞吐 """
+        start = datetime(2020, 1, 1)
+        lines = ["timestamp,sensor_type,value,device,parcel"]
+        lines += [
+            f"{start + timedelta(minutes=index)},temperature,{index % 40},logger05,POND-05" for index in range(self.ROWS)
+        ]
+        content = io.BytesIO("\n".join(lines).encode())
+
+        started = time.time()
+        result = self.Import.import_file(content, defaults={'production_id': self.task.id})
+        elapsed = time.time() - started
+
+        _logger.info("Telemetry import throughput: %d rows in %.1f s, %.0f rows/min",
+                     result['imported'], elapsed, result['imported'] / elapsed * 60)
+        self.assertEqual(result['imported'], self.ROWS)
@@ -0,0 +1,91 @@
+from dateutil.relativedelta import relativedelta
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests.common import TransactionCase
+
+class TestTelemetryPartitioning(TransactionCase):
+
+    def setUp(self):
+        super(TestTelemetryPartitioning, self).setUp()
+        self.Telemetry = self.env['farm.telemetry']
+        self.task = self.env['project.task'].create({'name': 'Pond 02 Management'})
+        self.this_month = fields.Date.today().replace(day=1)
+        self.old_month = self.this_month - relativedelta(months=14)
+        self.old = self.Telemetry.create({
+            'name': 'Temp Sensor 01',
+            'sensor_type': 'temperature',
+            'value': 18.0,
+            'production_id': self.task.id,
+            'timestamp': fields.Datetime.to_datetime(self.old_month) + relativedelta(days=3),
+        })
+        self.recent = self.Telemetry.create({
+            'name': 'Temp Sensor 01',
+            'sensor_type': 'temperature',
+            'value': 21.0,
+            'production_id': self.task.id,
+        })
+
+    def _partitions(self):
+        self.env.cr.execute("""
+            SELECT child.relname FROM pg_inherits
+              JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+             WHERE pg_inherits.inhparent = 'farm_telemetry'::regclass
+        """)
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    def test_01_enable_partitioning(self):
+        """ 测试遥测表转换为按月分区后 ORM 读写保持透明 """
+        self.Telemetry.action_enable_partitioning()
+        self.Telemetry.invalidate_model()
+        self.assertTrue(self.Telemetry._is_partitioned())
+
+        partitions = self._partitions()
+        self.assertIn(self.Telemetry._partition_name(self.old_month), partitions)
+        self.assertIn(self.Telemetry._partition_name(self.this_month + relativedelta(months=3)), partitions)
+        self.assertIn('farm_telemetry_default', partitions)
+
+        # 数据与 ID 保留, 新记录继续使用原序列
+        records = self.Telemetry.search([('production_id', '=', self.task.id)])
+        self.assertEqual(records, self.recent | self.old)
+        self.assertEqual(records.mapped('value'), [21.0, 18.0])
+        new = self.Telemetry.create({'name': 'Temp Sensor 01', 'sensor_type': 'temperature', 'value': 22.0})
+        self.assertGreater(new.id, self.recent.id)
+        new.value = 23.0
+        self.assertEqual(self.Telemetry.browse(new.id).value, 23.0)
+
+        self.env.cr.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'farm_telemetry'")
+        indexes = {row[0] for row in self.env.cr.fetchall()}
+        self.assertIn('farm_telemetry_timestamp_brin', indexes)
+        self.assertIn('farm_telemetry_production_timestamp_index', indexes)
+        self.assertIn('farm_telemetry_parcel_sensor_timestamp_index', indexes)
+
+        with self.assertRaises(UserError):
+            self.Telemetry.action_enable_partitioning()
+
+    def test_02_maintain_partitions(self):
+        """ 测试定时任务预建分区, 迁出默认分区数据, 并卸载过期分区 """
+        self.env['ir.config_parameter'].sudo().set_param('farm_iot.telemetry_partition_months_ahead', 1)
+        self.Telemetry.action_enable_partitioning()
+
+        # 超出预建范围的数据落入默认分区, 对应分区创建后迁入
+        future_month = self.this_month + relativedelta(months=2)
+        future = self.Telemetry.create({
+            'name': 'Temp Sensor 01',
+            'sensor_type': 'temperature',
+            'value': 25.0,
+            'timestamp': fields.Datetime.to_datetime(future_month),
+        })
+        self.env['ir.config_parameter'].sudo().set_param('farm_iot.telemetry_partition_months_ahead', 2)
+        self.env['ir.config_parameter'].sudo().set_param('farm_iot.telemetry_partition_retention_months', 12)
+        self.Telemetry._cron_maintain_partitions()
+
+        partitions = self._partitions()
+        future_partition = self.Telemetry._partition_name(future_month)
+        self.assertIn(future_partition, partitions)
+        self.env.cr.execute(f"SELECT id FROM {future_partition}")
+        self.assertEqual(self.env.cr.fetchall(), [(future.id,)])
+
+        # 超过保留期的分区被卸载, 不再出现在查询中
+        self.assertNotIn(self.Telemetry._partition_name(self.old_month), partitions)
+        self.Telemetry.invalidate_model()
+        self.assertEqual(self.Telemetry.search([('production_id', '=', self.task.id)]), self.recent)
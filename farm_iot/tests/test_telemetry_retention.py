@@ -0,0 +1,71 @@
+from datetime import timedelta
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+class TestTelemetryRetention(TransactionCase):
+
+    def setUp(self):
+        super(TestTelemetryRetention, self).setUp()
+        self.Telemetry = self.env['farm.telemetry']
+        self.Retention = self.env['farm.telemetry.retention']
+        self.Rollup = self.env['farm.telemetry.rollup']
+        self.task = self.env['project.task'].create({'name': 'Pond 04 Management'})
+        self.now = fields.Datetime.now()
+
+    def _log(self, sensor_type, days_ago, value=20.0):
+        return self.Telemetry.create({
+            'name': 'Sensor 04',
+            'sensor_type': sensor_type,
+            'value': value,
+            'production_id': self.task.id,
+            'timestamp': self.now - timedelta(days=days_ago),
+        })
+
+    def test_01_raw_purge_and_archive(self):
+        """ 测试原始遥测按传感器类型分层清理, 归档为压缩列式文件, 汇总保留 """
+        policy = self.Retention.create({'sensor_type': 'temperature', 'raw_days': 30})
+        default = self.Retention.create({'raw_days': 365})
+        old = self._log('temperature', 40, 18.5) | self._log('temperature', 35, 19.5)
+        recent = self._log('temperature', 5)
+        other = self._log('ph', 40)
+        self.Rollup._merge_deltas(auto_commit=False)
+
+        self.Retention._apply_retention(batch_size=1, auto_commit=False)
+
+        self.assertFalse(old.exists())
+        self.assertTrue(recent.exists())
+        # ph 属于默认策略, 保留 365 天
+        self.assertTrue(other.exists())
+        self.assertEqual(policy.purged_count, 2)
+        self.assertEqual(default.purged_count, 0)
+
+        # 每批一个归档文件
+        self.assertEqual(policy.archive_count, 2)
+        rows = [row for attachment in policy.archive_ids for row in self.Retention.read_archive(attachment)]
+        self.assertEqual(sorted(row['value'] for row in rows), [18.5, 19.5])
+        self.assertEqual({row['production_id'] for row in rows}, {self.task.id})
+
+        # 汇总不受原始遥测清理影响
+        self.assertEqual(self.Rollup.search_count([
+            ('production_id', '=', self.task.id), ('sensor_type', '=', 'temperature'), ('period', '=', 'day'),
+        ]), 3)
+
+    def test_02_rollup_and_buffer_purge(self):
+        """ 测试汇总超过保留期被清理, 已处理的缓冲被清理 """
+        self.Retention.create({'sensor_type': 'humidity', 'raw_days': 10, 'rollup_days': 60, 'archive': False})
+        self._log('humidity', 90)
+        self._log('humidity', 30)
+        self.Rollup._merge_deltas(auto_commit=False)
+
+        Buffer = self.env['iot.telemetry.buffer']
+        processed = Buffer.create({'mqtt_topic': 'farm/t1', 'raw_value': '1', 'processed': True,
+                                   'processed_date': self.now - timedelta(days=30)})
+        pending = Buffer.create({'mqtt_topic': 'farm/t1', 'raw_value': '2'})
+
+        self.Retention._apply_retention(auto_commit=False)
+
+        self.assertFalse(self.Telemetry.search([('production_id', '=', self.task.id)]))
+        rollups = self.Rollup.search([('production_id', '=', self.task.id), ('period', '=', 'day')])
+        self.assertEqual(len(rollups), 1)
+        self.assertFalse(processed.exists())
+        self.assertTrue(pending.exists())
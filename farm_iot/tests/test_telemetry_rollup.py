@@ -0,0 +1,109 @@
+from datetime import datetime
+from odoo.tests.common import TransactionCase
+
+class TestTelemetryRollup(TransactionCase):
+
+    def setUp(self):
+        super(TestTelemetryRollup, self).setUp()
+        self.Telemetry = self.env['farm.telemetry']
+        self.Rollup = self.env['farm.telemetry.rollup']
+        self.task = self.env['project.task'].create({'name': 'Pond 03 Management'})
+
+    def _log(self, value, timestamp):
+        return self.Telemetry.create({
+            'name': 'Temp Sensor 03',
+            'sensor_type': 'temperature',
+            'value': value,
+            'production_id': self.task.id,
+            'timestamp': timestamp,
+        })
+
+    def _rollup(self, period, period_start):
+        self.Rollup._merge_deltas(auto_commit=False)
+        return self.Rollup.search([
+            ('production_id', '=', self.task.id),
+            ('period', '=', period),
+            ('period_start', '=', period_start),
+        ])
+
+    def test_01_incremental_rollup(self):
+        """ 测试写入遥测时增量维护小时与日汇总 """
+        self._log(20.0, datetime(2024, 5, 1, 8, 10))
+        self._log(24.0, datetime(2024, 5, 1, 8, 50))
+        self._log(18.0, datetime(2024, 5, 1, 8, 30))
+        self._log(30.0, datetime(2024, 5, 1, 14, 0))
+        # 写入遥测只追加增量, 不锁定汇总行
+        self.assertFalse(self.Rollup.search([('production_id', '=', self.task.id)]))
+
+        hour = self._rollup('hour', datetime(2024, 5, 1, 8, 0))
+        self.assertEqual(len(hour), 1)
+        self.assertEqual((hour.value_min, hour.value_max, hour.value_count), (18.0, 24.0, 3))
+        self.assertAlmostEqual(hour.value_avg, 62.0 / 3)
+        # 最新值按时间戳而非写入顺序
+        self.assertEqual(hour.value_last, 24.0)
+
+        day = self._rollup('day', datetime(2024, 5, 1))
+        self.assertEqual((day.value_min, day.value_max, day.value_count, day.value_last), (18.0, 30.0, 4, 30.0))
+        self.assertEqual(self.Rollup.search_count([('production_id', '=', self.task.id)]), 3)
+
+    def test_02_rebuild_after_change(self):
+        """ 测试修改或删除原始遥测后从汇总中减去旧值并计入新值 """
+        first = self._log(20.0, datetime(2024, 5, 1, 8, 10))
+        second = self._log(24.0, datetime(2024, 5, 1, 8, 50))
+        second.value = 10.0
+        hour = self._rollup('hour', datetime(2024, 5, 1, 8, 0))
+        self.assertEqual((hour.value_min, hour.value_max, hour.value_last), (10.0, 20.0, 10.0))
+
+        first.unlink()
+        hour = self._rollup('hour', datetime(2024, 5, 1, 8, 0))
+        self.assertEqual((hour.value_min, hour.value_count), (10.0, 1))
+
+        second.unlink()
+        self.assertFalse(self.Rollup.search([('production_id', '=', self.task.id)]))
+
+    def test_03_weighted_average(self):
+        """ 测试基于日汇总按条数加权的平均值 """
+        self._log(10.0, datetime(2024, 5, 1, 8, 0))
+        self._log(20.0, datetime(2024, 5, 2, 8, 0))
+        self._log(30.0, datetime(2024, 5, 2, 9, 0))
+        self.Rollup._merge_deltas(auto_commit=False)
+        domain = [('production_id', '=', self.task.id)]
+        self.assertAlmostEqual(self.Rollup.get_average('temperature', domain), 20.0)
+        self.assertEqual(
+            sorted(self.Rollup.get_average('temperature', domain, group_by='period_start:day').values()),
+            [10.0, 25.0]
+        )
+        self.assertEqual(self.Rollup.get_average('temperature', domain, group_by='production_id'), {self.task.id: 20.0})
+        self.assertIsNone(self.Rollup.get_average('ph', domain))
+
+    def test_04_change_after_purge(self):
+        """ 测试原始遥测被保留策略清理后修改其他读数, 已清理数据的汇总保留 """
+        self._log(10.0, datetime(2024, 5, 1, 8, 0))
+        self._log(30.0, datetime(2024, 5, 1, 9, 0))
+        kept = self._log(20.0, datetime(2024, 5, 2, 8, 0))
+        self.Rollup._merge_deltas(auto_commit=False)
+        # 保留策略以 SQL 清理原始遥测, 不经过 ORM
+        self.env.cr.execute('DELETE FROM farm_telemetry WHERE production_id = %s AND "timestamp" < %s',
+                            [self.task.id, datetime(2024, 5, 2)])
+        self.Telemetry.invalidate_model()
+
+        # 移入已清理的一天
+        kept.write({'value': 26.0, 'timestamp': datetime(2024, 5, 1, 12, 0)})
+        day = self._rollup('day', datetime(2024, 5, 1))
+        self.assertEqual((day.value_min, day.value_max, day.value_sum, day.value_count, day.value_last),
+                         (10.0, 30.0, 66.0, 3, 26.0))
+        self.assertEqual(self._rollup('hour', datetime(2024, 5, 1, 8, 0)).value_count, 1)
+        self.assertFalse(self._rollup('day', datetime(2024, 5, 2)))
+
+        # 修改桶内的最新值: 按桶内仍在的原始遥测重新取值, 总和与条数直接加减
+        kept.value = 12.0
+        day = self._rollup('day', datetime(2024, 5, 1))
+        self.assertEqual((day.value_min, day.value_max, day.value_sum, day.value_count, day.value_last),
+                         (10.0, 30.0, 52.0, 3, 12.0))
+
+        # 桶内原始遥测不完整: 被减去的读数是最小值时保留原值, 不按剩余读数收窄
+        kept.value = 5.0
+        kept.value = 28.0
+        day = self._rollup('day', datetime(2024, 5, 1))
+        self.assertEqual((day.value_min, day.value_max, day.value_sum, day.value_count, day.value_last),
+                         (5.0, 30.0, 68.0, 3, 28.0))
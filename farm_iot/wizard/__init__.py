@@ -1 +1,2 @@
 from . import farm_device_command
+from . import farm_telemetry_import
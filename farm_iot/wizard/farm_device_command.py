@@ -36,19 +36,8 @@ class FarmDeviceCommand(models.TransientModel):
 
         # 调用底层 industrial_iot 的发送能力
         try:
-            import time
-            start_ts = time.time()
+            # 审计日志由 send_command 创建，桥接服务在设备确认后回写往返延迟 [US-06-03]
             self.device_id.send_command(action_name, **params)
-            latency = int((time.time() - start_ts) * 1000)
-            
-            # 记录审计日志 [US-06-03]
-            self.env['farm.command.log'].create({
-                'device_id': self.device_id.id,
-                'command': action_name,
-                'params': str(params),
-                'status': 'success',
-                'execution_time_ms': latency
-            })
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
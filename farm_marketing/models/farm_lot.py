@@ -109,7 +109,7 @@ class FarmLotMarketing(models.Model):
     marketing_image_ids = fields.Many2many('ir.attachment', string="Marketing Photos")
     
     # 溯源面板显示的指标快照
-    avg_temp = fields.Float("Average Growth Temperature (℃)")
+    avg_temp = fields.Float("Average Growth Temperature (℃)", compute='_compute_avg_temp')
     water_purity = fields.Char("Water Purity Grade")
 
     # Expiry & Promotion [US-14-14]
@@ -126,6 +126,24 @@ class FarmLotMarketing(models.Model):
             else:
                 lot.is_near_expiry = False
 
+    def _compute_avg_temp(self):
+        """ 生长期平均温度: 读取生产任务的遥测日汇总 (安装 farm_iot 时) """
+        self.avg_temp = 0.0
+        if 'farm.telemetry.rollup' not in self.env:
+            return
+        productions = self.env['mrp.production'].search([('lot_producing_id', 'in', self.ids)])
+        task_by_lot = {
+            production.lot_producing_id.id: production.agri_task_id.id
+            for production in productions if production.agri_task_id
+        }
+        if not task_by_lot:
+            return
+        averages = self.env['farm.telemetry.rollup'].sudo().get_average(
+            'temperature', [('production_id', 'in', list(task_by_lot.values()))], group_by='production_id'
+        )
+        for lot in self:
+            lot.avg_temp = averages.get(task_by_lot.get(lot.id), 0.0)
+
     def get_full_traceability_data(self):
         """
         核心溯源算法：聚合该批次从种子到餐桌的全生命周期数据 [US-15-03, US-08-01]
@@ -142,6 +160,7 @@ class FarmLotMarketing(models.Model):
             'harvest_date': self.create_date,
             'plot': task.land_parcel_id.name if task else _('Unknown'),
             'gis': {'lat': task.gps_lat, 'lng': task.gps_lng} if task else False,
+            'avg_temp': self.avg_temp,
             'interventions': [],
             'inputs': [],
             'processing_history': []
@@ -33,25 +33,18 @@ class AgriculturalCampaign(models.Model):
                 rec.accumulated_gdd = 0
                 continue
             
-            # 1. 从 farm_iot 模块获取该地块的每日均温
-            # 简化逻辑：查询该地块关联设备的 'air_temp' 遥测记录
-            telemetries = self.env['farm.telemetry'].search([
-                ('parcel_id', '=', rec.land_parcel_id.id),
-                ('timestamp', '>=', fields.Datetime.to_string(rec.date_start)),
-                ('key', '=', 'air_temp')
-            ])
-            
-            # 按天计算积温：Sum(Max(0, DailyAvgTemp - BaseTemp))
-            # 注意：实际生产中应使用 SQL 分组聚合以提升性能
+            # 1. 从 farm_iot 模块的遥测日汇总获取该地块的每日均温
             daily_avgs = {}
-            for t in telemetries:
-                d = t.timestamp.date()
-                daily_avgs.setdefault(d, []).append(t.value_float)
+            if 'farm.telemetry.rollup' in self.env:
+                daily_avgs = self.env['farm.telemetry.rollup'].sudo().get_average('temperature', [
+                    ('land_parcel_id', '=', rec.land_parcel_id.id),
+                    ('period_start', '>=', fields.Datetime.to_string(rec.date_start)),
+                ], group_by='period_start:day')
             
+            # 按天计算积温：Sum(Max(0, DailyAvgTemp - BaseTemp))
             total_gdd = 0.0
             days_count = 0
-            for d, vals in daily_avgs.items():
-                avg = sum(vals) / len(vals)
+            for d, avg in daily_avgs.items():
                 total_gdd += max(0, avg - rec.base_temperature)
                 days_count += 1
             
@@ -104,14 +104,12 @@ class ProjectTask(models.Model):
                 task.days_to_safety = 0
 
     def action_view_telemetry(self):
-        """ 跳转至该任务关联的遥测趋势图 [US-11-03] """
+        """ 跳转至该任务关联的遥测趋势图 [US-11-03], 读取小时汇总而非原始遥测 """
         self.ensure_one()
-        action = self.env["ir.actions.actions"]._for_xml_id("farm_iot.action_farm_telemetry")
-        action['domain'] = [('production_id', '=', self.id)]
+        action = self.env["ir.actions.actions"]._for_xml_id("farm_iot.action_farm_telemetry_rollup")
+        action['domain'] = [('production_id', '=', self.id), ('period', '=', 'hour')]
         action['context'] = {
-            'default_production_id': self.id,
-            'default_land_parcel_id': self.land_parcel_id.id,
-            'group_by': 'timestamp:hour'
+            'group_by': 'period_start:hour'
         }
         return action
 
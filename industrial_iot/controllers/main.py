@@ -51,7 +51,8 @@ class IndustrialIotController(http.Controller):
                 'status': 'success',
                 'device_id': device.device_id,
                 'mqtt': mqtt_config,
-                'topics': device.get_topic_map()
+                'topics': device.get_topic_map(),
+                'payload_encoding': device.profile_id.payload_encoding or 'json'
             }
 
             # Invalidate the token after successful config download
@@ -69,10 +70,8 @@ class IndustrialIotController(http.Controller):
 
     def _generate_mqtt_config(self, device):
         """Generate MQTT configuration for device"""
-        # Get MQTT broker settings from system parameters
-        mqtt_host = request.env['ir.config_parameter'].sudo().get_param('iiot.mqtt_host', 'mqtt.factory.com')
-        mqtt_port = int(request.env['ir.config_parameter'].sudo().get_param('iiot.mqtt_port', '8883'))
-        use_tls = request.env['ir.config_parameter'].sudo().get_param('iiot.mqtt_use_tls', 'True').lower() == 'true'
+        # Get MQTT broker settings from system parameters, cached until a parameter changes
+        mqtt_host, mqtt_port, use_tls = request.env['iiot.device'].sudo()._get_broker_settings()
 
         return {
             'host': mqtt_host,
@@ -83,6 +82,32 @@ class IndustrialIotController(http.Controller):
             'password': device.config_token or device.device_id  # Use token if available, otherwise device_id
         }
 
+    @http.route('/iiot/profiles/topics', type='json', auth='public', methods=['POST'], csrf=False)
+    def profile_topics(self, **post):
+        """
+        Topic templates of all device profiles, used by the MQTT bridge to build its topic router
+        """
+        try:
+            profiles = request.env['iiot.device.profile'].sudo().search_read([], [
+                'code', 'telemetry_topic_template', 'command_topic_template',
+                'ota_notify_topic_template', 'ota_status_topic_template', 'payload_encoding',
+                'deadband_type', 'deadband_value', 'min_interval', 'max_silence'
+            ])
+            for profile in profiles:
+                profile.pop('id', None)
+
+            return {
+                'status': 'success',
+                'profiles': profiles
+            }
+
+        except Exception as e:
+            _logger.error(f"Error in profile topics endpoint: {str(e)}")
+            return {
+                'error': str(e),
+                'status': 'error'
+            }
+
     @http.route('/iiot/webhook/<string:device_id>', type='json', auth='public', methods=['POST'], csrf=False)
     def telemetry_webhook(self, device_id, **post):
         """
@@ -101,10 +126,8 @@ class IndustrialIotController(http.Controller):
                     'status': 'error'
                 }
 
-            # Find device by device_id
-            device = request.env['iiot.device'].sudo().search([
-                ('device_id', '=', device_id)
-            ], limit=1)
+            # Find device by device_id, from the per-worker lookup cache
+            device = request.env['iiot.device'].sudo()._get_by_device_id(device_id)
 
             if not device:
                 _logger.warning(f"Webhook received for unknown device: {device_id}")
@@ -113,11 +136,16 @@ class IndustrialIotController(http.Controller):
                     'status': 'error'
                 }
 
-            # Process telemetry data based on topic
-            if 'telemetry' in topic:
-                device.process_telemetry_data(payload)
-            elif 'ota' in topic and 'status' in topic:
-                self._process_ota_status(device, payload)
+            # Skip requests the bridge is retrying after they were already processed.
+            # The receipt is claimed in the savepoint of the message, so it is only
+            # kept when the message was processed.
+            idempotency_key = request.httprequest.headers.get('Idempotency-Key')
+            with request.env.cr.savepoint():
+                if idempotency_key and not request.env['iiot.message.receipt'].sudo().claim([idempotency_key]):
+                    _logger.info(f"Duplicate webhook request {idempotency_key} for device {device_id} skipped")
+                    return {'status': 'success', 'duplicate': True}
+
+                self._dispatch_device_message(device, topic, payload)
 
             _logger.info(f"Telemetry received for device {device_id}: {topic}")
             return {'status': 'success'}
@@ -129,6 +157,120 @@ class IndustrialIotController(http.Controller):
                 'status': 'error'
             }
 
+    @http.route('/iiot/webhook_batch', type='json', auth='public', methods=['POST'], csrf=False)
+    def telemetry_webhook_batch(self, **post):
+        """
+        Batched webhook endpoint for telemetry data from MQTT bridge
+        Expected payload: {"messages": [{"id": "m1", "device_id": "device001",
+                                         "topic": "telemetry/device001/data", "payload": {...}}]}
+        All messages are processed in one transaction; each message runs in its own
+        savepoint so that a failing message does not roll back the rest of the batch.
+        Message ids are idempotency keys: messages already processed are skipped,
+        and the ids of messages that failed are released so that they can be retried.
+        """
+        try:
+            # Get request data
+            data = request.jsonrequest or {}
+            messages = data.get('messages') or []
+
+            if not isinstance(messages, list):
+                return {
+                    'error': 'Messages must be a JSON array',
+                    'status': 'error'
+                }
+
+            # Resolve all devices of the batch from the per-worker lookup cache
+            Device = request.env['iiot.device'].sudo()
+            devices_by_id = {}
+            for message in messages:
+                device_id = message.get('device_id') if isinstance(message, dict) else None
+                if device_id and device_id not in devices_by_id:
+                    devices_by_id[device_id] = Device._get_by_device_id(device_id)
+
+            # Claim all message ids at once; ids already claimed belong to retried messages
+            claimed_ids = request.env['iiot.message.receipt'].sudo().claim([
+                message.get('id') for message in messages if isinstance(message, dict)
+            ])
+
+            results = [self._process_batch_message(message, devices_by_id, claimed_ids) for message in messages]
+
+            failed = sum(1 for result in results if result['status'] != 'success')
+            _logger.info(f"Telemetry batch received: {len(results)} messages, {failed} failed")
+            return {
+                'status': 'success',
+                'results': results
+            }
+
+        except Exception as e:
+            _logger.error(f"Error in telemetry batch webhook: {str(e)}")
+            return {
+                'error': str(e),
+                'status': 'error'
+            }
+
+    def _process_batch_message(self, message, devices_by_id, claimed_ids):
+        """Process one message of a telemetry batch and return its result"""
+        if not isinstance(message, dict):
+            return {
+                'id': None,
+                'error': 'Message must be a JSON object',
+                'status': 'error'
+            }
+
+        message_id = message.get('id')
+        device_id = message.get('device_id')
+        payload = message.get('payload', {})
+
+        if not isinstance(payload, dict):
+            return {
+                'id': message_id,
+                'error': 'Payload must be a JSON object',
+                'status': 'error'
+            }
+
+        if message_id:
+            if message_id not in claimed_ids:
+                return {
+                    'id': message_id,
+                    'status': 'success',
+                    'duplicate': True
+                }
+            claimed_ids.discard(message_id)
+
+        device = devices_by_id.get(device_id)
+        if not device:
+            _logger.warning(f"Batch webhook received for unknown device: {device_id}")
+            request.env['iiot.message.receipt'].sudo().release([message_id])
+            return {
+                'id': message_id,
+                'error': f'Unknown device: {device_id}',
+                'status': 'error'
+            }
+
+        try:
+            with request.env.cr.savepoint():
+                self._dispatch_device_message(device, message.get('topic', ''), payload)
+        except Exception as e:
+            _logger.error(f"Error processing batch message {message_id} for device {device_id}: {str(e)}")
+            request.env['iiot.message.receipt'].sudo().release([message_id])
+            return {
+                'id': message_id,
+                'error': str(e),
+                'status': 'error'
+            }
+
+        return {
+            'id': message_id,
+            'status': 'success'
+        }
+
+    def _dispatch_device_message(self, device, topic, payload):
+        """Process a device message based on its topic"""
+        if 'telemetry' in topic:
+            device.process_telemetry_data(payload)
+        elif 'ota' in topic and 'status' in topic:
+            self._process_ota_status(device, payload)
+
     def _process_ota_status(self, device, payload):
         """Process OTA status updates from device"""
         update_id = payload.get('update_id')
@@ -183,11 +325,12 @@ class IndustrialIotController(http.Controller):
                 }
 
             # Send command to device
-            device.send_command(action, **params)
+            command_log = device.send_command(action, **params)
 
             return {
                 'status': 'success',
-                'message': f'Command {action} sent to {device_id}'
+                'message': f'Command {action} sent to {device_id}',
+                'command_id': command_log.command_id
             }
 
         except Exception as e:
@@ -195,4 +338,68 @@ class IndustrialIotController(http.Controller):
             return {
                 'error': str(e),
                 'status': 'error'
-            }
\ No newline at end of file
+            }
+
+    @http.route('/iiot/command/results', type='json', auth='public', methods=['POST'], csrf=False)
+    def command_results(self, **post):
+        """
+        Command results reported by the MQTT bridge
+        Expected payload: {"results": [{"command_id": "...", "status": "success", "latency_ms": 120}]}
+        Status is success or failed as acknowledged by the device, or timeout.
+        """
+        try:
+            data = request.jsonrequest or {}
+            results = data.get('results') or []
+
+            if not isinstance(results, list):
+                return {
+                    'error': 'Results must be a JSON array',
+                    'status': 'error'
+                }
+
+            updated = request.env['farm.command.log'].sudo().apply_command_results(results)
+
+            _logger.info(f"Command results received: {len(results)} results, {updated} command logs updated")
+            return {
+                'status': 'success',
+                'updated': updated
+            }
+
+        except Exception as e:
+            _logger.error(f"Error in command results endpoint: {str(e)}")
+            return {
+                'error': str(e),
+                'status': 'error'
+            }
+
+    @http.route('/iiot/devices/presence', type='json', auth='public', methods=['POST'], csrf=False)
+    def device_presence(self, **post):
+        """
+        Connection status changes reported by the MQTT bridge
+        Expected payload: {"changes": [{"device_id": "...", "status": "offline", "at": "2024-01-01T00:00:00"}]}
+        Status is online or offline, at is the UTC time of the change.
+        """
+        try:
+            data = request.jsonrequest or {}
+            changes = data.get('changes') or []
+
+            if not isinstance(changes, list):
+                return {
+                    'error': 'Changes must be a JSON array',
+                    'status': 'error'
+                }
+
+            updated = request.env['iiot.device'].sudo().apply_presence_changes(changes)
+
+            _logger.info(f"Presence changes received: {len(changes)} changes, {updated} devices updated")
+            return {
+                'status': 'success',
+                'updated': updated
+            }
+
+        except Exception as e:
+            _logger.error(f"Error in device presence endpoint: {str(e)}")
+            return {
+                'error': str(e),
+                'status': 'error'
+            }
@@ -3,4 +3,7 @@ from . import iiot_device_profile
 from . import iiot_telemetry_rule
 from . import iiot_device
 from . import iiot_firmware
-from . import iiot_update
\ No newline at end of file
+from . import iiot_update
+from . import iiot_ota_campaign
+from . import iiot_message_receipt
+from . import iiot_command_outbox
\ No newline at end of file
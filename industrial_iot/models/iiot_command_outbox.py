@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, SUPERUSER_ID
+from odoo.modules.registry import Registry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+_logger = logging.getLogger(__name__)
+
+# Commands are published by a small pool of sender threads sharing one HTTP
+# session, so connections to the MQTT bridge are kept alive between batches
+SENDER_THREADS = 2
+_sender_lock = threading.Lock()
+_sender = None
+_session = None
+
+
+def _get_sender():
+    """The sender thread pool and its keep-alive HTTP session, created once per worker"""
+    global _sender, _session
+    with _sender_lock:
+        if _sender is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SENDER_THREADS)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _sender = ThreadPoolExecutor(max_workers=SENDER_THREADS, thread_name_prefix='iiot_command_sender')
+        return _sender, _session
+
+
+def _dispatch_in_thread(dbname):
+    try:
+        with Registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['iiot.command.outbox']._dispatch_pending()
+    except Exception:
+        _logger.exception("Device commands could not be dispatched to the MQTT bridge")
+
+
+class IiotCommandOutbox(models.Model):
+    _name = 'iiot.command.outbox'
+    _description = 'Industrial IoT Command Outbox'
+    _order = 'id DESC'
+
+    device_id = fields.Many2one('iiot.device', 'Device', required=True, readonly=True, ondelete='cascade', index=True)
+    action = fields.Char('Action', required=True, readonly=True)
+    command_id = fields.Char('Command ID', required=True, readonly=True, index=True)
+    topic = fields.Char('Topic', required=True, readonly=True)
+    payload = fields.Text('Payload', required=True, readonly=True, help='Rendered command payload (JSON)')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ], string='State', default='pending', required=True, readonly=True)
+    attempts = fields.Integer('Attempts', readonly=True)
+    next_attempt = fields.Datetime('Next Attempt', default=fields.Datetime.now, readonly=True)
+    sent_date = fields.Datetime('Sent On', readonly=True)
+    last_error = fields.Text('Last Error', readonly=True)
+
+    def init(self):
+        super().init()
+        # Senders claim the due pending commands; sent and failed ones are not indexed
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS iiot_command_outbox_pending_index
+                ON iiot_command_outbox (next_attempt, id) WHERE state = 'pending'
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        commands = super().create(vals_list)
+        commands._schedule_dispatch()
+        return commands
+
+    def _schedule_dispatch(self):
+        """Hand the pending commands to the sender pool once the transaction is committed"""
+        postcommit = self.env.cr.postcommit
+        if postcommit.data.get('iiot.command.outbox.dispatch'):
+            return
+        postcommit.data['iiot.command.outbox.dispatch'] = True
+        dbname = self.env.cr.dbname
+
+        @postcommit.add
+        def dispatch_commands():
+            sender, session = _get_sender()
+            sender.submit(_dispatch_in_thread, dbname)
+
+    def _get_retry_settings(self):
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        return (
+            int(get_param('iiot.command_max_attempts', '5')),
+            int(get_param('iiot.command_retry_delay', '30')),
+        )
+
+    @api.model
+    def _dispatch_pending(self, batch_size=None, max_batches=20, auto_commit=True):
+        """
+        Publish the due pending commands to the MQTT bridge in batches, one request
+        per batch. Rows are claimed with FOR UPDATE SKIP LOCKED, so the sender pool
+        and the cron can run concurrently; each batch is committed on its own.
+        Returns the number of commands published.
+        """
+        mqtt_bridge_url = self.env['ir.config_parameter'].sudo().get_param('iiot.mqtt_bridge_url')
+        if not mqtt_bridge_url:
+            return 0
+        if batch_size is None:
+            batch_size = int(self.env['ir.config_parameter'].sudo().get_param('iiot.command_batch_size', '100'))
+
+        published = 0
+        for batch in range(max_batches):
+            self.env.cr.execute("""
+                SELECT id FROM iiot_command_outbox
+                 WHERE state = 'pending' AND next_attempt <= %s
+                 ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, [fields.Datetime.now(), batch_size])
+            commands = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not commands:
+                break
+            published += commands._publish(mqtt_bridge_url)
+            if auto_commit:
+                self.env.cr.commit()
+            if len(commands) < batch_size:
+                break
+        return published
+
+    def _publish(self, mqtt_bridge_url):
+        """Publish the commands in one request to the bridge and record the outcome of each"""
+        messages = [{
+            'topic': command.topic,
+            'payload': json.loads(command.payload),
+            'device_id': command.device_id.device_id,
+            'command_id': command.command_id,
+        } for command in self]
+
+        sender, session = _get_sender()
+        try:
+            response = session.post(f"{mqtt_bridge_url}/publish/batch", json={'messages': messages}, timeout=10)
+            response.raise_for_status()
+            results = {result.get('command_id'): result for result in response.json().get('results', [])}
+        except Exception as e:
+            _logger.warning(f"Could not publish {len(self)} device commands to the MQTT bridge: {str(e)}")
+            results = {command.command_id: {'status': 'error', 'error': str(e)} for command in self}
+
+        sent = self.filtered(lambda command: results.get(command.command_id, {}).get('status') == 'success')
+        if sent:
+            now = fields.Datetime.now()
+            self.env.cr.execute("""
+                UPDATE iiot_command_outbox
+                   SET state = 'sent', sent_date = %s, attempts = attempts + 1, last_error = NULL,
+                       write_uid = %s, write_date = %s
+                 WHERE id = ANY(%s)
+            """, [now, self.env.uid, now, sent.ids])
+            sent.invalidate_recordset(['state', 'sent_date', 'attempts', 'last_error', 'write_uid', 'write_date'])
+            self.env.cr.execute(
+                "UPDATE iiot_device SET last_command = %s WHERE id = ANY(%s)",
+                [now, sent.device_id.ids]
+            )
+            sent.device_id.invalidate_recordset(['last_command'])
+        (self - sent)._retry_later({
+            command.command_id: results.get(command.command_id, {}).get('error') or 'No result from the MQTT bridge'
+            for command in self - sent
+        })
+        return len(sent)
+
+    def _retry_later(self, errors):
+        """Schedule another attempt with an exponential backoff, or give up after the last attempt"""
+        max_attempts, retry_delay = self._get_retry_settings()
+        now = fields.Datetime.now()
+        failed_command_ids = []
+        for command in self:
+            attempts = command.attempts + 1
+            vals = {'attempts': attempts, 'last_error': errors.get(command.command_id)}
+            if attempts >= max_attempts:
+                vals['state'] = 'failed'
+                failed_command_ids.append(command.command_id)
+            else:
+                vals['next_attempt'] = now + timedelta(seconds=retry_delay * 2 ** (attempts - 1))
+            command.write(vals)
+        if failed_command_ids and 'farm.command.log' in self.env:
+            self.env['farm.command.log'].search([
+                ('command_id', 'in', failed_command_ids), ('status', '=', 'sent'),
+            ]).write({'status': 'failed'})
+
+    def action_retry(self):
+        self.filtered(lambda command: command.state == 'failed').write({
+            'state': 'pending', 'attempts': 0, 'next_attempt': fields.Datetime.now(),
+        })
+        self._schedule_dispatch()
+
+    @api.model
+    def _cron_dispatch(self):
+        """Retry the commands due again, and publish any whose post-commit dispatch was lost"""
+        self._dispatch_pending()
+
+    @api.autovacuum
+    def _gc_sent_commands(self):
+        """Forget sent commands; the command log keeps the audit trail"""
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param('iiot.command_outbox_retention_days', '7'))
+        self.env.cr.execute(
+            "DELETE FROM iiot_command_outbox WHERE state = 'sent' AND sent_date < %s",
+            [fields.Datetime.now() - timedelta(days=retention_days)]
+        )
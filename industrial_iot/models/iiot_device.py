@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError, UserError
 import uuid
 import json
-import requests
+from collections import defaultdict
 from datetime import datetime
 # For logger - needed for error logging in process_telemetry_data
 import logging
@@ -28,8 +28,10 @@ class IiotDevice(models.Model):
         string='Business Reference',
         help='Associated business entity (equipment/workcenter/location)'
     )
+    company_id = fields.Many2one('res.company', 'Company', default=lambda self: self.env.company, index=True)
     config_token = fields.Char('Config Token', copy=False, help='One-time configuration download token')
     firmware_version = fields.Char('Firmware Version', help='Current firmware version')
+    site = fields.Char('Site', index=True, help='Site sharing a network uplink, used to limit concurrent OTA downloads')
 
     # 视频流集成 [US-16-01]
     is_camera = fields.Boolean("Is Camera", default=False)
@@ -43,7 +45,12 @@ class IiotDevice(models.Model):
         ('offline', 'Offline'),
         ('online', 'Online'),
         ('error', 'Error')
-    ], string='Connection Status', default='offline')
+    ], string='Connection Status', default='offline', index=True)
+    last_connection_change = fields.Datetime(
+        'Last Connection Change',
+        readonly=True,
+        help='Time of the last connection status change reported by the MQTT bridge'
+    )
 
     # Tracking
     created_date = fields.Datetime('Created Date', default=fields.Datetime.now)
@@ -113,8 +120,8 @@ class IiotDevice(models.Model):
             'ota_status': prefix + profile.ota_status_topic_template.format(device=device_id),
         }
 
-    def send_command(self, action, **params):
-        """Send command with SaaS isolation"""
+    def _prepare_command(self, action, params):
+        """Render the command topic and payload of this device for an action"""
         self.ensure_one()
 
         if not self.profile_id:
@@ -124,101 +131,261 @@ class IiotDevice(models.Model):
         prefix = f"company_{self.env.company.id}/"
         command_topic = prefix + self.profile_id.command_topic_template.format(device=self.device_id)
 
-        # Render command message using Jinja2 template
+        # Render command message using the compiled Jinja2 template of the profile
         try:
-            from jinja2 import Template
-            template = Template(self.profile_id.command_template)
+            template = self.env['iiot.device.profile']._get_command_template(self.profile_id.id)
             message = template.render(action=action, params=params)
             command_payload = json.loads(message)
         except Exception as e:
             raise UserError(_("Command template rendering failed: %s") % str(e))
 
-        # Send command via HTTP-to-MQTT bridge
-        # This would call the HTTP gateway that forwards to MQTT
+        return command_topic, command_payload
+
+    def send_command(self, action, **params):
+        """
+        Send command with SaaS isolation.
+        The rendered command is written to the outbox and published to the
+        HTTP-to-MQTT bridge after the transaction is committed, so no network
+        call is made while the transaction holds its locks.
+        """
+        self.ensure_one()
+        command_topic, command_payload = self._prepare_command(action, params)
+
         mqtt_bridge_url = self.env['ir.config_parameter'].sudo().get_param('iiot.mqtt_bridge_url')
 
         if not mqtt_bridge_url:
             raise UserError(_("MQTT gateway URL not configured"))
 
-        try:
-            response = requests.post(
-                f"{mqtt_bridge_url}/publish",
-                json={
-                    'topic': command_topic,
-                    'payload': command_payload
-                },
-                timeout=10
+        # The bridge matches the device acknowledgement on command_id and reports
+        # the measured round trip back through /iiot/command/results
+        command_log = self.env['farm.command.log'].create({
+            'device_id': self.id,
+            'command': action,
+            'params': json.dumps(params),
+            'command_id': uuid.uuid4().hex,
+            'status': 'sent',
+        })
+        self.env['iiot.command.outbox'].sudo().create({
+            'device_id': self.id,
+            'action': action,
+            'command_id': command_log.command_id,
+            'topic': command_topic,
+            'payload': json.dumps(command_payload),
+        })
+        return command_log
+
+    @api.model
+    def apply_presence_changes(self, changes):
+        """
+        Record connection status changes reported by the MQTT bridge in one UPDATE.
+        A change older than the last one recorded for the device is ignored, so
+        replicas reporting out of order cannot flip a device back.
+        Returns the number of devices updated.
+        """
+        latest = {}
+        for change in changes:
+            if not isinstance(change, dict) or change.get('status') not in ('online', 'offline'):
+                continue
+            try:
+                changed_at = datetime.fromisoformat(str(change['at'])).replace(tzinfo=None)
+            except (KeyError, ValueError):
+                continue
+            device_id = change.get('device_id')
+            if device_id and (device_id not in latest or latest[device_id][1] <= changed_at):
+                latest[device_id] = (change['status'], changed_at)
+        if not latest:
+            return 0
+
+        device_ids = list(latest)
+        self.env.cr.execute("""
+            UPDATE iiot_device AS device
+               SET connection_status = change.status,
+                   last_connection_change = change.changed_at,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM (SELECT unnest(%s::varchar[]) AS device_id,
+                           unnest(%s::varchar[]) AS status,
+                           unnest(%s::timestamp[]) AS changed_at) AS change
+             WHERE device.device_id = change.device_id
+               AND (device.last_connection_change IS NULL OR device.last_connection_change <= change.changed_at)
+               AND (device.connection_status IS DISTINCT FROM change.status
+                    OR device.last_connection_change IS NULL)
+         RETURNING device.id
+        """, [
+            self.env.uid,
+            device_ids,
+            [latest[device_id][0] for device_id in device_ids],
+            [latest[device_id][1] for device_id in device_ids],
+        ])
+        devices = self.browse([row[0] for row in self.env.cr.fetchall()])
+        devices.invalidate_recordset(['connection_status', 'last_connection_change', 'write_uid', 'write_date'])
+        return len(devices)
+
+    def init(self):
+        super().init()
+        # Heartbeats are appended here by the webhooks and moved to iiot_device in bulk,
+        # so concurrent messages of a device never wait on its row lock. The table is
+        # unlogged: a crash loses at most one flush interval of last telemetry times.
+        self.env.cr.execute("""
+            CREATE UNLOGGED TABLE IF NOT EXISTS iiot_device_heartbeat (
+                device_id integer NOT NULL,
+                seen_at timestamp NOT NULL
             )
-            if response.status_code == 200:
-                self.last_command = fields.Datetime.now()
-                # Log the command in farm.command.log
-                self.env['farm.command.log'].create({
-                    'device_id': self.id,
-                    'command': action,
-                    'params': json.dumps(params),
-                    'status': 'success',
-                })
-                return True
-            else:
-                # Log failed command
-                self.env['farm.command.log'].create({
-                    'device_id': self.id,
-                    'command': action,
-                    'params': json.dumps(params),
-                    'status': 'failed',
-                })
-                raise UserError(_("Failed to send command: %s") % response.text)
-        except Exception as e:
-            # Log error command
-            self.env['farm.command.log'].create({
-                'device_id': self.id,
-                'command': action,
-                'params': json.dumps(params),
-                'status': 'failed',
-            })
-            raise UserError(_("Error occurred while sending command: %s") % str(e))
+        """)
+        # Leave room on each page so that heartbeat flushes are HOT updates
+        self.env.cr.execute("ALTER TABLE iiot_device SET (fillfactor = 80)")
+
+    def _record_heartbeat(self):
+        """Append a heartbeat of the devices, applied to last_telemetry by the next flush"""
+        if self.ids:
+            self.env.cr.execute(
+                "INSERT INTO iiot_device_heartbeat (device_id, seen_at) SELECT unnest(%s::integer[]), %s",
+                [self.ids, fields.Datetime.now()],
+            )
+
+    @api.model
+    def flush_heartbeats(self):
+        """
+        Apply the buffered heartbeats to iiot.device in one UPDATE: the last telemetry
+        time of each device, and its online status unless the MQTT bridge reported a
+        connection change after the heartbeat.
+        Heartbeats appended while flushing are left for the next flush.
+        Returns the number of devices updated.
+        """
+        self.env.cr.execute("""
+            WITH moved AS (
+                DELETE FROM iiot_device_heartbeat RETURNING device_id, seen_at
+            ), heartbeat AS (
+                SELECT device_id, max(seen_at) AS seen_at FROM moved GROUP BY device_id
+            )
+            UPDATE iiot_device AS device
+               SET last_telemetry = heartbeat.seen_at,
+                   connection_status = CASE
+                       WHEN device.last_connection_change IS NULL
+                         OR device.last_connection_change <= heartbeat.seen_at THEN 'online'
+                       ELSE device.connection_status END
+              FROM heartbeat
+             WHERE device.id = heartbeat.device_id
+               AND (device.last_telemetry IS NULL OR device.last_telemetry < heartbeat.seen_at)
+         RETURNING device.id
+        """)
+        devices = self.browse([row[0] for row in self.env.cr.fetchall()])
+        devices.invalidate_recordset(['last_telemetry', 'connection_status'])
+        return len(devices)
+
+    @api.model
+    def _cron_flush_heartbeats(self):
+        updated = self.flush_heartbeats()
+        if updated:
+            _logger.info(f"Heartbeats flushed for {updated} devices")
 
     def process_telemetry_data(self, telemetry_data):
         """Process incoming telemetry data based on rules"""
         self.ensure_one()
 
-        # Update last telemetry time
-        self.last_telemetry = fields.Datetime.now()
-        self.connection_status = 'online'
-
-        # Process according to telemetry rules
-        for rule in self.profile_id.iiot_telemetry_rule_ids:
-            if not rule.active:
+        # Last telemetry time and online status are applied by the next heartbeat flush
+        self._record_heartbeat()
+
+        # Rules are compiled once per profile and cached; every target is searched
+        # once for all its rules and each target record is written once
+        Rule = self.env['iiot.telemetry.rule']
+        updates = defaultdict(dict)
+        for target in Rule._get_telemetry_plan(self.profile_id.id):
+            values = {}
+            for rule in target.rules:
+                try:
+                    matches = rule.expression.find(telemetry_data)
+                except Exception as e:
+                    _logger.error(f"Error processing telemetry rule {rule.name} for device {self.device_id}: {str(e)}")
+                    continue
+                if matches:
+                    values[rule.field] = matches[0].value  # Take the first match
+            if not values:
                 continue
 
             try:
-                # Extract value using JSONPath
-                import jsonpath_ng
-                jsonpath_expr = jsonpath_ng.parse(rule.json_path)
-                matches = [match.value for match in jsonpath_expr.find(telemetry_data)]
+                if target.domain_template is not None:
+                    domain = Rule._evaluate_target_domain(target.domain_template, self.id)
+                else:
+                    domain = Rule._instantiate_domain(target.domain, self.id)
+                target_records = self.env[target.model].search(domain)
+            except Exception as e:
+                _logger.error(f"Error finding {target.model} targets of telemetry rules for device {self.device_id}: {str(e)}")
+                continue
 
-                if not matches:
-                    continue
+            for record_id in target_records.ids:
+                updates[target.model, record_id].update(values)
 
-                value = matches[0]  # Take the first match
+        for (model, record_id), values in updates.items():
+            record = self.env[model].browse(record_id)
+            try:
+                with self.env.cr.savepoint():
+                    record.write(values)
+            except Exception as e:
+                if len(values) == 1:
+                    # Log error but continue processing other targets
+                    _logger.error(f"Error writing telemetry of device {self.device_id} to {model} {record_id}: {str(e)}")
+                    continue
+                # One bad value must not discard the other fields merged into this write
+                for field_name, value in values.items():
+                    try:
+                        with self.env.cr.savepoint():
+                            record.write({field_name: value})
+                    except Exception as e:
+                        _logger.error(f"Error writing telemetry of device {self.device_id} to "
+                                      f"{model} {record_id} field {field_name}: {str(e)}")
+
+    # Fields of the cached device lookup used by the webhooks
+    LOOKUP_FIELDS = ('device_id', 'profile_id', 'company_id')
 
-                # Find target record
-                domain = rule.evaluate_domain(self.id)
-                target_model = self.env[rule.target_model]
-                target_records = target_model.search(domain)
+    @api.model
+    @tools.ormcache('device_id')
+    def _lookup_device(self, device_id):
+        """
+        Resolve a logical device ID to (id, profile id, company id), cached per worker.
+        Unknown IDs are cached as well; the cache is cleared when a device is created,
+        deleted, or changes one of the looked up fields.
+        """
+        device = self.sudo().with_context(active_test=False).search([('device_id', '=', device_id)], limit=1)
+        if not device:
+            return None
+        return (device.id, device.profile_id.id, device.company_id.id)
 
-                if target_records:
-                    # Update the field with the extracted value
-                    for target_record in target_records:
-                        target_record.write({rule.target_field: value})
+    @api.model
+    def _get_by_device_id(self, device_id):
+        """Device with a logical ID, in its company, without querying the database once cached"""
+        device = self._lookup_device(device_id)
+        if not device:
+            return self.browse()
+        record_id, profile_id, company_id = device
+        records = self.with_company(company_id) if company_id else self
+        return records.browse(record_id)
 
-            except Exception as e:
-                # Log error but continue processing other rules
-                _logger.error(f"Error processing telemetry rule {rule.name} for device {self.device_id}: {str(e)}")
+    @api.model
+    @tools.ormcache()
+    def _get_broker_settings(self):
+        """
+        MQTT broker settings given to devices, as (host, port, use_tls).
+        Writing a system parameter clears the registry cache, and with it these settings.
+        """
+        get_param = self.env['ir.config_parameter'].sudo().get_param
+        return (
+            get_param('iiot.mqtt_host', 'mqtt.factory.com'),
+            int(get_param('iiot.mqtt_port', '8883')),
+            get_param('iiot.mqtt_use_tls', 'True').lower() == 'true',
+        )
 
     def write(self, vals):
         vals['last_update'] = fields.Datetime.now()
-        return super().write(vals)
+        res = super().write(vals)
+        if any(field in vals for field in self.LOOKUP_FIELDS):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
 
     @api.model
     def create(self, vals):
@@ -232,5 +399,7 @@ class IiotDevice(models.Model):
             vals['config_token'] = str(uuid.uuid4())
 
         record = super().create(vals)
+        # Unknown device IDs are cached by the device lookup too
+        self.env.registry.clear_cache()
         return record
 
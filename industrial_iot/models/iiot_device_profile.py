@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 import re
 
@@ -36,6 +36,59 @@ class IiotDeviceProfile(models.Model):
         default='{"action": "{{ action }}", "params": {{ params | tojson }}}',
         help='Command message template (Jinja2), e.g. {"action": "{{ action }}", "params": {{ params | tojson }}}'
     )
+    payload_encoding = fields.Selection([
+        ('json', 'JSON'),
+        ('cbor', 'CBOR'),
+        ('msgpack', 'MessagePack'),
+    ], string='Payload Encoding', default='json', required=True,
+        help='Encoding of the telemetry and OTA status payloads published by devices of this profile. '
+             'The MQTT bridge decodes binary payloads before forwarding them to Odoo.')
+
+    # Telemetry filtering, enforced by the MQTT bridge per device and metric
+    deadband_type = fields.Selection([
+        ('none', 'None'),
+        ('absolute', 'Absolute'),
+        ('percent', 'Percent'),
+    ], string='Deadband', default='none', required=True,
+        help='Forward telemetry only when a numeric metric moved by more than the deadband since the '
+             'last forwarded value, or when any other metric changed.')
+    deadband_value = fields.Float(
+        'Deadband Value',
+        help='Absolute change, or percentage of the last forwarded value, a metric must exceed to be forwarded'
+    )
+    min_interval = fields.Integer(
+        'Minimum Interval (s)',
+        default=0,
+        help='Telemetry of a device arriving sooner than this after its last forwarded message is dropped. 0 disables it.'
+    )
+    max_silence = fields.Integer(
+        'Maximum Silence (s)',
+        default=0,
+        help='Telemetry of a device is forwarded at least this often even when unchanged, as a heartbeat. '
+             '0 disables it.'
+    )
+    iiot_telemetry_rule_ids = fields.One2many('iiot.telemetry.rule', 'profile_id', string='Telemetry Rules')
+
+    @api.model
+    @tools.ormcache('profile_id')
+    def _get_command_template(self, profile_id):
+        """
+        Compiled Jinja2 command template of a profile, cached per worker.
+        Writing a profile clears the cache.
+        """
+        from jinja2 import Template
+        return Template(self.browse(profile_id).command_template or '')
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Compiled telemetry rule plans and command templates are cached per profile
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
 
     # Validation for templates to ensure they have required placeholders
     @api.constrains('telemetry_topic_template', 'command_topic_template',
@@ -52,6 +105,14 @@ class IiotDeviceProfile(models.Model):
                 if topic_template and '{device}' not in topic_template:
                     raise ValidationError(_("Topic template must contain {device} placeholder"))
 
+    @api.constrains('deadband_value', 'min_interval', 'max_silence')
+    def _check_telemetry_filter(self):
+        for record in self:
+            if record.deadband_value < 0 or record.min_interval < 0 or record.max_silence < 0:
+                raise ValidationError(_("Deadband, minimum interval and maximum silence cannot be negative"))
+            if record.max_silence and record.max_silence < record.min_interval:
+                raise ValidationError(_("Maximum silence must be longer than the minimum interval"))
+
     @api.constrains('code')
     def _check_code(self):
         for record in self:
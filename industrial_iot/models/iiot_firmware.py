@@ -74,6 +74,9 @@ class IiotUpdate(models.Model):
     error_message = fields.Text('Error Message')
     progress = fields.Float('Progress', default=0.0, help='Update progress percentage (0.0-100.0)')
     description = fields.Text('Description')
+    campaign_id = fields.Many2one('iiot.ota.campaign', 'Campaign', index=True, ondelete='set null')
+    wave = fields.Integer('Wave', help='Rollout wave of the campaign this update belongs to')
+    site = fields.Char('Site', related='device_id.site', store=True, index=True)
 
     @api.depends('device_id', 'firmware_id')
     def _compute_name(self):
@@ -142,6 +145,10 @@ class IiotUpdate(models.Model):
 
         self.write(vals)
 
+        # A finished campaign update frees a download slot on its site
+        if new_status in ['success', 'failed'] and self.filtered('campaign_id'):
+            self.env['iiot.ota.campaign']._trigger_scheduler()
+
     def action_cancel_update(self):
         """Cancel update task"""
         for update in self:
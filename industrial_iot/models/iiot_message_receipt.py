@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from datetime import timedelta
+
+
+class IiotMessageReceipt(models.Model):
+    _name = 'iiot.message.receipt'
+    _description = 'Industrial IoT Processed Message Receipt'
+    _order = 'received_at DESC'
+    _log_access = False
+
+    message_id = fields.Char('Message ID', required=True, readonly=True, help='Idempotency key sent by the MQTT bridge')
+    received_at = fields.Datetime('Received At', required=True, readonly=True, default=fields.Datetime.now)
+
+    _sql_constraints = [
+        ('message_id_uniq', 'UNIQUE(message_id)', 'Message ID must be unique!'),
+    ]
+
+    @api.model
+    def claim(self, message_ids):
+        """
+        Record message ids as processed in the current transaction.
+        Returns the set of ids that had not been seen before; the others are
+        duplicates of a retried request and must not be processed again.
+        """
+        message_ids = list({message_id for message_id in message_ids if message_id})
+        if not message_ids:
+            return set()
+
+        self.env.cr.execute("""
+            INSERT INTO iiot_message_receipt (message_id, received_at)
+            SELECT unnest(%s::varchar[]), now() at time zone 'UTC'
+            ON CONFLICT (message_id) DO NOTHING
+            RETURNING message_id
+        """, [message_ids])
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def release(self, message_ids):
+        """Forget claimed message ids whose processing failed, so the bridge can retry them"""
+        message_ids = [message_id for message_id in message_ids if message_id]
+        if message_ids:
+            self.env.cr.execute("DELETE FROM iiot_message_receipt WHERE message_id = ANY(%s)", [message_ids])
+
+    @api.autovacuum
+    def _gc_message_receipts(self):
+        """Forget receipts once the bridge can no longer retry the message"""
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param('iiot.message_receipt_retention_days', '2'))
+        self.env.cr.execute(
+            "DELETE FROM iiot_message_receipt WHERE received_at < %s",
+            [fields.Datetime.now() - timedelta(days=retention_days)]
+        )
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+from datetime import timedelta
+import math
+import logging
+
+_logger = logging.getLogger(__name__)
+
+ACTIVE_UPDATE_STATUSES = ('sent', 'downloading', 'installing')
+FINISHED_UPDATE_STATUSES = ('success', 'failed', 'cancelled')
+
+
+class IiotOtaCampaign(models.Model):
+    _name = 'iiot.ota.campaign'
+    _description = 'Industrial IoT OTA Rollout Campaign'
+    _inherit = ['mail.thread']
+    _order = 'create_date DESC'
+
+    name = fields.Char('Name', required=True)
+    firmware_id = fields.Many2one('iiot.firmware', 'Firmware Version', required=True)
+    device_ids = fields.Many2many('iiot.device', string='Target Devices')
+    update_ids = fields.One2many('iiot.update', 'campaign_id', string='Device Updates')
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('paused', 'Paused'),
+        ('done', 'Done'),
+        ('cancelled', 'Cancelled')
+    ], string='State', default='draft', required=True, tracking=True)
+
+    # Rollout plan
+    canary_size = fields.Integer('Canary Devices', default=10, help='Devices updated in the first wave')
+    wave_percentages = fields.Char(
+        'Wave Steps (%)',
+        default='10,25,50,100',
+        help='Cumulative share of the target devices updated by the end of each wave after the canary, '
+             'e.g. 10,25,50,100'
+    )
+    current_wave = fields.Integer('Current Wave', default=0, readonly=True)
+    wave_count = fields.Integer('Waves', readonly=True)
+    max_concurrent_per_site = fields.Integer(
+        'Max Downloads per Site',
+        default=20,
+        help='Maximum number of devices downloading firmware at the same time on one site, across all campaigns'
+    )
+    failure_threshold = fields.Float(
+        'Failure Threshold (%)',
+        default=10.0,
+        help='The campaign pauses itself when the share of failed updates among the finished ones exceeds this'
+    )
+    update_timeout = fields.Integer(
+        'Update Timeout (min)',
+        default=60,
+        help='Updates that do not finish within this time after being sent are marked as failed'
+    )
+
+    # Progress, aggregated by the campaign scheduler
+    total_count = fields.Integer('Devices', readonly=True)
+    pending_count = fields.Integer('Pending', readonly=True)
+    active_count = fields.Integer('In Progress', readonly=True)
+    success_count = fields.Integer('Succeeded', readonly=True)
+    failed_count = fields.Integer('Failed', readonly=True)
+    failure_rate = fields.Float('Failure Rate (%)', readonly=True)
+    progress = fields.Float('Progress', readonly=True, help='Average progress of the device updates (0.0-100.0)')
+
+    @api.constrains('wave_percentages')
+    def _check_wave_percentages(self):
+        for campaign in self:
+            campaign._get_wave_percentages()
+
+    @api.constrains('canary_size', 'max_concurrent_per_site', 'failure_threshold')
+    def _check_rollout_limits(self):
+        for campaign in self:
+            if campaign.canary_size < 0 or campaign.max_concurrent_per_site <= 0:
+                raise ValidationError(_("Canary size cannot be negative and the download limit must be positive"))
+            if not 0 <= campaign.failure_threshold <= 100:
+                raise ValidationError(_("Failure threshold must be between 0 and 100"))
+
+    def _get_wave_percentages(self):
+        """Parse the wave steps into increasing percentages ending at 100"""
+        self.ensure_one()
+        try:
+            steps = [float(step) for step in (self.wave_percentages or '').split(',') if step.strip()]
+        except ValueError:
+            raise ValidationError(_("Wave steps must be a comma-separated list of percentages"))
+        if any(step <= 0 or step > 100 for step in steps) or steps != sorted(steps):
+            raise ValidationError(_("Wave steps must be increasing percentages between 0 and 100"))
+        if not steps or steps[-1] != 100:
+            steps.append(100.0)
+        return steps
+
+    def _get_wave_sizes(self, total):
+        """Cumulative number of devices updated by the end of each wave"""
+        self.ensure_one()
+        bounds = [min(self.canary_size, total)] if self.canary_size else []
+        for step in self._get_wave_percentages():
+            bound = max(math.ceil(total * step / 100.0), bounds[-1] if bounds else 0)
+            if not bounds or bound > bounds[-1]:
+                bounds.append(bound)
+        return bounds
+
+    def action_load_devices(self):
+        """Target all active devices whose profile matches the firmware's device type"""
+        for campaign in self:
+            campaign.device_ids = self.env['iiot.device'].search([
+                ('profile_id.code', '=', campaign.firmware_id.profile_code),
+                ('is_active', '=', True)
+            ])
+        return True
+
+    def action_start(self):
+        """Create the device updates, assign them to waves and start the rollout"""
+        for campaign in self:
+            if campaign.state != 'draft':
+                continue
+            if not campaign.device_ids:
+                raise UserError(_("Campaign %s has no target devices") % campaign.name)
+
+            devices = campaign.device_ids.sorted('id')
+            bounds = campaign._get_wave_sizes(len(devices))
+            vals_list = []
+            wave = 1
+            for index, device in enumerate(devices):
+                while index >= bounds[wave - 1]:
+                    wave += 1
+                vals_list.append({
+                    'campaign_id': campaign.id,
+                    'device_id': device.id,
+                    'firmware_id': campaign.firmware_id.id,
+                    'wave': wave,
+                })
+            self.env['iiot.update'].create(vals_list)
+
+            campaign.write({
+                'state': 'running',
+                'current_wave': 1,
+                'wave_count': len(bounds),
+            })
+            campaign._refresh_progress()
+        self._trigger_scheduler()
+        return True
+
+    def action_pause(self):
+        self.filtered(lambda c: c.state == 'running').write({'state': 'paused'})
+        return True
+
+    def action_resume(self):
+        self.filtered(lambda c: c.state == 'paused').write({'state': 'running'})
+        self._trigger_scheduler()
+        return True
+
+    def action_cancel(self):
+        """Cancel the campaign and the updates not sent yet; updates in progress run to completion"""
+        for campaign in self.filtered(lambda c: c.state in ('draft', 'running', 'paused')):
+            campaign.update_ids.filtered(lambda u: u.status == 'pending').write({
+                'status': 'cancelled',
+                'end_time': fields.Datetime.now()
+            })
+            campaign.state = 'cancelled'
+            campaign._refresh_progress()
+        return True
+
+    @api.model
+    def _trigger_scheduler(self):
+        """Run the campaign scheduler as soon as possible, e.g. when a download slot frees up"""
+        cron = self.env.ref('industrial_iot.ir_cron_iiot_ota_campaign', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def _cron_run_campaigns(self):
+        """Advance all running campaigns"""
+        for campaign in self.search([('state', '=', 'running')]):
+            try:
+                campaign._run_step()
+            except Exception as e:
+                _logger.error(f"Error running OTA campaign {campaign.name}: {str(e)}")
+
+    def _run_step(self):
+        """
+        One scheduler pass: expire stuck updates, aggregate progress, pause on failures,
+        advance the wave and send updates while download slots are free on their site
+        """
+        self.ensure_one()
+        Update = self.env['iiot.update']
+
+        if self.update_timeout:
+            Update.search([
+                ('campaign_id', '=', self.id),
+                ('status', 'in', ACTIVE_UPDATE_STATUSES),
+                ('start_time', '<', fields.Datetime.now() - timedelta(minutes=self.update_timeout)),
+            ]).update_status_from_device('failed', error_message=_("No result reported by the device in time"))
+
+        self._refresh_progress()
+
+        if self.success_count + self.failed_count and self.failure_rate > self.failure_threshold:
+            self.state = 'paused'
+            self.message_post(body=_("Campaign paused: %.1f%% of the finished updates failed, above the %.1f%% threshold.")
+                              % (self.failure_rate, self.failure_threshold))
+            return
+
+        wave_domain = [('campaign_id', '=', self.id), ('wave', '<=', self.current_wave)]
+        if not Update.search_count(wave_domain + [('status', 'not in', FINISHED_UPDATE_STATUSES)]):
+            if self.current_wave >= self.wave_count:
+                self.state = 'done'
+                self.message_post(body=_("Campaign completed: %d updates succeeded, %d failed.")
+                                  % (self.success_count, self.failed_count))
+                return
+            self.current_wave += 1
+            self.message_post(body=_("Wave %d of %d started.") % (self.current_wave, self.wave_count))
+            wave_domain = [('campaign_id', '=', self.id), ('wave', '<=', self.current_wave)]
+
+        # Downloads in progress per site, across all campaigns sharing the uplink
+        active_by_site = dict(Update._read_group(
+            [('status', 'in', ACTIVE_UPDATE_STATUSES)], ['site'], ['__count']
+        ))
+        free_slots = {}
+        to_send = Update
+        for update in Update.search(wave_domain + [('status', '=', 'pending')], order='wave, id'):
+            site = update.site or False
+            if site not in free_slots:
+                free_slots[site] = self.max_concurrent_per_site - active_by_site.get(site, 0)
+            if free_slots[site] > 0:
+                free_slots[site] -= 1
+                to_send |= update
+
+        if to_send:
+            to_send.action_send_ota()
+            self._refresh_progress()
+
+    def _refresh_progress(self):
+        """
+        Aggregate the status of the campaign's updates with one grouped query and one write.
+        Devices only write their own iiot.update row, so status reports never contend on the campaign.
+        """
+        for campaign in self:
+            groups = self.env['iiot.update']._read_group(
+                [('campaign_id', '=', campaign.id)], ['status'], ['__count', 'progress:sum']
+            )
+            counts = {status: count for status, count, _progress in groups}
+            # Finished updates count as complete whatever progress they last reported
+            progress_sum = sum(
+                count * 100.0 if status in ('success', 'failed') else progress or 0.0
+                for status, count, progress in groups if status != 'cancelled'
+            )
+            success = counts.get('success', 0)
+            failed = counts.get('failed', 0)
+            total = sum(counts.values())
+            counted = total - counts.get('cancelled', 0)
+            campaign.write({
+                'total_count': total,
+                'pending_count': counts.get('pending', 0),
+                'active_count': sum(counts.get(status, 0) for status in ACTIVE_UPDATE_STATUSES),
+                'success_count': success,
+                'failed_count': failed,
+                'failure_rate': failed * 100.0 / (success + failed) if success + failed else 0.0,
+                'progress': progress_sum / counted if counted else 0.0,
+            })
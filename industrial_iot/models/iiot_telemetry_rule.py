@@ -1,12 +1,25 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
+from collections import namedtuple
 import json
 import jsonpath_ng
+import logging
 
 
 from odoo.tools.safe_eval import safe_eval
 
+_logger = logging.getLogger(__name__)
+
+# Placeholders left in a compiled target domain for {{ device_id }} and '{{ device_id }}'
+DEVICE_ID = object()
+DEVICE_ID_TEXT = object()
+
+# Compiled telemetry rules of a profile: rules sharing a target model and domain
+# are grouped, so the target records are searched once per message for all of them
+TelemetryTarget = namedtuple('TelemetryTarget', 'model domain domain_template rules')
+TelemetryRulePlan = namedtuple('TelemetryRulePlan', 'rule_id name expression field')
+
 
 
 
@@ -215,29 +228,91 @@ class IiotTelemetryRule(models.Model):
         self.ensure_one()
 
 
-        domain_str = self.target_domain.replace('{{ device_id }}', str(device_id))
+        return self._evaluate_target_domain(self.target_domain, device_id)
 
 
-        try:
-
+    @api.model_create_multi
+    def create(self, vals_list):
+        rules = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return rules
 
-            return safe_eval(domain_str)
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
 
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
 
+    @api.model
+    def _evaluate_target_domain(self, target_domain, device_id):
+        """Evaluate a target domain template for a device"""
+        domain_str = target_domain.replace('{{ device_id }}', str(device_id))
+        try:
+            return safe_eval(domain_str)
         except Exception:
-
-
             # If evaluation fails, return the original domain
-
-
             try:
-
-
-                return safe_eval(self.target_domain)
-
-
+                return safe_eval(target_domain)
             except Exception:
-
-
                 return []
 
+    def _compile_target_domain(self):
+        """
+        Evaluate the target domain once, leaving placeholders where the device goes.
+        Returns None if the template cannot be compiled, e.g. when the device id is
+        embedded in a longer string; such domains are evaluated for every message.
+        """
+        self.ensure_one()
+        domain_str = self.target_domain
+        for quoted in ("'{{ device_id }}'", '"{{ device_id }}"'):
+            domain_str = domain_str.replace(quoted, 'device_id_text')
+        domain_str = domain_str.replace('{{ device_id }}', 'device_id_value')
+        if '{{' in domain_str:
+            return None
+        try:
+            return safe_eval(domain_str, {'device_id_value': DEVICE_ID, 'device_id_text': DEVICE_ID_TEXT})
+        except Exception:
+            return None
+
+    @api.model
+    def _instantiate_domain(self, domain, device_id):
+        """Copy a compiled target domain, replacing its placeholders with the device"""
+        if domain is DEVICE_ID:
+            return device_id
+        if domain is DEVICE_ID_TEXT:
+            return str(device_id)
+        if isinstance(domain, (list, tuple)):
+            return type(domain)(self._instantiate_domain(item, device_id) for item in domain)
+        return domain
+
+    @api.model
+    @tools.ormcache('profile_id')
+    def _get_telemetry_plan(self, profile_id):
+        """
+        Compile the active rules of a profile: JSONPath expressions parsed and target
+        domains evaluated once, then kept per worker until a rule or profile changes.
+        """
+        targets = {}
+        for rule in self.sudo().search([('profile_id', '=', profile_id)]):
+            try:
+                expression = jsonpath_ng.parse(rule.json_path)
+            except Exception as e:
+                _logger.error(f"Telemetry rule {rule.name} has an invalid JSON path {rule.json_path}: {str(e)}")
+                continue
+
+            key = (rule.target_model, rule.target_domain)
+            if key not in targets:
+                domain = rule._compile_target_domain()
+                targets[key] = TelemetryTarget(
+                    rule.target_model,
+                    domain,
+                    rule.target_domain if domain is None else None,
+                    []
+                )
+            targets[key].rules.append(TelemetryRulePlan(rule.id, rule.name, expression, rule.target_field))
+
+        return tuple(target._replace(rules=tuple(target.rules)) for target in targets.values())
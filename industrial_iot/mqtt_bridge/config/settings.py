@@ -3,6 +3,7 @@ Configuration settings for the MQTT Bridge
 """
 
 import os
+import socket
 from pydantic import BaseSettings
 
 
@@ -19,7 +20,13 @@ class Settings(BaseSettings):
     ODOO_BASE_URL: str = os.getenv("ODOO_BASE_URL", "http://localhost:8069")
     ODOO_CONFIG_ENDPOINT: str = os.getenv("ODOO_CONFIG_ENDPOINT", "/iiot/config")
     ODOO_WEBHOOK_ENDPOINT: str = os.getenv("ODOO_WEBHOOK_ENDPOINT", "/iiot/webhook")
+    ODOO_WEBHOOK_BATCH_ENDPOINT: str = os.getenv("ODOO_WEBHOOK_BATCH_ENDPOINT", "/iiot/webhook_batch")
     ODOO_COMMAND_ENDPOINT: str = os.getenv("ODOO_COMMAND_ENDPOINT", "/iiot/command")
+    ODOO_PROFILE_TOPICS_ENDPOINT: str = os.getenv("ODOO_PROFILE_TOPICS_ENDPOINT", "/iiot/profiles/topics")
+    ODOO_COMMAND_RESULTS_ENDPOINT: str = os.getenv("ODOO_COMMAND_RESULTS_ENDPOINT", "/iiot/command/results")
+    ODOO_AUTOMATION_RULESET_ENDPOINT: str = os.getenv("ODOO_AUTOMATION_RULESET_ENDPOINT", "/farm/automation/ruleset")
+    ODOO_AUTOMATION_TRIGGERS_ENDPOINT: str = os.getenv("ODOO_AUTOMATION_TRIGGERS_ENDPOINT", "/farm/automation/triggers")
+    ODOO_PRESENCE_ENDPOINT: str = os.getenv("ODOO_PRESENCE_ENDPOINT", "/iiot/devices/presence")
 
     # Topic Configuration
     MQTT_CONFIG_REQUEST_TOPIC: str = os.getenv("MQTT_CONFIG_REQUEST_TOPIC", "iiot/config/request")
@@ -28,6 +35,13 @@ class Settings(BaseSettings):
     MQTT_COMMAND_TOPIC_TEMPLATE: str = os.getenv("MQTT_COMMAND_TOPIC_TEMPLATE", "command/{device}/action")
     MQTT_OTA_NOTIFY_TOPIC_TEMPLATE: str = os.getenv("MQTT_OTA_NOTIFY_TOPIC_TEMPLATE", "ota/{device}/notify")
     MQTT_OTA_STATUS_TOPIC_TEMPLATE: str = os.getenv("MQTT_OTA_STATUS_TOPIC_TEMPLATE", "ota/{device}/status")
+    MQTT_PAYLOAD_ENCODING: str = os.getenv("MQTT_PAYLOAD_ENCODING", "json")  # json, cbor or msgpack
+    MQTT_COMMAND_RESPONSE_TOPIC_TEMPLATE: str = os.getenv("MQTT_COMMAND_RESPONSE_TOPIC_TEMPLATE", "command/{device}/response")
+    # Last will and birth messages ("online"/"offline" or {"status": ...}), and broker client events
+    # ($SYS/brokers/<node>/clients/<client id>/connected|disconnected on EMQX; empty to disable)
+    MQTT_PRESENCE_TOPIC_TEMPLATE: str = os.getenv("MQTT_PRESENCE_TOPIC_TEMPLATE", "devices/{device}/status")
+    MQTT_CLIENT_EVENTS_TOPIC_TEMPLATE: str = os.getenv("MQTT_CLIENT_EVENTS_TOPIC_TEMPLATE",
+                                                       "$SYS/brokers/{node}/clients/{device}/{event}")
 
     # HTTP Server Configuration
     HOST: str = os.getenv("HOST", "0.0.0.0")
@@ -42,6 +56,57 @@ class Settings(BaseSettings):
     HTTP_REQUEST_TIMEOUT: int = int(os.getenv("HTTP_REQUEST_TIMEOUT", "30"))
     HTTP_RETRY_COUNT: int = int(os.getenv("HTTP_RETRY_COUNT", "3"))
     HTTP_RETRY_DELAY: float = float(os.getenv("HTTP_RETRY_DELAY", "1.0"))
+    HTTP_RETRY_MAX_DELAY: float = float(os.getenv("HTTP_RETRY_MAX_DELAY", "30.0"))
+    HTTP_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("HTTP_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    HTTP_CIRCUIT_COOLDOWN: float = float(os.getenv("HTTP_CIRCUIT_COOLDOWN", "30.0"))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60.0"))
+    HTTP_USE_HTTP2: bool = os.getenv("HTTP_USE_HTTP2", "True").lower() == "true"
+
+    # Telemetry Batching
+    TELEMETRY_BATCH_MAX_SIZE: int = int(os.getenv("TELEMETRY_BATCH_MAX_SIZE", "500"))
+    TELEMETRY_BATCH_MAX_DELAY_MS: int = int(os.getenv("TELEMETRY_BATCH_MAX_DELAY_MS", "200"))
+
+    # Command Tracking
+    COMMAND_ACK_TIMEOUT: float = float(os.getenv("COMMAND_ACK_TIMEOUT", "30.0"))
+    COMMAND_RESULT_FLUSH_INTERVAL_MS: int = int(os.getenv("COMMAND_RESULT_FLUSH_INTERVAL_MS", "500"))
+    COMMAND_RESULT_BATCH_MAX_SIZE: int = int(os.getenv("COMMAND_RESULT_BATCH_MAX_SIZE", "500"))
+    COMMAND_RESULT_MAX_BACKLOG: int = int(os.getenv("COMMAND_RESULT_MAX_BACKLOG", "100000"))
+
+    # Edge Automation
+    AUTOMATION_RULESET_REFRESH_INTERVAL: float = float(os.getenv("AUTOMATION_RULESET_REFRESH_INTERVAL", "60.0"))
+    AUTOMATION_RULE_COOLDOWN: float = float(os.getenv("AUTOMATION_RULE_COOLDOWN", "30.0"))
+
+    # Device Presence
+    PRESENCE_TIMEOUT: float = float(os.getenv("PRESENCE_TIMEOUT", "300.0"))  # seconds without messages until offline
+    PRESENCE_WHEEL_RESOLUTION: float = float(os.getenv("PRESENCE_WHEEL_RESOLUTION", "1.0"))
+    PRESENCE_FLUSH_INTERVAL: float = float(os.getenv("PRESENCE_FLUSH_INTERVAL", "5.0"))
+    PRESENCE_BATCH_MAX_SIZE: int = int(os.getenv("PRESENCE_BATCH_MAX_SIZE", "5000"))
+
+    # Telemetry Filtering
+    TELEMETRY_FILTER_MAX_DEVICES: int = int(os.getenv("TELEMETRY_FILTER_MAX_DEVICES", "1000000"))
+
+    # Backpressure and Spooling
+    MESSAGE_QUEUE_MAX_SIZE: int = int(os.getenv("MESSAGE_QUEUE_MAX_SIZE", "10000"))
+    MAX_INFLIGHT_TASKS: int = int(os.getenv("MAX_INFLIGHT_TASKS", "2000"))
+    SPOOL_PATH: str = os.getenv("SPOOL_PATH", "spool/telemetry.db")
+    SPOOL_MAX_ROWS: int = int(os.getenv("SPOOL_MAX_ROWS", "5000000"))
+    SPOOL_FLUSH_INTERVAL_MS: int = int(os.getenv("SPOOL_FLUSH_INTERVAL_MS", "200"))
+    SPOOL_REPLAY_BATCH_SIZE: int = int(os.getenv("SPOOL_REPLAY_BATCH_SIZE", "500"))
+    SPOOL_REPLAY_RATE: int = int(os.getenv("SPOOL_REPLAY_RATE", "1000"))  # messages per second
+    SPOOL_REPLAY_RETRY_INTERVAL: float = float(os.getenv("SPOOL_REPLAY_RETRY_INTERVAL", "5.0"))
+
+    # Horizontal Scaling
+    BRIDGE_INSTANCE_ID: str = os.getenv("BRIDGE_INSTANCE_ID", f"bridge_{socket.gethostname()}_{os.getpid()}")
+    MQTT_SHARED_SUBSCRIPTION_GROUP: str = os.getenv("MQTT_SHARED_SUBSCRIPTION_GROUP", "")
+    BRIDGE_STATE_STORE_URL: str = os.getenv("BRIDGE_STATE_STORE_URL", "memory://")
+    BRIDGE_HEARTBEAT_INTERVAL: float = float(os.getenv("BRIDGE_HEARTBEAT_INTERVAL", "5.0"))
+    BRIDGE_INSTANCE_TTL: float = float(os.getenv("BRIDGE_INSTANCE_TTL", "15.0"))
+    BRIDGE_HASH_VNODES: int = int(os.getenv("BRIDGE_HASH_VNODES", "100"))
+
+    # Observability
+    LOG_SAMPLE_RATE: float = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))  # share of per-message log lines emitted
 
     # Device Management
     DEVICE_CACHE_TTL: int = int(os.getenv("DEVICE_CACHE_TTL", "3600"))  # 1 hour
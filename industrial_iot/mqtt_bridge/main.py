@@ -15,13 +15,16 @@ The bridge acts as an intermediary between MQTT brokers and Odoo, handling:
 import asyncio
 import json
 import logging
+import time
 import uuid
-from datetime import datetime
-from typing import Dict, Optional, Any
+from collections import deque
+from functools import partial
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any, Tuple
 
 import httpx
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Response
 from pydantic import BaseModel, Field
 import paho.mqtt.client as mqtt
 
@@ -34,10 +37,36 @@ logger = logging.getLogger(__name__)
 
 # Import bridge components
 from config.settings import settings
-from models.message import DeviceConfigRequest, TelemetryData, CommandMessage, OTAStatus
+from models.message import DeviceConfigRequest, TelemetryData, CommandMessage, PublishMessage, PublishBatch, OTAStatus
 from services.mqtt_service import MQTTService
 from services.http_service import HTTPService
 from services.device_manager import DeviceManager
+from services.telemetry_batcher import TelemetryBatcher
+from services.telemetry_spool import TelemetrySpool
+from services.state_store import create_state_store
+from services.cluster import ClusterMembership
+from services.topic_router import TopicRouter, company_scoped
+from services.edge_rules import EdgeRuleset
+from services.telemetry_filter import TelemetryFilter, FilterSettings
+from services.presence import PresenceTracker, ONLINE, OFFLINE
+from services import payload_codec
+from services.payload_codec import PayloadDecodeError, RawJSON
+from services.metrics import (
+    registry, CONTENT_TYPE, LogSampler, MESSAGES_RECEIVED, MESSAGES_FORWARDED, MESSAGES_FAILED,
+    MESSAGES_SPOOLED, MESSAGES_DROPPED, QUEUE_DEPTH, INFLIGHT_TASKS, CACHED_DEVICE_CONFIGS,
+    SPOOL_DEPTH, FORWARD_LATENCY, PENDING_COMMANDS, COMMAND_ROUND_TRIP, AUTOMATION_RULES, AUTOMATION_TRIGGERS,
+    TELEMETRY_SUPPRESSED, FILTERED_DEVICES, ONLINE_DEVICES, PRESENCE_CHANGES
+)
+
+# Shared store key prefix of the edge automation rule cooldowns
+RULE_COOLDOWN_KEY = "rule_cooldown"
+
+# Routes of messages published by the devices themselves, which prove they are connected
+DEVICE_ROUTES = ("telemetry", "ota_status", "command_response")
+PRESENCE_STATUSES = {
+    "online": ONLINE, "connected": ONLINE, "true": ONLINE, "1": ONLINE,
+    "offline": OFFLINE, "disconnected": OFFLINE, "lost": OFFLINE, "false": OFFLINE, "0": OFFLINE,
+}
 
 
 class MQTTBridge:
@@ -48,7 +77,38 @@ class MQTTBridge:
     def __init__(self):
         self.mqtt_service = MQTTService()
         self.http_service = HTTPService()
-        self.device_manager = DeviceManager()
+        self.state_store = create_state_store(settings.BRIDGE_STATE_STORE_URL)
+        self.device_manager = DeviceManager(self.state_store)
+        self.cluster = ClusterMembership(
+            self.state_store,
+            settings.BRIDGE_INSTANCE_ID,
+            ttl=settings.BRIDGE_INSTANCE_TTL,
+            vnodes=settings.BRIDGE_HASH_VNODES
+        )
+        self.message_queue = asyncio.Queue(maxsize=settings.MESSAGE_QUEUE_MAX_SIZE)
+        self.inflight_slots = asyncio.Semaphore(settings.MAX_INFLIGHT_TASKS)
+        self.inflight_tasks = set()
+        self.telemetry_spool = TelemetrySpool(settings.SPOOL_PATH, max_rows=settings.SPOOL_MAX_ROWS)
+        self.telemetry_batcher = TelemetryBatcher(
+            self.http_service.send_telemetry_batch,
+            max_size=settings.TELEMETRY_BATCH_MAX_SIZE,
+            max_delay=settings.TELEMETRY_BATCH_MAX_DELAY_MS / 1000.0
+        )
+        # Acknowledged and timed out commands, and fired automation rules, waiting to be reported to Odoo
+        self.command_results = deque(maxlen=settings.COMMAND_RESULT_MAX_BACKLOG)
+        self.automation_triggers = deque(maxlen=settings.COMMAND_RESULT_MAX_BACKLOG)
+        self.edge_rules = EdgeRuleset(cooldown=settings.AUTOMATION_RULE_COOLDOWN)
+        self.telemetry_filter = TelemetryFilter(max_devices=settings.TELEMETRY_FILTER_MAX_DEVICES)
+        self.presence = PresenceTracker(settings.PRESENCE_TIMEOUT, settings.PRESENCE_WHEEL_RESOLUTION)
+        self.topic_router = self.build_topic_router()
+        self.log_sampler = LogSampler(logger, settings.LOG_SAMPLE_RATE)
+        QUEUE_DEPTH.set_function(self.message_queue.qsize)
+        INFLIGHT_TASKS.set_function(lambda: len(self.inflight_tasks))
+        SPOOL_DEPTH.set_function(self.telemetry_spool.depth)
+        PENDING_COMMANDS.set_function(self.device_manager.pending_command_count)
+        AUTOMATION_RULES.set_function(lambda: self.edge_rules.rule_count)
+        FILTERED_DEVICES.set_function(lambda: len(self.telemetry_filter))
+        ONLINE_DEVICES.set_function(lambda: self.presence.online_count)
         self.app = FastAPI(
             title="Industrial IoT MQTT Bridge",
             description="Bridge between MQTT devices and Odoo HTTP webhooks",
@@ -66,14 +126,30 @@ class MQTTBridge:
 
         @self.app.get("/health")
         async def health_check():
-            connected_devices = await self.device_manager.get_connected_devices()
             return {
                 "status": "healthy",
                 "mqtt_connected": self.mqtt_service.is_connected(),
-                "active_connections": len(connected_devices),
+                "message_queue_depth": self.message_queue.qsize(),
+                "inflight_tasks": len(self.inflight_tasks),
+                "spool_depth": self.telemetry_spool.depth(),
+                "spool_replay_lag_seconds": round(self.telemetry_spool.replay_lag(), 3),
+                "spool_dropped": self.telemetry_spool.dropped,
+                "odoo_circuit": self.http_service.circuit_breaker.state,
+                "instance_id": self.cluster.instance_id,
+                "cluster_members": len(self.cluster.members),
+                "active_connections": await self.device_manager.count_connected_devices(),
+                "online_devices": self.presence.online_count,
+                "presence_changes_pending": self.presence.pending_changes,
+                "telemetry_batch_pending": self.telemetry_batcher.pending_count(),
                 "timestamp": datetime.utcnow().isoformat()
             }
 
+        @self.app.get("/metrics")
+        async def metrics():
+            """Expose bridge metrics in the Prometheus text exposition format"""
+            CACHED_DEVICE_CONFIGS.set(await self.device_manager.count_device_configs())
+            return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
         @self.app.post("/api/v1/config/download")
         async def download_device_config(request: DeviceConfigRequest):
             """Handle device configuration download request"""
@@ -117,22 +193,31 @@ class MQTTBridge:
                     # Note: In a real scenario, we might need to implement a way to refresh config
                     # For now, we'll proceed with the command assuming the device exists
 
-                # Send command via MQTT
+                # Send command via MQTT; the device echoes command_id back in its response
+                command_id = command.command_id or uuid.uuid4().hex
                 command_payload = {
+                    "command_id": command_id,
                     "action": action,
                     "params": params,
                     "timestamp": command.timestamp.isoformat()
                 }
 
-                success = await self.mqtt_service.send_device_command(device_id, command_payload)
+                future = self.device_manager.register_pending_command(
+                    command_id, device_id, action, command.timeout
+                )
+                success = self.mqtt_service.send_device_command(device_id, command_payload)
 
                 if success:
-                    return {
+                    response = {
                         "status": "success",
                         "message": f"Command {action} sent to device {device_id}",
-                        "command_id": command.device_id
+                        "command_id": command_id
                     }
+                    if command.wait:
+                        response["result"] = await future
+                    return response
                 else:
+                    self.device_manager.resolve_pending_command(command_id, "failed")
                     return {
                         "status": "error",
                         "error": f"Failed to send command {action} to device {device_id}"
@@ -142,6 +227,44 @@ class MQTTBridge:
                 logger.error(f"Error sending command: {str(e)}")
                 raise HTTPException(status_code=500, detail=str(e))
 
+        @self.app.post("/publish")
+        async def publish_command(message: PublishMessage):
+            """Publish a command rendered by Odoo and track its acknowledgement"""
+            try:
+                return self._publish_message(message)
+            except Exception as e:
+                logger.error(f"Error publishing command: {str(e)}")
+                raise HTTPException(status_code=500, detail=str(e))
+
+        @self.app.post("/publish/batch")
+        async def publish_command_batch(batch: PublishBatch):
+            """
+            Publish a batch of commands from the Odoo command outbox, in order.
+            Each command gets its own result, so Odoo retries only the failed ones.
+            """
+            results = []
+            for message in batch.messages:
+                try:
+                    results.append(self._publish_message(message))
+                except Exception as e:
+                    logger.error(f"Error publishing command {message.command_id}: {str(e)}")
+                    results.append({"status": "error", "command_id": message.command_id, "error": str(e)})
+            return {"status": "success", "results": results}
+
+        @self.app.post("/api/v1/automation/refresh")
+        async def refresh_automation_rules():
+            """Reload the edge automation ruleset from Odoo, called by Odoo when rules change"""
+            if await self.load_automation_rules():
+                return {
+                    "status": "success",
+                    "version": self.edge_rules.version,
+                    "rules": self.edge_rules.rule_count
+                }
+            return {
+                "status": "error",
+                "error": "Could not load the automation ruleset from Odoo"
+            }
+
         @self.app.get("/api/v1/device/{device_id}/status")
         async def get_device_status(device_id: str):
             """Get status of a specific device"""
@@ -172,8 +295,10 @@ class MQTTBridge:
 
                 logger.info(f"Sending OTA command {action} to device {device_id}")
 
-                # Prepare OTA command payload
+                # Prepare OTA command payload; progress is reported on the OTA status topic
+                command_id = ota_command.command_id or uuid.uuid4().hex
                 ota_payload = {
+                    "command_id": command_id,
                     "action": action,
                     "params": params,
                     "timestamp": ota_command.timestamp.isoformat(),
@@ -181,13 +306,13 @@ class MQTTBridge:
                 }
 
                 # Send OTA command via MQTT
-                success = await self.mqtt_service.send_ota_command(device_id, ota_payload)
+                success = self.mqtt_service.send_ota_command(device_id, ota_payload)
 
                 if success:
                     return {
                         "status": "success",
                         "message": f"OTA command {action} sent to device {device_id}",
-                        "command_id": ota_command.device_id
+                        "command_id": command_id
                     }
                 else:
                     return {
@@ -205,64 +330,209 @@ class MQTTBridge:
         def on_connect(client, userdata, flags, rc):
             """Handle MQTT connection"""
             if rc == 0:
+                self.mqtt_service.connected = True
                 logger.info("Successfully connected to MQTT broker")
 
-                # Subscribe to device configuration requests
-                client.subscribe(settings.MQTT_CONFIG_REQUEST_TOPIC)
-
-                # Subscribe to device telemetry data
-                client.subscribe(settings.MQTT_TELEMETRY_TOPIC_TEMPLATE.format(device="+/+"))
-
-                # Subscribe to OTA status updates
-                client.subscribe(settings.MQTT_OTA_STATUS_TOPIC_TEMPLATE.format(device="+/+"))
-
-                logger.info(f"Subscribed to topics: {settings.MQTT_CONFIG_REQUEST_TOPIC}, {settings.MQTT_TELEMETRY_TOPIC_TEMPLATE.format(device='+/+')}, {settings.MQTT_OTA_STATUS_TOPIC_TEMPLATE.format(device='+/+')}")
+                # Stateless traffic is load-balanced across replicas through shared subscriptions;
+                # every replica receives all command responses, since only the replica that
+                # published a command holds it in its pending-command table, and all presence
+                # events, so that every replica knows which devices are connected
+                topics = [
+                    self.mqtt_service.shared_topic(topic_filter)
+                    for topic_filter in self.topic_router.subscriptions(["config_request", "telemetry", "ota_status"])
+                ] + self.topic_router.subscriptions(["command_response", "presence", "client_events"])
+                for topic in topics:
+                    client.subscribe(topic)
+
+                logger.info(f"Subscribed to topics: {', '.join(topics)}")
             else:
                 logger.error(f"Failed to connect to MQTT broker, return code {rc}")
 
-        def on_message(client, userdata, msg):
-            """Handle incoming MQTT messages"""
-            try:
-                logger.info(f"Received MQTT message on topic: {msg.topic}")
-
-                # Parse the message payload
-                try:
-                    payload = json.loads(msg.payload.decode())
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON in message: {msg.payload}")
-                    return
-
-                # Route message based on topic
-                if settings.MQTT_CONFIG_REQUEST_TOPIC in msg.topic:
-                    asyncio.create_task(self.handle_config_request(payload))
-                elif "telemetry" in msg.topic:
-                    asyncio.create_task(self.handle_telemetry_data(msg.topic, payload))
-                elif "ota" in msg.topic and "status" in msg.topic:
-                    asyncio.create_task(self.handle_ota_status(msg.topic, payload))
-                elif "command" in msg.topic and "response" in msg.topic:
-                    asyncio.create_task(self.handle_command_response(msg.topic, payload))
-                else:
-                    logger.warning(f"Unknown topic: {msg.topic}")
-
-            except Exception as e:
-                logger.error(f"Error handling MQTT message: {str(e)}")
-
         def on_disconnect(client, userdata, rc):
             """Handle MQTT disconnection"""
+            self.mqtt_service.connected = False
             logger.warning(f"Disconnected from MQTT broker, return code {rc}")
             if rc != 0:
-                # Attempt to reconnect
-                logger.info("Attempting to reconnect to MQTT broker...")
-                try:
-                    client.reconnect()
-                except Exception as e:
-                    logger.error(f"Failed to reconnect: {str(e)}")
+                # The network thread reconnects automatically
+                logger.info("MQTT network loop will attempt to reconnect...")
 
         self.mqtt_service.client.on_connect = on_connect
-        self.mqtt_service.client.on_message = on_message
         self.mqtt_service.client.on_disconnect = on_disconnect
 
-    async def handle_config_request(self, payload: Dict):
+    async def consume_messages(self):
+        """Consume MQTT messages handed off by the network thread"""
+        while True:
+            msg = await self.message_queue.get()
+            # Wait for a free slot so the number of in-flight handlers stays bounded;
+            # meanwhile the queue fills up and new messages spill to the spool
+            await self.inflight_slots.acquire()
+            try:
+                task = self.dispatch_message(msg)
+            finally:
+                self.message_queue.task_done()
+
+            if task is None:
+                self.inflight_slots.release()
+            else:
+                self.inflight_tasks.add(task)
+                task.add_done_callback(self._release_inflight_slot)
+
+    def _release_inflight_slot(self, task):
+        """Release the in-flight slot held by a finished handler task"""
+        self.inflight_tasks.discard(task)
+        self.inflight_slots.release()
+
+    def build_topic_router(self, profiles: Optional[List[Dict[str, Any]]] = None) -> TopicRouter:
+        """
+        Compile the topic router from the settings templates and the device profiles
+
+        Every template is registered both as is and with the company_<id>/ prefix
+        used by IiotDevice.get_topic_map. Routes resolve to (handler, payload encoding);
+        profile templates come first so their encoding and telemetry filter win over
+        the settings default.
+
+        Args:
+            profiles: Profile topic templates, payload encodings and telemetry filters returned by Odoo
+
+        Returns:
+            Topic router mapping incoming topics to their handlers
+        """
+        profiles = profiles or []
+        router = TopicRouter()
+        router.add_route(settings.MQTT_CONFIG_REQUEST_TOPIC,
+                         (self.handle_config_request, payload_codec.JSON), "config_request")
+
+        routes = [
+            ("telemetry", self.handle_telemetry_data, "telemetry_topic_template", settings.MQTT_TELEMETRY_TOPIC_TEMPLATE),
+            ("ota_status", self.handle_ota_status, "ota_status_topic_template", settings.MQTT_OTA_STATUS_TOPIC_TEMPLATE),
+        ]
+        for name, handler, template_field, default_template in routes:
+            sources = [
+                (profile.get(template_field), profile.get("payload_encoding") or payload_codec.JSON,
+                 FilterSettings.from_profile(profile) if name == "telemetry" else None, False)
+                for profile in profiles
+            ]
+            sources.append((default_template, settings.MQTT_PAYLOAD_ENCODING, None, True))
+            options = {}
+            for template, encoding, filter_settings, fallback in sources:
+                route_handler = handler if filter_settings is None else partial(handler, filter_settings=filter_settings)
+                option = (encoding, filter_settings)
+                for pattern in company_scoped([template]):
+                    try:
+                        if router.add_route(pattern, (route_handler, encoding), name):
+                            options[pattern] = option
+                        elif not fallback and options.get(pattern, option) != option:
+                            logger.warning(f"Topic {pattern} is used with several payload encodings or "
+                                           f"telemetry filters, keeping {options[pattern]}")
+                    except ValueError as e:
+                        logger.error(f"Ignoring invalid {name} topic template: {str(e)}")
+
+        for pattern in company_scoped([settings.MQTT_COMMAND_RESPONSE_TOPIC_TEMPLATE]):
+            router.add_route(pattern, (self.handle_command_response, payload_codec.JSON), "command_response")
+
+        # Last wills may be plain text, so presence payloads are parsed by the handlers
+        presence_routes = [
+            ("presence", self.handle_presence, company_scoped([settings.MQTT_PRESENCE_TOPIC_TEMPLATE])),
+            ("client_events", self.handle_client_event, [settings.MQTT_CLIENT_EVENTS_TOPIC_TEMPLATE]),
+        ]
+        for name, handler, patterns in presence_routes:
+            for pattern in patterns:
+                if not pattern:
+                    continue
+                try:
+                    router.add_route(pattern, (handler, payload_codec.TEXT), name)
+                except ValueError as e:
+                    logger.error(f"Ignoring invalid {name} topic template: {str(e)}")
+
+        return router
+
+    async def load_topic_routes(self):
+        """Rebuild the topic router with the topic templates of the device profiles in Odoo"""
+        response = await self.http_service.get_profile_topics()
+        if response.get("status") != "success":
+            logger.warning(f"Could not load device profile topics, using settings templates only: "
+                           f"{response.get('error')}")
+            return
+
+        self.topic_router = self.build_topic_router(response.get("profiles") or [])
+        logger.info(f"Topic router compiled with {len(self.topic_router.patterns)} patterns")
+
+    def spill_message(self, msg):
+        """Spool a telemetry message that does not fit in the full message queue"""
+        route = self.topic_router.match(msg.topic)
+        if route and route[1] == "telemetry" and route[2].get("device"):
+            (_, encoding), _, variables = route
+            self.presence.seen(variables["device"])
+            payload = msg.payload
+            if encoding != payload_codec.JSON or self.edge_rules.rule_count:
+                # The spool only holds JSON; JSON payloads are otherwise validated when replayed
+                try:
+                    decoded, raw = payload_codec.decode_message(payload, encoding)
+                except (PayloadDecodeError, RuntimeError) as e:
+                    MESSAGES_FAILED.inc(topic_class="telemetry")
+                    logger.error(f"Dropped undecodable message on {msg.topic}: {str(e)}")
+                    return
+                # Odoo leaves the edge rules to the bridge, so they must fire before the
+                # reading waits in the spool, as they do for queued telemetry
+                self.fire_automation_rules(variables["device"], decoded)
+                payload = bytes(raw)
+            self.telemetry_spool.append(variables["device"], msg.topic, payload)
+            MESSAGES_SPOOLED.inc()
+        else:
+            MESSAGES_DROPPED.inc()
+            if self.log_sampler.sample(logging.WARNING):
+                logger.warning(f"Message queue full, dropped message on {msg.topic}")
+
+    def dispatch_message(self, msg) -> Optional[asyncio.Task]:
+        """Route an incoming MQTT message to its handler and return the handler task"""
+        try:
+            if self.log_sampler.sample():
+                logger.debug(f"Received MQTT message on topic: {msg.topic}")
+
+            route = self.topic_router.match(msg.topic)
+            if route is None:
+                MESSAGES_RECEIVED.inc(topic_class="unknown")
+                logger.warning(f"Unknown topic: {msg.topic}")
+                return None
+            (handler, encoding), topic_class, variables = route
+            MESSAGES_RECEIVED.inc(topic_class=topic_class)
+
+            # paho stamps messages with time.monotonic() when they are read from the socket
+            received_at = getattr(msg, "timestamp", 0) or time.monotonic()
+            if topic_class in DEVICE_ROUTES and "device" in variables:
+                self.presence.seen(variables["device"], now=received_at)
+
+            # Decode the message payload with the encoding of the device profile
+            try:
+                payload, raw = payload_codec.decode_message(msg.payload, encoding)
+            except (PayloadDecodeError, RuntimeError) as e:
+                MESSAGES_FAILED.inc(topic_class=topic_class)
+                logger.error(f"Invalid payload on {msg.topic}: {str(e)}")
+                return None
+
+            return asyncio.create_task(
+                self.run_handler(handler, topic_class, received_at, msg.topic, payload, variables, raw)
+            )
+
+        except Exception as e:
+            logger.error(f"Error handling MQTT message: {str(e)}")
+        return None
+
+    async def run_handler(self, handler, topic_class: str, received_at: float,
+                          topic: str, payload: Any, variables: Dict[str, str], raw: RawJSON):
+        """Run a message handler and record its outcome and the forward latency"""
+        result = await handler(topic, payload, variables, raw)
+        if result is None:
+            # Handled without forwarding, e.g. telemetry dropped by the profile's filter
+            return
+        if result:
+            MESSAGES_FORWARDED.inc(topic_class=topic_class)
+            FORWARD_LATENCY.observe(time.monotonic() - received_at, topic_class=topic_class)
+        else:
+            MESSAGES_FAILED.inc(topic_class=topic_class)
+
+    async def handle_config_request(self, topic: str, payload: Any, variables: Dict[str, str],
+                                    raw: Optional[RawJSON] = None) -> bool:
         """Handle device configuration request from MQTT"""
         try:
             serial = payload.get('serial')
@@ -270,7 +540,7 @@ class MQTTBridge:
 
             if not serial or not token:
                 logger.error("Missing serial or token in config request")
-                return
+                return False
 
             logger.info(f"Processing config request for device: {serial}")
 
@@ -292,12 +562,13 @@ class MQTTBridge:
                     "timestamp": datetime.utcnow().isoformat()
                 }
 
-                await self.mqtt_service.publish(config_topic, json.dumps(device_config))
+                self.mqtt_service.publish(config_topic, json.dumps(device_config))
 
                 logger.info(f"Sent configuration to device: {device_id}")
 
                 # Cache the configuration
                 await self.device_manager.set_device_config(device_id, config_response)
+                return True
             else:
                 error_msg = {
                     "error": config_response.get("error", "Unknown error"),
@@ -307,51 +578,97 @@ class MQTTBridge:
                 # Send error response (assuming we can get device_id from token lookup)
                 # In a real scenario, might need to look up device_id from serial
                 error_topic = settings.MQTT_CONFIG_RESPONSE_TOPIC.format(device=serial)
-                await self.mqtt_service.publish(error_topic, json.dumps(error_msg))
+                self.mqtt_service.publish(error_topic, json.dumps(error_msg))
 
         except Exception as e:
             logger.error(f"Error handling config request: {str(e)}")
+        return False
+
+    async def handle_telemetry_data(self, topic: str, payload: Any, variables: Dict[str, str],
+                                    raw: Optional[RawJSON] = None,
+                                    filter_settings: Optional[FilterSettings] = None) -> Optional[bool]:
+        """
+        Handle telemetry data from device and forward to Odoo
 
-    async def handle_telemetry_data(self, topic: str, payload: Dict):
-        """Handle telemetry data from device and forward to Odoo"""
+        Returns None when the telemetry filter of the device profile drops the message.
+        """
         try:
-            # Extract device_id from topic
-            # Assuming topic format like: telemetry/{device_id}/data
-            topic_parts = topic.split('/')
-            if len(topic_parts) >= 2:
-                device_id = topic_parts[1]  # Extract device_id from topic
-            else:
+            device_id = variables.get("device")
+            if not device_id:
                 logger.error(f"Invalid topic format: {topic}")
-                return
+                return False
+
+            if self.log_sampler.sample():
+                logger.debug(f"Processing telemetry for device: {device_id}")
 
-            logger.info(f"Processing telemetry for device: {device_id}")
+            # Act on automation rules before the reading makes its way to Odoo
+            self.fire_automation_rules(device_id, payload)
 
-            # Forward telemetry to Odoo via webhook
-            telemetry_response = await self.http_service.send_telemetry(
-                device_id, topic, payload
+            if filter_settings is not None:
+                if len(self.cluster.members) > 1:
+                    # Shared subscriptions spread the device's messages over the replicas:
+                    # compare with the last message forwarded by any of them
+                    suppressed_by = await self.telemetry_filter.check_shared(
+                        self.state_store, device_id, payload, filter_settings
+                    )
+                else:
+                    suppressed_by = self.telemetry_filter.check(device_id, payload, filter_settings)
+                if suppressed_by:
+                    TELEMETRY_SUPPRESSED.inc(filter=suppressed_by)
+                    return None
+
+            if self.telemetry_spool.holds(device_id):
+                # Older messages of the device wait for replay: queue behind them so Odoo
+                # applies the readings in order and the latest value is not overwritten
+                self.telemetry_spool.append(
+                    device_id, topic, bytes(raw) if raw is not None else payload_codec.dumps(payload)
+                )
+                MESSAGES_SPOOLED.inc()
+                return None
+
+            # Forward telemetry to Odoo through the micro-batching webhook,
+            # passing the JSON document through without re-encoding it
+            telemetry_response = await self.telemetry_batcher.submit(
+                device_id, topic, raw if raw is not None else payload
             )
 
             if telemetry_response.get("status") == "success":
-                logger.info(f"Telemetry forwarded successfully for device: {device_id}")
-            else:
+                if self.log_sampler.sample():
+                    logger.debug(f"Telemetry forwarded successfully for device: {device_id}")
+                return True
+
+            # Failed batches are logged by the HTTP service, only sample the per-message line
+            if self.log_sampler.sample(logging.ERROR):
                 logger.error(f"Failed to forward telemetry: {telemetry_response.get('error')}")
+            if filter_settings is not None and not telemetry_response.get("retryable"):
+                # Odoo did not record this message: compare the next one with what Odoo has
+                if len(self.cluster.members) > 1:
+                    await self.telemetry_filter.forget_shared(self.state_store, device_id)
+                else:
+                    self.telemetry_filter.forget(device_id)
+            if telemetry_response.get("retryable"):
+                # Odoo is unreachable: keep the message for replay
+                self.telemetry_spool.append(
+                    device_id, topic, bytes(raw) if raw is not None else payload_codec.dumps(payload),
+                    message_id=telemetry_response.get("id")
+                )
+                MESSAGES_SPOOLED.inc()
 
         except Exception as e:
             logger.error(f"Error handling telemetry data: {str(e)}")
+        return False
 
-    async def handle_ota_status(self, topic: str, payload: Dict):
+    async def handle_ota_status(self, topic: str, payload: Any, variables: Dict[str, str],
+                                raw: Optional[RawJSON] = None) -> bool:
         """Handle OTA status updates from device and forward to Odoo"""
         try:
-            # Extract device_id from topic
-            # Assuming topic format like: ota/{device_id}/status
-            topic_parts = topic.split('/')
-            if len(topic_parts) >= 2:
-                device_id = topic_parts[1]  # Extract device_id from topic
-            else:
+            device_id = variables.get("device")
+            if not device_id:
                 logger.error(f"Invalid topic format: {topic}")
-                return
+                return False
 
-            logger.info(f"Processing OTA status for device: {device_id}")
+            if self.log_sampler.sample():
+                logger.debug(f"Processing OTA status for device: {device_id}")
 
             # Forward OTA status to Odoo via webhook
             ota_response = await self.http_service.send_ota_status(
@@ -359,47 +676,413 @@ class MQTTBridge:
             )
 
             if ota_response.get("status") == "success":
-                logger.info(f"OTA status forwarded successfully for device: {device_id}")
-            else:
-                logger.error(f"Failed to forward OTA status: {ota_response.get('error')}")
+                if self.log_sampler.sample():
+                    logger.debug(f"OTA status forwarded successfully for device: {device_id}")
+                return True
+
+            logger.error(f"Failed to forward OTA status: {ota_response.get('error')}")
 
         except Exception as e:
             logger.error(f"Error handling OTA status: {str(e)}")
+        return False
 
-    async def handle_command_response(self, topic: str, payload: Dict):
-        """Handle command responses from devices"""
+    async def handle_command_response(self, topic: str, payload: Any, variables: Dict[str, str],
+                                      raw: Optional[RawJSON] = None) -> bool:
+        """Match command responses from devices with their pending command"""
         try:
-            # Extract device_id from topic
-            # Assuming topic format like: command/{device_id}/response
-            topic_parts = topic.split('/')
-            if len(topic_parts) >= 2:
-                device_id = topic_parts[1]  # Extract device_id from topic
-            else:
+            device_id = variables.get("device")
+            if not device_id:
                 logger.error(f"Invalid topic format: {topic}")
+                return False
+
+            if not isinstance(payload, dict):
+                logger.error(f"Invalid command response from {device_id}: payload must be a JSON object")
+                return False
+
+            command_id = payload.get('command_id')
+            status = payload.get('status', 'success')
+            if not command_id:
+                if self.log_sampler.sample():
+                    logger.debug(f"Command {payload.get('action')} response from {device_id} without command_id")
+                return True
+
+            command_result = self.device_manager.resolve_pending_command(
+                command_id,
+                'failed' if str(status).lower() in ('failed', 'error') else 'success',
+                payload.get('result')
+            )
+            if command_result is None:
+                # Published by another replica, or acknowledged after its deadline
+                return True
+
+            if self.log_sampler.sample():
+                logger.debug(f"Command {command_id} acknowledged by {device_id} in {command_result['latency_ms']} ms")
+            self.record_command_result(command_result)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error handling command response: {str(e)}")
+        return False
+
+    async def handle_presence(self, topic: str, payload: Any, variables: Dict[str, str],
+                              raw: Optional[RawJSON] = None) -> Optional[bool]:
+        """
+        Track the birth and last will messages of a device
+
+        The payload is "online"/"offline", or a JSON object with a status member.
+        Every replica updates its presence state; only the device's owner reports the change.
+        """
+        device_id = variables.get("device")
+        state = payload.strip() if isinstance(payload, str) else ""
+        if state.startswith("{"):
+            try:
+                state = str(payload_codec.loads(state).get("status", ""))
+            except (ValueError, AttributeError):
+                state = ""
+        status = PRESENCE_STATUSES.get(state.lower())
+        if not device_id or status is None:
+            logger.error(f"Invalid presence message on {topic}: {payload!r}")
+            return False
+
+        report = self.cluster.owns(device_id)
+        if status == ONLINE:
+            self.presence.seen(device_id, report=report, reason="birth")
+        else:
+            self.presence.offline(device_id, "will", report=report)
+        return None
+
+    async def handle_client_event(self, topic: str, payload: Any, variables: Dict[str, str],
+                                  raw: Optional[RawJSON] = None) -> Optional[bool]:
+        """Track the client connected and disconnected events published by the broker under $SYS"""
+        device_id = variables.get("device")
+        event = variables.get("event")
+        if not device_id or event not in ("connected", "disconnected"):
+            # Other client events, e.g. subscribed, say nothing about presence
+            return None
+
+        report = self.cluster.owns(device_id)
+        if event == "connected":
+            self.presence.seen(device_id, report=report, reason="connected")
+        else:
+            self.presence.offline(device_id, "disconnected", report=report)
+        return None
+
+    def fire_automation_rules(self, device_id: str, payload: Any):
+        """
+        Publish the command of every edge automation rule fired by a telemetry payload
+
+        Args:
+            device_id: Device that sent the telemetry
+            payload: Decoded telemetry payload
+        """
+        fired = self.edge_rules.evaluate(payload)
+        if not fired:
+            return
+        if len(self.cluster.members) > 1 and self.edge_rules.cooldown > 0:
+            # Other replicas receive readings of the same sensors: claim the cooldown
+            # of each rule in the shared store, so a rule fires once across the cluster
+            task = asyncio.create_task(self.fire_shared_automation_rules(device_id, fired))
+            self.inflight_tasks.add(task)
+            task.add_done_callback(self.inflight_tasks.discard)
+            return
+        for rule, value in fired:
+            self.fire_automation_rule(device_id, rule, value)
+
+    async def fire_shared_automation_rules(self, device_id: str, fired: List[Tuple[Dict[str, Any], float]]):
+        """Fire the rules whose cooldown this replica claims in the shared state store"""
+        for rule, value in fired:
+            try:
+                claimed = await self.state_store.set_if_absent(
+                    f"{RULE_COOLDOWN_KEY}:{rule['id']}", self.cluster.instance_id, self.edge_rules.cooldown
+                )
+            except Exception as e:
+                # Rather fire twice than not at all
+                logger.error(f"Could not claim the cooldown of automation rule {rule.get('id')}: {str(e)}")
+                claimed = True
+            if claimed:
+                self.fire_automation_rule(device_id, rule, value)
+
+    def fire_automation_rule(self, device_id: str, rule: Dict[str, Any], value: float):
+        """Publish the command of an automation rule fired by a telemetry reading"""
+        try:
+            command_id = uuid.uuid4().hex
+            command_payload = dict(rule["payload"]) if isinstance(rule["payload"], dict) else {}
+            command_payload["command_id"] = command_id
+
+            self.device_manager.register_pending_command(command_id, rule["device_id"], rule["action"])
+            if not self.mqtt_service.publish(rule["topic"], json.dumps(command_payload)):
+                self.device_manager.resolve_pending_command(command_id, "failed")
+                logger.error(f"Automation rule {rule['id']} fired but its command could not be published")
                 return
 
-            logger.info(f"Processing command response from device: {device_id}")
+            AUTOMATION_TRIGGERS.inc(sensor_type=rule["sensor_type"])
+            logger.info(f"Automation rule {rule['id']} fired by {device_id}: {rule['sensor_type']} {value} "
+                        f"{rule['operator']} {rule['threshold']}, sent {rule['action']} to {rule['device_id']}")
+            self.automation_triggers.append({
+                "rule_id": rule["id"],
+                "command_id": command_id,
+                "source_device_id": device_id,
+                "sensor_type": rule["sensor_type"],
+                "value": value,
+                "triggered_at": datetime.utcnow().isoformat()
+            })
+        except Exception as e:
+            logger.error(f"Error firing automation rule {rule.get('id')}: {str(e)}")
+
+    def _publish_message(self, message: PublishMessage) -> Dict[str, Any]:
+        """Publish a command rendered by Odoo, registering it for acknowledgement tracking"""
+        payload = dict(message.payload)
+        if message.command_id:
+            payload.setdefault("command_id", message.command_id)
+            if message.device_id:
+                self.device_manager.register_pending_command(
+                    message.command_id, message.device_id, payload.get("action"), message.timeout
+                )
+
+        if self.mqtt_service.publish(message.topic, json.dumps(payload)):
+            return {
+                "status": "success",
+                "command_id": message.command_id
+            }
 
-            # Process the command response (e.g., update command status in Odoo)
-            # This could involve notifying Odoo about the command result
-            action = payload.get('action')
-            status = payload.get('status', 'unknown')
-            result = payload.get('result')
+        if message.command_id:
+            self.device_manager.resolve_pending_command(message.command_id, "failed")
+        return {
+            "status": "error",
+            "command_id": message.command_id,
+            "error": f"Failed to publish on {message.topic}"
+        }
+
+    async def load_automation_rules(self) -> bool:
+        """
+        Load the edge automation ruleset from Odoo if its version changed
+
+        Returns:
+            False if Odoo could not be reached, in which case the current ruleset is kept
+        """
+        response = await self.http_service.get_automation_ruleset(self.edge_rules.version)
+        if response.get("status") != "success":
+            logger.warning(f"Could not load the automation ruleset: {response.get('error')}")
+            return False
+
+        if response.get("changed"):
+            count = self.edge_rules.load(response.get("version"), response.get("rules") or [])
+            logger.info(f"Automation ruleset {response.get('version')} loaded with {count} rules")
+        return True
+
+    async def refresh_automation_rules(self):
+        """Poll the automation ruleset version, for rule changes whose notification did not reach this replica"""
+        while True:
+            await asyncio.sleep(settings.AUTOMATION_RULESET_REFRESH_INTERVAL)
+            try:
+                await self.load_automation_rules()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing the automation ruleset: {str(e)}")
+
+    def record_command_result(self, command_result: Dict[str, Any]):
+        """Queue a command result for the next report to Odoo"""
+        COMMAND_ROUND_TRIP.observe(command_result["latency_ms"] / 1000.0, status=command_result["status"])
+        if len(self.command_results) == self.command_results.maxlen:
+            logger.warning("Command result backlog full, dropping the oldest result")
+        self.command_results.append(command_result)
+
+    async def flush_command_results(self) -> bool:
+        """
+        Report fired automation rules, then command results, to Odoo in batches
+
+        Triggers go first so that Odoo has logged the command of a fired rule
+        by the time the result of that command arrives.
+
+        Returns:
+            False if Odoo could not be reached, in which case the reports are kept for the next flush
+        """
+        return (
+            await self._flush_reports(self.automation_triggers, self.http_service.send_automation_triggers,
+                                      "Automation triggers")
+            and await self._flush_reports(self.command_results, self.http_service.send_command_results,
+                                          "Command results")
+        )
 
-            logger.info(f"Command {action} response from {device_id}: {status}")
+    async def _flush_reports(self, reports: deque, send, description: str) -> bool:
+        """Send queued reports in batches, putting a batch back if Odoo does not accept it"""
+        while reports:
+            batch = [reports.popleft() for _ in range(min(len(reports), settings.COMMAND_RESULT_BATCH_MAX_SIZE))]
+            response = await send(batch)
+            if response.get("status") != "success":
+                reports.extendleft(reversed(batch))
+                logger.warning(f"{description} not reported, Odoo unavailable: {response.get('error')}")
+                return False
+        return True
+
+    async def track_commands(self):
+        """Time out unacknowledged commands and report command results to Odoo"""
+        flush_interval = settings.COMMAND_RESULT_FLUSH_INTERVAL_MS / 1000.0
+        while True:
+            await asyncio.sleep(flush_interval)
+            try:
+                for command_result in self.device_manager.expire_pending_commands():
+                    self.record_command_result(command_result)
+                await self.flush_command_results()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error tracking device commands: {str(e)}")
+
+    async def expire_presence(self):
+        """
+        Mark devices offline when no replica heard from them within the presence timeout
+
+        With several replicas, shared subscriptions spread a device's messages over
+        all of them, so a device silent on this replica is checked against the last
+        seen time recorded in the shared store before it is declared offline.
+        """
+        expired = self.presence.expire()
+        if not expired:
+            return
+
+        shared_last_seen = {}
+        if len(self.cluster.members) > 1:
+            shared_last_seen = await self.device_manager.get_last_seen(expired)
+
+        now = time.time()
+        for device_id in expired:
+            last_seen = shared_last_seen.get(device_id)
+            age = (now - last_seen.replace(tzinfo=timezone.utc).timestamp()) if last_seen else None
+            if age is not None and age < self.presence.timeout:
+                self.presence.seen(device_id, now=time.monotonic() - age, wall_time=now - age, report=False)
+            else:
+                self.presence.offline(device_id, "timeout")
+
+    async def flush_presence(self) -> bool:
+        """
+        Share last seen times with the other replicas and report connection status changes
+        to Odoo, as one bulk update per batch instead of one write per device
+
+        Returns:
+            False if Odoo could not be reached, in which case the changes are kept for the next flush
+        """
+        last_seen = self.presence.drain_last_seen()
+        if last_seen:
+            await self.device_manager.record_last_seen(last_seen)
+
+        changes = self.presence.drain_changes()
+        if not changes:
+            return True
+        await self.device_manager.apply_presence_changes(changes)
+
+        for start in range(0, len(changes), settings.PRESENCE_BATCH_MAX_SIZE):
+            batch = changes[start:start + settings.PRESENCE_BATCH_MAX_SIZE]
+            response = await self.http_service.send_presence_changes([
+                dict(change, at=datetime.utcfromtimestamp(change["at"]).isoformat()) for change in batch
+            ])
+            if response.get("status") != "success":
+                self.presence.restore_changes(changes[start:])
+                logger.warning(f"Presence changes not reported, Odoo unavailable: {response.get('error')}")
+                return False
+            for change in batch:
+                PRESENCE_CHANGES.inc(status=change["status"])
+        logger.info(f"Reported {len(changes)} device presence changes, {self.presence.online_count} devices online")
+        return True
+
+    async def track_presence(self):
+        """Expire silent devices and flush presence changes periodically"""
+        while True:
+            await asyncio.sleep(settings.PRESENCE_FLUSH_INTERVAL)
+            try:
+                await self.expire_presence()
+                await self.flush_presence()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error tracking device presence: {str(e)}")
 
-            # In a real implementation, you might want to send this status back to Odoo
-            # For example, to update a command tracking record in Odoo
-            # await self.http_service.update_command_status(device_id, action, status, result)
+    async def replay_spool(self):
+        """Write spooled telemetry to disk and replay it in order once Odoo accepts it again"""
+        flush_interval = settings.SPOOL_FLUSH_INTERVAL_MS / 1000.0
+        while True:
+            await asyncio.sleep(flush_interval)
+            try:
+                await asyncio.to_thread(self.telemetry_spool.flush)
+                if not self.telemetry_spool.depth():
+                    continue
+
+                rows = await asyncio.to_thread(self.telemetry_spool.read, settings.SPOOL_REPLAY_BATCH_SIZE)
+                if not rows:
+                    continue
+
+                messages = []
+                for row_id, message_id, device_id, topic, payload, received_at in rows:
+                    try:
+                        payload_codec.loads(payload)
+                        messages.append({
+                            "id": message_id,
+                            "device_id": device_id,
+                            "topic": topic,
+                            "payload": RawJSON(payload)
+                        })
+                    except ValueError:
+                        logger.error(f"Discarding spooled message {row_id} with invalid JSON payload")
+
+                if messages:
+                    response = await self.http_service.send_telemetry_batch(messages)
+                    if response.get("status") != "success":
+                        # Keep the rows and retry the same batch later to preserve ordering
+                        logger.warning(f"Spool replay paused, Odoo unavailable: {response.get('error')}")
+                        await asyncio.sleep(settings.SPOOL_REPLAY_RETRY_INTERVAL)
+                        continue
+
+                    failed = [r for r in response.get("results") or [] if r.get("status") != "success"]
+                    if failed:
+                        logger.error(f"{len(failed)} spooled messages rejected by Odoo, e.g. {failed[0].get('error')}")
+
+                await asyncio.to_thread(self.telemetry_spool.delete_through, rows[-1][0])
+                logger.info(f"Replayed {len(messages)} spooled messages, {self.telemetry_spool.depth()} remaining")
+
+                # Throttle the replay so a recovering Odoo is not flooded
+                await asyncio.sleep(len(rows) / max(1, settings.SPOOL_REPLAY_RATE))
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error replaying telemetry spool: {str(e)}")
 
-        except Exception as e:
-            logger.error(f"Error handling command response: {str(e)}")
+    async def maintain_membership(self):
+        """Heartbeat this replica into the shared store and track the other replicas"""
+        while True:
+            try:
+                await self.cluster.heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error updating bridge cluster membership: {str(e)}")
+            await asyncio.sleep(settings.BRIDGE_HEARTBEAT_INTERVAL)
 
     async def start(self):
         """Start the MQTT bridge"""
+        background_tasks = []
         try:
-            # Connect to MQTT broker
+            # Compile the topic router before subscribing, so profile topics are included
+            await self.load_topic_routes()
+            await self.load_automation_rules()
+
+            # Hand MQTT messages from the network thread to the event loop,
+            # spilling telemetry to the spool when the queue is full
+            self.mqtt_service.attach_queue(
+                asyncio.get_running_loop(), self.message_queue, overflow=self.spill_message
+            )
+
+            # Connect to MQTT broker and start the network thread
             self.mqtt_service.connect()
+            self.mqtt_service.start_loop()
+
+            background_tasks.append(asyncio.create_task(self.consume_messages()))
+            background_tasks.append(asyncio.create_task(self.replay_spool()))
+            background_tasks.append(asyncio.create_task(self.maintain_membership()))
+            background_tasks.append(asyncio.create_task(self.track_commands()))
+            background_tasks.append(asyncio.create_task(self.refresh_automation_rules()))
+            background_tasks.append(asyncio.create_task(self.track_presence()))
 
             # Start the FastAPI app
             config = uvicorn.Config(
@@ -409,21 +1092,24 @@ class MQTTBridge:
                 log_level="info"
             )
             server = uvicorn.Server(config)
-
-            # Run the server in a separate task
-            server_task = asyncio.create_task(server.serve())
-
-            # Keep the MQTT client running
-            while True:
-                self.mqtt_service.loop()
-                await asyncio.sleep(0.01)  # Small delay to prevent blocking
+            await server.serve()
 
         except KeyboardInterrupt:
             logger.info("Shutting down MQTT bridge...")
-            self.mqtt_service.disconnect()
         except Exception as e:
             logger.error(f"Error starting MQTT bridge: {str(e)}")
             raise
+        finally:
+            self.mqtt_service.stop_loop()
+            self.mqtt_service.disconnect()
+            for task in background_tasks:
+                task.cancel()
+            await self.telemetry_batcher.flush()
+            await self.flush_command_results()
+            await self.flush_presence()
+            self.telemetry_spool.close()
+            await self.cluster.leave()
+            await self.state_store.close()
 
 
 # Initialize the bridge
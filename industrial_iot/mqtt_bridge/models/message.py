@@ -2,7 +2,7 @@
 Data models for MQTT Bridge messages
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -36,6 +36,23 @@ class CommandMessage(BaseModel):
     action: str = Field(..., description="Action/command to execute")
     params: Dict[str, Any] = Field(default={}, description="Command parameters")
     timestamp: datetime = Field(default_factory=datetime.utcnow, description="Timestamp of command")
+    command_id: Optional[str] = Field(None, description="Command identifier, generated by the bridge if not given")
+    timeout: Optional[float] = Field(None, description="Seconds to wait for the device acknowledgement")
+    wait: bool = Field(False, description="Wait for the device acknowledgement before responding")
+
+
+class PublishMessage(BaseModel):
+    """Model for commands rendered by Odoo and published as they are"""
+    topic: str = Field(..., description="MQTT topic to publish on")
+    payload: Dict[str, Any] = Field(..., description="Command payload")
+    device_id: Optional[str] = Field(None, description="Target device identifier")
+    command_id: Optional[str] = Field(None, description="Command identifier the device echoes back in its response")
+    timeout: Optional[float] = Field(None, description="Seconds to wait for the device acknowledgement")
+
+
+class PublishBatch(BaseModel):
+    """Model for a batch of commands drained from the Odoo command outbox"""
+    messages: List[PublishMessage] = Field(..., description="Commands to publish, in order")
 
 
 class OTAStatus(BaseModel):
@@ -0,0 +1,81 @@
+"""
+Circuit Breaker for the Industrial IoT Bridge
+Stops calls to Odoo for a cool-down period after repeated failures
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Service class implementing a closed / open / half-open circuit breaker
+
+    After ``failure_threshold`` consecutive failures the circuit opens and all
+    calls are rejected for ``cooldown`` seconds. The next call after the
+    cool-down is let through as a trial: success closes the circuit, failure
+    opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0, name: str = "odoo"):
+        """
+        Args:
+            failure_threshold: Consecutive failures before the circuit opens
+            cooldown: Seconds the circuit stays open before a trial call is allowed
+            name: Name used in log messages
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.name = name
+        self.failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cool-down has elapsed"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may be attempted
+
+        Returns:
+            True if the call may proceed, False if the circuit is open
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        """Record a successful call and close the circuit"""
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self._state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """Record a failed call, opening the circuit when the threshold is reached"""
+        self.failures += 1
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(f"Circuit {self.name} opened after {self.failures} failures, "
+                               f"cooling down for {self.cooldown}s")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
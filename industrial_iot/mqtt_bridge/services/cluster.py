@@ -0,0 +1,132 @@
+"""
+Cluster Membership for the Industrial IoT Bridge
+Tracks live bridge replicas and assigns devices to them by consistent hashing
+"""
+
+import bisect
+import hashlib
+import logging
+import time
+from typing import Iterable, List, Optional
+
+from services.state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+MEMBERS_KEY = "bridge:members"
+
+
+class ConsistentHashRing:
+    """
+    Consistent hash ring with virtual nodes
+
+    Adding or removing a replica only moves the devices of that replica,
+    instead of reshuffling every device as modulo hashing would.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 100):
+        """
+        Args:
+            nodes: Initial node names
+            vnodes: Number of virtual nodes per node, smoothing the key distribution
+        """
+        self.vnodes = max(1, vnodes)
+        self.nodes: List[str] = []
+        self._hashes: List[int] = []
+        self._owners: List[str] = []
+        self.set_nodes(nodes)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def set_nodes(self, nodes: Iterable[str]):
+        """Rebuild the ring for the given set of nodes"""
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (self._hash(f"{node}#{index}"), node)
+            for node in self.nodes
+            for index in range(self.vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def get_node(self, key: str) -> Optional[str]:
+        """
+        Find the node owning a key
+
+        Args:
+            key: Key to place on the ring, e.g. a device ID
+
+        Returns:
+            Owning node name, or None if the ring is empty
+        """
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ClusterMembership:
+    """
+    Service class keeping the list of live bridge replicas in the shared state store
+
+    Every replica heartbeats its instance ID into the store; replicas whose
+    heartbeat is older than ``ttl`` seconds are dropped from the hash ring.
+    With the in-memory store the replica only ever sees itself and owns every device.
+    """
+
+    def __init__(self, store: StateStore, instance_id: str, ttl: float = 15.0, vnodes: int = 100):
+        """
+        Args:
+            store: Shared state store
+            instance_id: Unique ID of this bridge replica
+            ttl: Seconds after which a replica without heartbeat is considered gone
+            vnodes: Virtual nodes per replica on the hash ring
+        """
+        self.store = store
+        self.instance_id = instance_id
+        self.ttl = ttl
+        self.ring = ConsistentHashRing([instance_id], vnodes=vnodes)
+
+    @property
+    def members(self) -> List[str]:
+        """Live replicas, including this one"""
+        return self.ring.nodes
+
+    async def heartbeat(self):
+        """Publish this replica's heartbeat and refresh the live member list"""
+        now = time.time()
+        await self.store.hset(MEMBERS_KEY, self.instance_id, str(now))
+
+        members = await self.store.hgetall(MEMBERS_KEY)
+        alive = []
+        expired = []
+        for instance_id, last_seen in members.items():
+            try:
+                if now - float(last_seen) <= self.ttl:
+                    alive.append(instance_id)
+                    continue
+            except (TypeError, ValueError):
+                pass
+            expired.append(instance_id)
+
+        if expired:
+            await self.store.hdel(MEMBERS_KEY, *expired)
+
+        if sorted(set(alive)) != self.ring.nodes:
+            logger.info(f"Bridge cluster members changed: {sorted(alive)}")
+            self.ring.set_nodes(alive)
+
+    async def leave(self):
+        """Remove this replica from the cluster on shutdown"""
+        await self.store.hdel(MEMBERS_KEY, self.instance_id)
+
+    def owner_of(self, device_id: str) -> Optional[str]:
+        """Instance ID of the replica owning a device"""
+        return self.ring.get_node(device_id)
+
+    def owns(self, device_id: str) -> bool:
+        """Check whether device-affine work for a device belongs to this replica"""
+        owner = self.ring.get_node(device_id)
+        return owner is None or owner == self.instance_id
@@ -4,25 +4,41 @@ Handles device state management and caching
 """
 
 import asyncio
+import heapq
 import json
 import logging
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 
+from config.settings import settings
+from services.state_store import StateStore, InMemoryStateStore
+
 logger = logging.getLogger(__name__)
 
+CONFIGS_KEY = "device:configs"
+CONNECTIONS_KEY = "device:connections"
+LAST_SEEN_KEY = "device:last_seen"
+COMMANDS_KEY = "device:commands"
+
 
 class DeviceManager:
     """
     Service class for managing device state, caching, and metadata
+
+    State lives in a StateStore so that several bridge replicas can share it;
+    the default in-memory store keeps the previous single-process behaviour.
+    Commands waiting for a device acknowledgement are the exception: they are
+    tracked in process by the replica that published them, each with a future
+    resolved by the acknowledgement or by its deadline.
     """
 
-    def __init__(self):
-        self.device_configs = {}  # Cache for device configurations
-        self.device_connections = {}  # Track connected devices
-        self.device_last_seen = {}  # Track last activity
-        self.command_queue = {}  # Queue for pending commands
-        self._lock = asyncio.Lock()  # Thread-safe operations
+    def __init__(self, store: Optional[StateStore] = None):
+        self.store = store or InMemoryStateStore()
+        self.config_ttl = timedelta(seconds=settings.DEVICE_CACHE_TTL)
+        self._pending_commands: Dict[str, Dict[str, Any]] = {}
+        # (deadline, command_id) heap; entries of resolved or re-sent commands are skipped lazily
+        self._command_deadlines: List[tuple] = []
 
     async def set_device_config(self, device_id: str, config: Dict[str, Any]):
         """
@@ -32,14 +48,13 @@ class DeviceManager:
             device_id: Device identifier
             config: Configuration data from Odoo
         """
-        async with self._lock:
-            self.device_configs[device_id] = {
-                'config': config,
-                'timestamp': datetime.utcnow(),
-                'mqtt_config': config.get('mqtt', {}),
-                'topics': config.get('topics', {})
-            }
-            logger.info(f"Stored configuration for device: {device_id}")
+        await self.store.hset(CONFIGS_KEY, device_id, json.dumps({
+            'config': config,
+            'timestamp': datetime.utcnow().isoformat(),
+            'mqtt_config': config.get('mqtt', {}),
+            'topics': config.get('topics', {})
+        }))
+        logger.info(f"Stored configuration for device: {device_id}")
 
     async def get_device_config(self, device_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -51,18 +66,30 @@ class DeviceManager:
         Returns:
             Device configuration if available, None otherwise
         """
-        async with self._lock:
-            if device_id in self.device_configs:
-                config = self.device_configs[device_id]
-                # Check if config is still valid (not expired)
-                if datetime.utcnow() < config['timestamp'] + timedelta(hours=1):  # 1 hour TTL
-                    return config
-                else:
-                    # Remove expired config
-                    del self.device_configs[device_id]
-                    logger.info(f"Removed expired configuration for device: {device_id}")
+        raw = await self.store.hget(CONFIGS_KEY, device_id)
+        if not raw:
             return None
 
+        config = json.loads(raw)
+        config['timestamp'] = datetime.fromisoformat(config['timestamp'])
+        # Check if config is still valid (not expired)
+        if datetime.utcnow() < config['timestamp'] + self.config_ttl:
+            return config
+
+        # Remove expired config
+        await self.store.hdel(CONFIGS_KEY, device_id)
+        logger.info(f"Removed expired configuration for device: {device_id}")
+        return None
+
+    async def count_device_configs(self) -> int:
+        """
+        Count cached device configurations, including expired ones not cleaned up yet
+
+        Returns:
+            Number of cached configurations
+        """
+        return await self.store.hlen(CONFIGS_KEY)
+
     async def register_device_connection(self, device_id: str):
         """
         Register a device connection
@@ -70,10 +97,10 @@ class DeviceManager:
         Args:
             device_id: Device identifier
         """
-        async with self._lock:
-            self.device_connections[device_id] = datetime.utcnow()
-            self.device_last_seen[device_id] = datetime.utcnow()
-            logger.info(f"Device connected: {device_id}")
+        now = datetime.utcnow().isoformat()
+        await self.store.hset(CONNECTIONS_KEY, device_id, now)
+        await self.store.hset(LAST_SEEN_KEY, device_id, now)
+        logger.info(f"Device connected: {device_id}")
 
     async def unregister_device_connection(self, device_id: str):
         """
@@ -82,10 +109,8 @@ class DeviceManager:
         Args:
             device_id: Device identifier
         """
-        async with self._lock:
-            if device_id in self.device_connections:
-                del self.device_connections[device_id]
-            logger.info(f"Device disconnected: {device_id}")
+        await self.store.hdel(CONNECTIONS_KEY, device_id)
+        logger.info(f"Device disconnected: {device_id}")
 
     async def update_device_last_seen(self, device_id: str):
         """
@@ -94,8 +119,59 @@ class DeviceManager:
         Args:
             device_id: Device identifier
         """
-        async with self._lock:
-            self.device_last_seen[device_id] = datetime.utcnow()
+        await self.store.hset(LAST_SEEN_KEY, device_id, datetime.utcnow().isoformat())
+
+    async def apply_presence_changes(self, changes: List[Dict[str, Any]]):
+        """
+        Record a batch of connection status changes with one store call per status
+
+        Args:
+            changes: Presence changes with device_id, status (online or offline) and at (wall clock time)
+        """
+        connected = {
+            change["device_id"]: datetime.utcfromtimestamp(change["at"]).isoformat()
+            for change in changes if change["status"] == "online"
+        }
+        disconnected = [change["device_id"] for change in changes if change["status"] != "online"]
+        await self.store.hset_many(CONNECTIONS_KEY, connected)
+        if disconnected:
+            await self.store.hdel(CONNECTIONS_KEY, *disconnected)
+
+    async def record_last_seen(self, last_seen: Dict[str, float]):
+        """
+        Record the last seen time of many devices at once
+
+        Args:
+            last_seen: Wall clock time of the last message, per device
+        """
+        await self.store.hset_many(LAST_SEEN_KEY, {
+            device_id: datetime.utcfromtimestamp(seen_at).isoformat() for device_id, seen_at in last_seen.items()
+        })
+
+    async def get_last_seen(self, device_ids: List[str]) -> Dict[str, datetime]:
+        """
+        Get the last seen time of devices, as recorded by any bridge replica
+
+        Args:
+            device_ids: Device identifiers
+
+        Returns:
+            Dictionary mapping the device IDs that were ever seen to their last seen time (UTC)
+        """
+        values = await self.store.hmget(LAST_SEEN_KEY, device_ids)
+        return {
+            device_id: datetime.fromisoformat(value)
+            for device_id, value in zip(device_ids, values) if value
+        }
+
+    async def count_connected_devices(self) -> int:
+        """
+        Count connected devices without loading them
+
+        Returns:
+            Number of connected devices
+        """
+        return await self.store.hlen(CONNECTIONS_KEY)
 
     async def get_connected_devices(self) -> Dict[str, datetime]:
         """
@@ -104,8 +180,8 @@ class DeviceManager:
         Returns:
             Dictionary mapping device IDs to connection timestamps
         """
-        async with self._lock:
-            return self.device_connections.copy()
+        connections = await self.store.hgetall(CONNECTIONS_KEY)
+        return {device_id: datetime.fromisoformat(ts) for device_id, ts in connections.items()}
 
     async def is_device_connected(self, device_id: str) -> bool:
         """
@@ -117,8 +193,7 @@ class DeviceManager:
         Returns:
             True if device is connected, False otherwise
         """
-        async with self._lock:
-            return device_id in self.device_connections
+        return await self.store.hget(CONNECTIONS_KEY, device_id) is not None
 
     async def queue_command(self, device_id: str, command: Dict[str, Any]):
         """
@@ -128,15 +203,14 @@ class DeviceManager:
             device_id: Device identifier
             command: Command to queue
         """
-        async with self._lock:
-            if device_id not in self.command_queue:
-                self.command_queue[device_id] = []
-            self.command_queue[device_id].append({
-                'command': command,
-                'timestamp': datetime.utcnow(),
-                'id': f"cmd_{datetime.utcnow().timestamp()}"
-            })
-            logger.info(f"Queued command for device {device_id}: {command.get('action')}")
+        commands = await self.get_pending_commands(device_id)
+        commands.append({
+            'command': command,
+            'timestamp': datetime.utcnow().isoformat(),
+            'id': f"cmd_{datetime.utcnow().timestamp()}"
+        })
+        await self.store.hset(COMMANDS_KEY, device_id, json.dumps(commands))
+        logger.info(f"Queued command for device {device_id}: {command.get('action')}")
 
     async def get_pending_commands(self, device_id: str) -> list:
         """
@@ -148,8 +222,8 @@ class DeviceManager:
         Returns:
             List of pending commands
         """
-        async with self._lock:
-            return self.command_queue.get(device_id, [])
+        raw = await self.store.hget(COMMANDS_KEY, device_id)
+        return json.loads(raw) if raw else []
 
     async def clear_commands(self, device_id: str):
         """
@@ -158,26 +232,106 @@ class DeviceManager:
         Args:
             device_id: Device identifier
         """
-        async with self._lock:
-            if device_id in self.command_queue:
-                del self.command_queue[device_id]
-                logger.info(f"Cleared command queue for device: {device_id}")
+        await self.store.hdel(COMMANDS_KEY, device_id)
+        logger.info(f"Cleared command queue for device: {device_id}")
+
+    def register_pending_command(self, command_id: str, device_id: str, action: Optional[str] = None,
+                                 timeout: Optional[float] = None) -> asyncio.Future:
+        """
+        Start waiting for the acknowledgement of a published command
+
+        Args:
+            command_id: Unique command identifier, echoed back by the device
+            device_id: Target device identifier
+            action: Command action, for logging
+            timeout: Seconds to wait for the acknowledgement, defaults to COMMAND_ACK_TIMEOUT
+
+        Returns:
+            Future resolved with the command result, see resolve_pending_command
+        """
+        timeout = settings.COMMAND_ACK_TIMEOUT if timeout is None else timeout
+        sent_at = time.monotonic()
+        deadline = sent_at + timeout
+        future = asyncio.get_running_loop().create_future()
+        self._pending_commands[command_id] = {
+            'device_id': device_id,
+            'action': action,
+            'sent_at': sent_at,
+            'deadline': deadline,
+            'future': future
+        }
+        heapq.heappush(self._command_deadlines, (deadline, command_id))
+        return future
+
+    def resolve_pending_command(self, command_id: str, status: str,
+                                result: Any = None) -> Optional[Dict[str, Any]]:
+        """
+        Complete a pending command with the outcome reported by the device
+
+        Args:
+            command_id: Command identifier from the acknowledgement
+            status: success, failed or timeout
+            result: Result data returned by the device
+
+        Returns:
+            Command result with the round-trip latency, or None if the command
+            is not pending on this replica (unknown, already resolved or timed out)
+        """
+        pending = self._pending_commands.pop(command_id, None)
+        if pending is None:
+            return None
+
+        command_result = {
+            'command_id': command_id,
+            'device_id': pending['device_id'],
+            'status': status,
+            'latency_ms': int((time.monotonic() - pending['sent_at']) * 1000),
+            'result': result
+        }
+        if not pending['future'].done():
+            pending['future'].set_result(command_result)
+        return command_result
+
+    def expire_pending_commands(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Resolve the pending commands whose deadline has passed with a timeout status
+
+        Args:
+            now: Monotonic time to compare deadlines with, defaults to the current time
+
+        Returns:
+            Results of the commands that timed out
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+        while self._command_deadlines and self._command_deadlines[0][0] <= now:
+            deadline, command_id = heapq.heappop(self._command_deadlines)
+            pending = self._pending_commands.get(command_id)
+            if pending is None or pending['deadline'] != deadline:
+                continue
+            logger.warning(f"Command {command_id} ({pending['action']}) to device {pending['device_id']} "
+                           f"was not acknowledged in time")
+            expired.append(self.resolve_pending_command(command_id, 'timeout'))
+        return expired
+
+    def pending_command_count(self) -> int:
+        """Number of published commands waiting for an acknowledgement"""
+        return len(self._pending_commands)
 
     async def cleanup_expired_configs(self):
         """
         Remove expired configurations from cache
         """
-        async with self._lock:
-            expired_devices = []
-            now = datetime.utcnow()
+        now = datetime.utcnow()
+        expired_devices = []
 
-            for device_id, config in self.device_configs.items():
-                if now > config['timestamp'] + timedelta(hours=1):  # 1 hour TTL
-                    expired_devices.append(device_id)
+        for device_id, raw in (await self.store.hgetall(CONFIGS_KEY)).items():
+            if now > datetime.fromisoformat(json.loads(raw)['timestamp']) + self.config_ttl:
+                expired_devices.append(device_id)
 
-            for device_id in expired_devices:
-                del self.device_configs[device_id]
-                logger.info(f"Cleaned up expired config for device: {device_id}")
+        if expired_devices:
+            await self.store.hdel(CONFIGS_KEY, *expired_devices)
+            logger.info(f"Cleaned up expired config for {len(expired_devices)} devices")
 
     async def get_device_status(self, device_id: str) -> Dict[str, Any]:
         """
@@ -189,25 +343,24 @@ class DeviceManager:
         Returns:
             Device status information
         """
-        async with self._lock:
-            is_connected = await self.is_device_connected(device_id)
-            config = await self.get_device_config(device_id)
-            last_seen = self.device_last_seen.get(device_id)
-            pending_commands = len(await self.get_pending_commands(device_id))
+        is_connected = await self.is_device_connected(device_id)
+        config = await self.get_device_config(device_id)
+        last_seen = await self.store.hget(LAST_SEEN_KEY, device_id)
+        pending_commands = len(await self.get_pending_commands(device_id))
 
-            status = {
-                "device_id": device_id,
-                "connected": is_connected,
-                "has_config": config is not None,
-                "last_seen": last_seen.isoformat() if last_seen else None,
-                "pending_commands": pending_commands
-            }
+        status = {
+            "device_id": device_id,
+            "connected": is_connected,
+            "has_config": config is not None,
+            "last_seen": last_seen,
+            "pending_commands": pending_commands
+        }
 
-            if config:
-                status["mqtt_client_id"] = config['mqtt_config'].get('client_id')
-                status["firmware_version"] = config.get('firmware_version')
+        if config:
+            status["mqtt_client_id"] = config['mqtt_config'].get('client_id')
+            status["firmware_version"] = config['config'].get('firmware_version')
 
-            return status
+        return status
 
     async def get_all_device_statuses(self) -> Dict[str, Dict[str, Any]]:
         """
@@ -216,17 +369,15 @@ class DeviceManager:
         Returns:
             Dictionary mapping device IDs to their status information
         """
-        async with self._lock:
-            all_connected = await self.get_connected_devices()
-            statuses = {}
+        statuses = {}
 
-            # Add status for connected devices
-            for device_id in all_connected:
-                statuses[device_id] = await self.get_device_status(device_id)
+        # Add status for connected devices
+        for device_id in await self.get_connected_devices():
+            statuses[device_id] = await self.get_device_status(device_id)
 
-            # Add status for devices with cached configs but not connected
-            for device_id in self.device_configs:
-                if device_id not in statuses:
-                    statuses[device_id] = await self.get_device_status(device_id)
+        # Add status for devices with cached configs but not connected
+        for device_id in await self.store.hgetall(CONFIGS_KEY):
+            if device_id not in statuses:
+                statuses[device_id] = await self.get_device_status(device_id)
 
-            return statuses
\ No newline at end of file
+        return statuses
@@ -0,0 +1,108 @@
+"""
+Edge Rules for the Industrial IoT Bridge
+Evaluates the farm automation rules compiled by Odoo against incoming telemetry
+"""
+
+import logging
+import operator
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    '<': operator.lt,
+    '>': operator.gt,
+}
+
+
+class EdgeRuleset:
+    """
+    Service class evaluating automation rules on the telemetry hot path
+
+    Odoo compiles its edge rules into a versioned ruleset. Each rule compares
+    one reading of a telemetry payload (the key named after the rule's sensor
+    type, e.g. "dissolved_oxygen") with a threshold, and carries the command
+    already rendered for its target device, so firing it is a single publish.
+    Rules are indexed by sensor type; a payload costs one dict lookup per
+    indexed sensor type, and nothing at all while the ruleset is empty.
+
+    A rule that fired does not fire again for ``cooldown`` seconds, so a
+    reading that stays past its threshold does not flood the target device.
+    """
+
+    def __init__(self, cooldown: float = 30.0):
+        """
+        Args:
+            cooldown: Minimum time in seconds between two firings of the same rule
+        """
+        self.cooldown = cooldown
+        self.version: Optional[str] = None
+        self._rules: Dict[str, List[Tuple[Callable[[float, float], bool], float, Dict[str, Any]]]] = {}
+        self._last_fired: Dict[Any, float] = {}
+
+    def load(self, version: str, rules: List[Dict[str, Any]]) -> int:
+        """
+        Replace the ruleset
+
+        Args:
+            version: Ruleset version from Odoo
+            rules: Compiled rules with id, sensor_type, operator, threshold, device_id, action, topic and payload
+
+        Returns:
+            Number of rules loaded; invalid rules are skipped
+        """
+        compiled: Dict[str, List[Tuple[Callable[[float, float], bool], float, Dict[str, Any]]]] = {}
+        for rule in rules:
+            try:
+                compare = OPERATORS[rule['operator']]
+                compiled.setdefault(rule['sensor_type'], []).append((compare, float(rule['threshold']), rule))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Ignoring invalid automation rule {rule.get('id')}: {str(e)}")
+
+        rule_ids = {rule['id'] for rules in compiled.values() for _, _, rule in rules}
+        # Keep the cooldown of rules that survive the reload
+        self._last_fired = {rule_id: at for rule_id, at in self._last_fired.items() if rule_id in rule_ids}
+        self._rules = compiled
+        self.version = version
+        return len(rule_ids)
+
+    def evaluate(self, payload: Any, now: Optional[float] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Find the rules fired by a telemetry payload
+
+        Args:
+            payload: Decoded telemetry payload
+            now: Monotonic time used for the cooldown, defaults to the current time
+
+        Returns:
+            (rule, reading) for every rule that fires
+        """
+        if not self._rules or not isinstance(payload, dict):
+            return []
+
+        fired = []
+        for sensor_type, rules in self._rules.items():
+            value = payload.get(sensor_type)
+            if value is None or isinstance(value, bool):
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+
+            for compare, threshold, rule in rules:
+                if not compare(value, threshold):
+                    continue
+                now = time.monotonic() if now is None else now
+                last_fired = self._last_fired.get(rule['id'])
+                if last_fired is not None and now - last_fired < self.cooldown:
+                    continue
+                self._last_fired[rule['id']] = now
+                fired.append((rule, value))
+        return fired
+
+    @property
+    def rule_count(self) -> int:
+        """Number of rules in the ruleset"""
+        return sum(len(rules) for rules in self._rules.values())
@@ -3,13 +3,19 @@ HTTP Service for the Industrial IoT Bridge
 Handles communication with Odoo via HTTP webhooks
 """
 
-import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import random
+import time
+import uuid
+from typing import Dict, Any, List, Optional
 import httpx
 from httpx import TimeoutException, RequestError
 
 from config.settings import settings
+from services.circuit_breaker import CircuitBreaker
+from services.metrics import ODOO_RESPONSE_TIME
+from services import payload_codec
 
 logger = logging.getLogger(__name__)
 
@@ -20,67 +26,188 @@ class HTTPService:
     """
 
     def __init__(self):
-        # Create HTTP client with timeout
+        # Create HTTP client with timeout and a pooled, keep-alive connection set
         self.client = httpx.AsyncClient(
-            timeout=httpx.Timeout(settings.HTTP_REQUEST_TIMEOUT, connect=settings.HTTP_REQUEST_TIMEOUT)
+            timeout=httpx.Timeout(settings.HTTP_REQUEST_TIMEOUT, connect=settings.HTTP_REQUEST_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            ),
+            http2=settings.HTTP_USE_HTTP2
+        )
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=settings.HTTP_CIRCUIT_FAILURE_THRESHOLD,
+            cooldown=settings.HTTP_CIRCUIT_COOLDOWN
         )
 
-    async def get_device_config(self, serial: str, token: str) -> Dict[str, Any]:
+        self.headers = {
+            "Content-Type": "application/json"
+        }
+
+        if settings.ODOO_API_KEY:
+            self.headers["Authorization"] = f"Bearer {settings.ODOO_API_KEY}"
+
+    async def _post(self, endpoint: str, data: Dict[str, Any], description: str,
+                    idempotency_key: Optional[str] = None, idempotent: bool = True) -> Dict[str, Any]:
         """
-        Request device configuration from Odoo
+        Shared request pipeline for all calls to Odoo
+
+        Retries timeouts, connection errors and 5xx responses with exponential
+        backoff and full jitter, and stops calling Odoo altogether while the
+        circuit breaker is open. The same idempotency key is sent on every
+        attempt so that Odoo can discard duplicates of a retried request.
+        Calls Odoo does not deduplicate are made once (idempotent=False).
 
         Args:
-            serial: Device serial number
-            token: Configuration token
+            endpoint: Odoo endpoint path
+            data: JSON body
+            description: Short description of the call for log messages
+            idempotency_key: Key identifying the request across retries, generated if omitted
+            idempotent: Whether repeating the request is harmless; a timed out call may have succeeded
 
         Returns:
-            Configuration response from Odoo
+            Response from Odoo, or {"status": "error", "error": ...} on failure
         """
-        url = f"{settings.ODOO_BASE_URL}{settings.ODOO_CONFIG_ENDPOINT}"
-
-        payload = {
-            "serial": serial,
-            "token": token
-        }
-
-        headers = {
-            "Content-Type": "application/json"
+        url = f"{settings.ODOO_BASE_URL}{endpoint}"
+        # Serialized once for all attempts; raw JSON device payloads are spliced in as they are
+        body = payload_codec.dumps(data)
+        headers = dict(self.headers, **{"Idempotency-Key": idempotency_key or uuid.uuid4().hex})
+        attempts = 1 + max(0, settings.HTTP_RETRY_COUNT) if idempotent else 1
+        error = "Request not attempted"
+
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(self._backoff_delay(attempt))
+
+            if not self.circuit_breaker.allow_request():
+                error = "Circuit open: Odoo temporarily unavailable"
+                break
+
+            started = time.monotonic()
+            try:
+                response = await self.client.post(url, content=body, headers=headers)
+            except TimeoutException:
+                error = "Request timeout"
+            except RequestError as e:
+                error = f"Request error: {str(e)}"
+            except Exception as e:
+                # Unexpected error: retrying the same request would not help
+                self.circuit_breaker.record_failure()
+                logger.error(f"Error while trying to {description}: {str(e)}")
+                return {
+                    "error": str(e),
+                    "status": "error"
+                }
+            else:
+                if response.status_code == 200:
+                    self.circuit_breaker.record_success()
+                    return self._parse_response(response)
+
+                error = f"HTTP {response.status_code}: {response.text}"
+                if response.status_code < 500 and response.status_code != 429:
+                    # Odoo is up but rejected the request: do not retry
+                    self.circuit_breaker.record_success()
+                    break
+            finally:
+                ODOO_RESPONSE_TIME.observe(time.monotonic() - started, operation=description)
+
+            self.circuit_breaker.record_failure()
+            logger.warning(f"Attempt {attempt + 1}/{attempts} to {description} failed: {error}")
+
+        logger.error(f"Failed to {description}: {error}")
+        return {
+            "error": error,
+            "status": "error"
         }
 
-        if settings.ODOO_API_KEY:
-            headers["Authorization"] = f"Bearer {settings.ODOO_API_KEY}"
+    @staticmethod
+    def _backoff_delay(attempt: int) -> float:
+        """Exponential backoff with full jitter for the given retry attempt"""
+        ceiling = min(settings.HTTP_RETRY_MAX_DELAY, settings.HTTP_RETRY_DELAY * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
 
+    @staticmethod
+    def _parse_response(response: httpx.Response) -> Dict[str, Any]:
+        """Decode an Odoo response, unwrapping the JSON-RPC envelope of type='json' routes"""
         try:
-            response = await self.client.post(url, json=payload, headers=headers)
-
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Failed to get device config: {response.status_code} - {response.text}")
-                return {
-                    "error": f"HTTP {response.status_code}: {response.text}",
-                    "status": "error"
-                }
-        except TimeoutException:
-            logger.error("Timeout while getting device config")
+            body = payload_codec.loads(response.content)
+        except ValueError:
             return {
-                "error": "Request timeout",
+                "error": f"Invalid JSON response: {response.text[:200]}",
                 "status": "error"
             }
-        except RequestError as e:
-            logger.error(f"Request error while getting device config: {str(e)}")
+
+        if not isinstance(body, dict):
             return {
-                "error": f"Request error: {str(e)}",
+                "error": "Unexpected response format",
                 "status": "error"
             }
-        except Exception as e:
-            logger.error(f"Error getting device config: {str(e)}")
+        if "result" in body:
+            result = body["result"]
+            return result if isinstance(result, dict) else {"status": "success", "result": result}
+        if isinstance(body.get("error"), dict):
             return {
-                "error": str(e),
+                "error": body["error"].get("data", {}).get("message") or body["error"].get("message", "JSON-RPC error"),
                 "status": "error"
             }
+        return body
+
+    async def get_device_config(self, serial: str, token: str) -> Dict[str, Any]:
+        """
+        Request device configuration from Odoo
+
+        Args:
+            serial: Device serial number
+            token: Configuration token
+
+        Returns:
+            Configuration response from Odoo
+        """
+        payload = {
+            "serial": serial,
+            "token": token
+        }
+        # The configuration token is single use: a retry would be rejected even if the first call succeeded
+        return await self._post(settings.ODOO_CONFIG_ENDPOINT, payload, "get device config", idempotent=False)
+
+    async def get_profile_topics(self) -> Dict[str, Any]:
+        """
+        Request the topic templates of all device profiles from Odoo
+
+        Returns:
+            Response from Odoo with a "profiles" list
+        """
+        return await self._post(settings.ODOO_PROFILE_TOPICS_ENDPOINT, {}, "get profile topics")
+
+    async def get_automation_ruleset(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Request the compiled edge automation rules from Odoo
+
+        Args:
+            version: Version of the ruleset already loaded; Odoo omits the rules if it is current
+
+        Returns:
+            Response from Odoo with "version", "changed" and, if changed, "rules"
+        """
+        return await self._post(settings.ODOO_AUTOMATION_RULESET_ENDPOINT, {"version": version},
+                                "get automation ruleset")
+
+    async def send_automation_triggers(self, triggers: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Report automation rules fired by the bridge to Odoo in one request
+
+        Args:
+            triggers: Fired rules, e.g. {"rule_id": 1, "command_id": "...", "value": 3.5}
+
+        Returns:
+            Response from Odoo
+        """
+        return await self._post(settings.ODOO_AUTOMATION_TRIGGERS_ENDPOINT, {"triggers": triggers},
+                                "send automation triggers")
 
-    async def send_telemetry(self, device_id: str, topic: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    async def send_telemetry(self, device_id: str, topic: str, payload: Dict[str, Any],
+                             message_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Send telemetry data to Odoo
 
@@ -88,53 +215,34 @@ class HTTPService:
             device_id: Device identifier
             topic: MQTT topic where data was received
             payload: Telemetry data
+            message_id: Idempotency key of the message
 
         Returns:
             Response from Odoo
         """
-        url = f"{settings.ODOO_BASE_URL}{settings.ODOO_WEBHOOK_ENDPOINT}/{device_id}"
-
         data = {
             "topic": topic,
             "payload": payload
         }
+        return await self._post(
+            f"{settings.ODOO_WEBHOOK_ENDPOINT}/{device_id}", data, "send telemetry", idempotency_key=message_id
+        )
 
-        headers = {
-            "Content-Type": "application/json"
-        }
-
-        if settings.ODOO_API_KEY:
-            headers["Authorization"] = f"Bearer {settings.ODOO_API_KEY}"
+    async def send_telemetry_batch(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Send a batch of telemetry messages to Odoo in a single request
 
-        try:
-            response = await self.client.post(url, json=data, headers=headers)
+        Args:
+            messages: List of messages with id, device_id, topic and payload.
+                      Message ids double as idempotency keys on the Odoo side.
 
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Failed to send telemetry: {response.status_code} - {response.text}")
-                return {
-                    "error": f"HTTP {response.status_code}: {response.text}",
-                    "status": "error"
-                }
-        except TimeoutException:
-            logger.error("Timeout while sending telemetry")
-            return {
-                "error": "Request timeout",
-                "status": "error"
-            }
-        except RequestError as e:
-            logger.error(f"Request error while sending telemetry: {str(e)}")
-            return {
-                "error": f"Request error: {str(e)}",
-                "status": "error"
-            }
-        except Exception as e:
-            logger.error(f"Error sending telemetry: {str(e)}")
-            return {
-                "error": str(e),
-                "status": "error"
-            }
+        Returns:
+            Response from Odoo with one result per message id
+        """
+        data = {
+            "messages": messages
+        }
+        return await self._post(settings.ODOO_WEBHOOK_BATCH_ENDPOINT, data, "send telemetry batch")
 
     async def send_ota_status(self, device_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -147,49 +255,11 @@ class HTTPService:
         Returns:
             Response from Odoo
         """
-        url = f"{settings.ODOO_BASE_URL}{settings.ODOO_WEBHOOK_ENDPOINT}/{device_id}"
-
         data = {
             "topic": f"ota/{device_id}/status",
             "payload": payload
         }
-
-        headers = {
-            "Content-Type": "application/json"
-        }
-
-        if settings.ODOO_API_KEY:
-            headers["Authorization"] = f"Bearer {settings.ODOO_API_KEY}"
-
-        try:
-            response = await self.client.post(url, json=data, headers=headers)
-
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Failed to send OTA status: {response.status_code} - {response.text}")
-                return {
-                    "error": f"HTTP {response.status_code}: {response.text}",
-                    "status": "error"
-                }
-        except TimeoutException:
-            logger.error("Timeout while sending OTA status")
-            return {
-                "error": "Request timeout",
-                "status": "error"
-            }
-        except RequestError as e:
-            logger.error(f"Request error while sending OTA status: {str(e)}")
-            return {
-                "error": f"Request error: {str(e)}",
-                "status": "error"
-            }
-        except Exception as e:
-            logger.error(f"Error sending OTA status: {str(e)}")
-            return {
-                "error": str(e),
-                "status": "error"
-            }
+        return await self._post(f"{settings.ODOO_WEBHOOK_ENDPOINT}/{device_id}", data, "send OTA status")
 
     async def send_command_to_device(self, device_id: str, action: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -203,50 +273,38 @@ class HTTPService:
         Returns:
             Response from Odoo
         """
-        url = f"{settings.ODOO_BASE_URL}{settings.ODOO_COMMAND_ENDPOINT}/{device_id}"
-
         data = {
             "action": action,
             "params": params or {}
         }
+        # Every call creates and sends a new command: never repeat it
+        return await self._post(f"{settings.ODOO_COMMAND_ENDPOINT}/{device_id}", data, "send command",
+                                idempotent=False)
 
-        headers = {
-            "Content-Type": "application/json"
-        }
+    async def send_command_results(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Report the outcome of device commands to Odoo in one request
 
-        if settings.ODOO_API_KEY:
-            headers["Authorization"] = f"Bearer {settings.ODOO_API_KEY}"
+        Args:
+            results: Command results, e.g. {"command_id": "...", "status": "success", "latency_ms": 120}
 
-        try:
-            response = await self.client.post(url, json=data, headers=headers)
+        Returns:
+            Response from Odoo
+        """
+        return await self._post(settings.ODOO_COMMAND_RESULTS_ENDPOINT, {"results": results}, "send command results")
 
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Failed to send command: {response.status_code} - {response.text}")
-                return {
-                    "error": f"HTTP {response.status_code}: {response.text}",
-                    "status": "error"
-                }
-        except TimeoutException:
-            logger.error("Timeout while sending command")
-            return {
-                "error": "Request timeout",
-                "status": "error"
-            }
-        except RequestError as e:
-            logger.error(f"Request error while sending command: {str(e)}")
-            return {
-                "error": f"Request error: {str(e)}",
-                "status": "error"
-            }
-        except Exception as e:
-            logger.error(f"Error sending command: {str(e)}")
-            return {
-                "error": str(e),
-                "status": "error"
-            }
+    async def send_presence_changes(self, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Report device connection status changes to Odoo in one request
+
+        Args:
+            changes: Presence changes, e.g. {"device_id": "...", "status": "offline", "at": "2024-01-01T00:00:00"}
+
+        Returns:
+            Response from Odoo
+        """
+        return await self._post(settings.ODOO_PRESENCE_ENDPOINT, {"changes": changes}, "send presence changes")
 
     async def close(self):
         """Close the HTTP client"""
-        await self.client.aclose()
\ No newline at end of file
+        await self.client.aclose()
@@ -0,0 +1,305 @@
+"""
+Metrics for the Industrial IoT Bridge
+Counters, gauges and histograms rendered in the Prometheus text exposition format
+"""
+
+import bisect
+import logging
+import math
+import random
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class of a metric family with optional labels"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. messages received"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        """
+        Increment the counter
+
+        Args:
+            amount: Non-negative increment
+            **labels: Label values, one per label name
+        """
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        """Current value for a label set"""
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, either set explicitly or read at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        """Set the gauge for a label set"""
+        self._values[self._key(labels)] = float(value)
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the (unlabelled) gauge from a callable on every scrape"""
+        self._function = function
+
+    def value(self, **labels) -> float:
+        """Current value for a label set"""
+        if self._function and not labels:
+            return float(self._function())
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        if self._function:
+            try:
+                return [f"{self.name} {_format_value(float(self._function()))}"]
+            except Exception as e:
+                logger.error(f"Error collecting gauge {self.name}: {str(e)}")
+                return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, e.g. latencies in seconds"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(bucket for bucket in buckets if bucket != math.inf))
+        # Per label set: [per-bucket counts incl. +Inf, sum]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        """
+        Record an observation
+
+        Args:
+            value: Observed value
+            **labels: Label values, one per label name
+        """
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def count(self, **labels) -> int:
+        """Number of observations for a label set"""
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together on /metrics
+
+    Metrics are updated from the event loop thread only, so no locking is done.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric to the registry and return it"""
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class LogSampler:
+    """
+    Decides whether a per-message log line is emitted
+
+    At thousands of messages per second, logging every message costs more
+    than handling it; only a sample of the messages is logged, and nothing
+    is formatted when the level is disabled.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: float):
+        """
+        Args:
+            logger: Logger the sampled lines go to
+            rate: Fraction of the messages that are logged, between 0 and 1
+        """
+        self.logger = logger
+        self.rate = rate
+
+    def sample(self, level: int = logging.DEBUG) -> bool:
+        """Check whether the current message should be logged at the given level"""
+        if self.rate <= 0 or not self.logger.isEnabledFor(level):
+            return False
+        return self.rate >= 1 or random.random() < self.rate
+
+
+# Bridge metrics
+registry = MetricsRegistry()
+
+MESSAGES_RECEIVED = registry.counter(
+    "iiot_bridge_messages_received_total", "MQTT messages received by the bridge", ["topic_class"]
+)
+MESSAGES_FORWARDED = registry.counter(
+    "iiot_bridge_messages_forwarded_total", "MQTT messages handled and forwarded to Odoo", ["topic_class"]
+)
+MESSAGES_FAILED = registry.counter(
+    "iiot_bridge_messages_failed_total", "MQTT messages that could not be handled or forwarded", ["topic_class"]
+)
+MESSAGES_SPOOLED = registry.counter(
+    "iiot_bridge_messages_spooled_total", "Telemetry messages written to the disk spool"
+)
+MESSAGES_DROPPED = registry.counter(
+    "iiot_bridge_messages_dropped_total", "MQTT messages dropped because the message queue was full"
+)
+QUEUE_DEPTH = registry.gauge(
+    "iiot_bridge_message_queue_depth", "MQTT messages waiting in the message queue"
+)
+INFLIGHT_TASKS = registry.gauge(
+    "iiot_bridge_inflight_tasks", "Message handlers currently running"
+)
+CACHED_DEVICE_CONFIGS = registry.gauge(
+    "iiot_bridge_cached_device_configs", "Device configurations in the device cache"
+)
+SPOOL_DEPTH = registry.gauge(
+    "iiot_bridge_spool_depth", "Telemetry messages waiting in the disk spool"
+)
+FORWARD_LATENCY = registry.histogram(
+    "iiot_bridge_forward_latency_seconds",
+    "Time from MQTT message receipt until the message is handled and acknowledged by Odoo",
+    ["topic_class"]
+)
+ODOO_RESPONSE_TIME = registry.histogram(
+    "iiot_bridge_odoo_response_seconds", "Duration of HTTP requests to Odoo, per attempt", ["operation"]
+)
+PENDING_COMMANDS = registry.gauge(
+    "iiot_bridge_pending_commands", "Published device commands waiting for an acknowledgement"
+)
+COMMAND_ROUND_TRIP = registry.histogram(
+    "iiot_bridge_command_round_trip_seconds",
+    "Time from publishing a device command until the device acknowledges it or it times out",
+    ["status"]
+)
+AUTOMATION_RULES = registry.gauge(
+    "iiot_bridge_automation_rules", "Edge automation rules in the loaded ruleset"
+)
+AUTOMATION_TRIGGERS = registry.counter(
+    "iiot_bridge_automation_triggers_total", "Edge automation rules fired by the bridge", ["sensor_type"]
+)
+TELEMETRY_SUPPRESSED = registry.counter(
+    "iiot_bridge_telemetry_suppressed_total",
+    "Telemetry messages not forwarded to Odoo because of the device profile's filter", ["filter"]
+)
+FILTERED_DEVICES = registry.gauge(
+    "iiot_bridge_telemetry_filter_devices", "Devices whose last forwarded telemetry is kept by the telemetry filter"
+)
+ONLINE_DEVICES = registry.gauge(
+    "iiot_bridge_online_devices", "Devices this replica considers online"
+)
+PRESENCE_CHANGES = registry.counter(
+    "iiot_bridge_presence_changes_total", "Device connection status changes reported to Odoo", ["status"]
+)
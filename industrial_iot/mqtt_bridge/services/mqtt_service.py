@@ -2,13 +2,15 @@
 MQTT Service for the Industrial IoT Bridge
 """
 
+import asyncio
 import json
 import ssl
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 import paho.mqtt.client as mqtt
 
 from config.settings import settings
+from services.metrics import MESSAGES_DROPPED, LogSampler
 
 logger = logging.getLogger(__name__)
 
@@ -18,16 +20,36 @@ class MQTTService:
     Service class for handling MQTT connections and operations
     """
 
-    def __init__(self):
-        self.client = mqtt.Client(client_id=settings.MQTT_CLIENT_ID)
+    def __init__(self, client_id: Optional[str] = None, host: Optional[str] = None,
+                 port: Optional[int] = None, use_tls: Optional[bool] = None,
+                 shared_group: Optional[str] = None):
+        """
+        Args:
+            client_id: MQTT client ID, defaults to MQTT_CLIENT_ID
+            host: Broker host, defaults to MQTT_BROKER_HOST
+            port: Broker port, defaults to MQTT_BROKER_PORT
+            use_tls: Whether to use TLS, defaults to MQTT_USE_TLS
+            shared_group: Shared subscription group, defaults to MQTT_SHARED_SUBSCRIPTION_GROUP
+        """
+        self.host = host or settings.MQTT_BROKER_HOST
+        self.port = port or settings.MQTT_BROKER_PORT
+        self.shared_group = settings.MQTT_SHARED_SUBSCRIPTION_GROUP if shared_group is None else shared_group
+        self.client = mqtt.Client(client_id=client_id or settings.MQTT_CLIENT_ID)
         self.connected = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._overflow: Optional[Callable[[Any], None]] = None
+        self.log_sampler = LogSampler(logger, settings.LOG_SAMPLE_RATE)
+
+        # Let the network thread handle reconnects with a bounded backoff
+        self.client.reconnect_delay_set(min_delay=1, max_delay=settings.MQTT_CONNECT_RETRY_INTERVAL * 12)
 
         # Set up authentication if credentials are provided
         if settings.MQTT_BROKER_USERNAME and settings.MQTT_BROKER_PASSWORD:
             self.client.username_pw_set(settings.MQTT_BROKER_USERNAME, settings.MQTT_BROKER_PASSWORD)
 
         # Configure TLS if required
-        if settings.MQTT_USE_TLS:
+        if settings.MQTT_USE_TLS if use_tls is None else use_tls:
             self.client.tls_set(
                 cert_reqs=ssl.CERT_REQUIRED,
                 tls_version=ssl.PROTOCOL_TLS,
@@ -39,12 +61,12 @@ class MQTTService:
         """Connect to the MQTT broker"""
         try:
             self.client.connect(
-                settings.MQTT_BROKER_HOST,
-                settings.MQTT_BROKER_PORT,
+                self.host,
+                self.port,
                 keepalive=60
             )
             self.connected = True
-            logger.info(f"Connected to MQTT broker at {settings.MQTT_BROKER_HOST}:{settings.MQTT_BROKER_PORT}")
+            logger.info(f"Connected to MQTT broker at {self.host}:{self.port}")
         except Exception as e:
             logger.error(f"Failed to connect to MQTT broker: {str(e)}")
             raise
@@ -90,6 +112,22 @@ class MQTTService:
             logger.error(f"Exception while publishing to {topic}: {str(e)}")
             return False
 
+    def shared_topic(self, topic_filter: str) -> str:
+        """
+        Wrap a topic filter in a shared subscription when a group is configured.
+        The broker then delivers each message to only one member of the group,
+        so several bridge replicas can consume the same topics.
+
+        Args:
+            topic_filter: Plain MQTT topic filter
+
+        Returns:
+            $share/<group>/<filter> or the filter unchanged
+        """
+        if self.shared_group:
+            return f"$share/{self.shared_group}/{topic_filter}"
+        return topic_filter
+
     def subscribe(self, topic: str, qos: int = 1) -> bool:
         """
         Subscribe to an MQTT topic
@@ -113,16 +151,58 @@ class MQTTService:
             logger.error(f"Exception while subscribing to {topic}: {str(e)}")
             return False
 
-    def loop(self):
+    def attach_queue(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue,
+                     overflow: Optional[Callable[[Any], None]] = None):
+        """
+        Hand incoming messages off to an asyncio queue.
+
+        paho callbacks run on the network thread started by start_loop(), so each
+        message is transferred to the event loop with call_soon_threadsafe instead
+        of touching asyncio objects from the network thread.
+
+        Args:
+            loop: Event loop consuming the messages
+            queue: Queue receiving the raw paho messages
+            overflow: Called on the event loop with messages that do not fit in a full queue
+        """
+        self._loop = loop
+        self._queue = queue
+        self._overflow = overflow
+        self.client.on_message = self._on_message
+
+    def _on_message(self, client, userdata, msg):
+        """Forward a message from the network thread to the event loop queue"""
+        try:
+            self._loop.call_soon_threadsafe(self._put_message, msg)
+        except RuntimeError:
+            # Event loop already closed during shutdown
+            logger.debug(f"Dropped message on {msg.topic}: event loop is closed")
+
+    def _put_message(self, msg):
+        """Enqueue a message on the event loop, spilling it when the queue is full"""
+        try:
+            self._queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            if self._overflow:
+                self._overflow(msg)
+            else:
+                MESSAGES_DROPPED.inc()
+                if self.log_sampler.sample(logging.WARNING):
+                    logger.warning(f"Message queue full, dropped message on {msg.topic}")
+
+    def start_loop(self):
         """
-        Process MQTT network traffic.
-        This should be called regularly to handle incoming messages and maintain the connection.
+        Start the dedicated network thread.
+        Socket reads, keep-alives and reconnects are handled by paho without polling from the event loop.
         """
+        self.client.loop_start()
+
+    def stop_loop(self):
+        """Stop the dedicated network thread"""
         try:
-            self.client.loop(timeout=0.01)
+            self.client.loop_stop()
         except Exception as e:
-            logger.error(f"Error in MQTT loop: {str(e)}")
-            self.connected = False
+            logger.error(f"Error stopping MQTT network loop: {str(e)}")
 
     def send_device_command(self, device_id: str, command: Dict[str, Any]) -> bool:
         """
@@ -0,0 +1,148 @@
+"""
+Payload Codec for the Industrial IoT Bridge
+Decodes JSON, CBOR and MessagePack device payloads and encodes request bodies for Odoo
+"""
+
+import json
+import logging
+from typing import Any, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSON = "json"
+CBOR = "cbor"
+MSGPACK = "msgpack"
+ENCODINGS = (JSON, CBOR, MSGPACK)
+# Plain UTF-8 text, for broker messages such as last wills ("offline"); not a device profile encoding
+TEXT = "text"
+
+
+class PayloadDecodeError(ValueError):
+    """Raised when a device payload cannot be decoded with its profile's encoding"""
+
+
+class RawJSON(bytes):
+    """
+    Bytes already known to be a valid JSON document
+
+    dumps() copies them into the encoded body as they are, so a JSON payload
+    received from a device reaches Odoo without being re-serialized.
+    """
+
+
+def loads(data: bytes) -> Any:
+    """Parse JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize an object to JSON bytes, splicing in RawJSON values without re-encoding them
+
+    Args:
+        obj: JSON-serializable object, possibly containing RawJSON values
+
+    Returns:
+        JSON document as bytes
+    """
+    if isinstance(obj, RawJSON):
+        return bytes(obj)
+    if isinstance(obj, dict):
+        nested = [key for key, value in obj.items() if isinstance(value, (dict, list, RawJSON))]
+        if not nested:
+            return _dumps(obj)
+        # Encode the scalar members in one call and append the nested ones
+        parts = [_dumps(str(key)) + b":" + dumps(obj[key]) for key in nested]
+        if len(nested) < len(obj):
+            plain = _dumps({key: value for key, value in obj.items() if key not in nested})
+            parts.insert(0, plain[1:-1])
+        return b"{" + b",".join(parts) + b"}"
+    if isinstance(obj, list):
+        if not any(isinstance(value, (dict, list, RawJSON)) for value in obj):
+            return _dumps(obj)
+        return b"[" + b",".join(dumps(value) for value in obj) + b"]"
+    return _dumps(obj)
+
+
+def _decode_cbor(payload: bytes) -> Any:
+    try:
+        import cbor2
+    except ImportError:
+        raise RuntimeError("The cbor2 package is required for CBOR payloads")
+    return cbor2.loads(payload)
+
+
+def _decode_msgpack(payload: bytes) -> Any:
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("The msgpack package is required for MessagePack payloads")
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+def decode(payload: bytes, encoding: str = JSON) -> Any:
+    """
+    Decode a device payload
+
+    Args:
+        payload: Raw MQTT payload
+        encoding: Payload encoding of the device profile: json, cbor or msgpack, or text
+
+    Returns:
+        Decoded payload
+
+    Raises:
+        PayloadDecodeError: If the payload is not valid for the encoding
+    """
+    try:
+        if encoding == CBOR:
+            return _decode_cbor(payload)
+        if encoding == MSGPACK:
+            return _decode_msgpack(payload)
+        if encoding == TEXT:
+            return bytes(payload).decode("utf-8")
+        return loads(payload)
+    except RuntimeError:
+        raise
+    except Exception as e:
+        raise PayloadDecodeError(f"Invalid {encoding} payload: {str(e)}") from e
+
+
+def decode_message(payload: bytes, encoding: str = JSON) -> Tuple[Any, RawJSON]:
+    """
+    Decode a device payload and get its JSON form for forwarding or spooling
+
+    JSON payloads are passed through unchanged; binary payloads are
+    serialized to JSON once, here, so that forwarding never re-encodes them.
+
+    Args:
+        payload: Raw MQTT payload
+        encoding: Payload encoding of the device profile
+
+    Returns:
+        (decoded payload, payload as a JSON document)
+
+    Raises:
+        PayloadDecodeError: If the payload is not valid for the encoding
+    """
+    decoded = decode(payload, encoding)
+    if encoding not in (CBOR, MSGPACK, TEXT):
+        return decoded, RawJSON(payload)
+    try:
+        return decoded, RawJSON(_dumps(decoded))
+    except (TypeError, ValueError) as e:
+        # e.g. CBOR tags or byte strings without a JSON equivalent
+        raise PayloadDecodeError(f"{encoding} payload cannot be represented as JSON: {str(e)}") from e
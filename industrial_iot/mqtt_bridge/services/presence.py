@@ -0,0 +1,177 @@
+"""
+Presence Tracker for the Industrial IoT Bridge
+Tracks which devices are online from broker events and device traffic
+"""
+
+import logging
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+ONLINE = "online"
+OFFLINE = "offline"
+
+
+class PresenceTracker:
+    """
+    Service class keeping the connection status of devices
+
+    A device comes online when the broker reports its connection, when it
+    publishes its birth message, or simply when it sends any message. It goes
+    offline when the broker publishes its last will or reports the disconnect,
+    or when nothing was heard from it for ``timeout`` seconds.
+
+    Heartbeat deadlines are kept in a timing wheel: one slot per ``resolution``
+    seconds, each holding the devices whose deadline falls in it. Refreshing a
+    device moves it to another slot in O(1), and expiring only visits the slots
+    that elapsed since the previous call, so the cost does not grow with the
+    number of silent-but-alive devices.
+
+    Status changes are coalesced per device until drained, so a device that
+    flaps between two flushes is reported once, with its latest status.
+    """
+
+    def __init__(self, timeout: float = 300.0, resolution: float = 1.0):
+        """
+        Args:
+            timeout: Seconds without any message after which a device is considered offline
+            resolution: Granularity of the timeout wheel in seconds
+        """
+        self.timeout = timeout
+        self.resolution = resolution
+        self._slot_count = int(math.ceil(timeout / resolution)) + 2
+        self._wheel: List[Set[str]] = [set() for _ in range(self._slot_count)]
+        self._last_tick: Optional[int] = None
+
+        self._online: Dict[str, int] = {}  # device_id -> deadline tick
+        self._last_seen: Dict[str, float] = {}  # device_id -> wall clock time, since the last drain
+        self._changes: Dict[str, Dict[str, object]] = {}
+
+    def _tick(self, now: float) -> int:
+        return int(now // self.resolution)
+
+    def seen(self, device_id: str, now: Optional[float] = None, wall_time: Optional[float] = None,
+             report: bool = True, reason: str = "seen") -> bool:
+        """
+        Record a sign of life from a device
+
+        Args:
+            device_id: Device identifier
+            now: Monotonic time of the message, defaults to the current time
+            wall_time: Wall clock time of the message, defaults to the current time
+            report: Whether a resulting change is reported to Odoo
+            reason: Source of the information, e.g. seen for any message or connected
+
+        Returns:
+            True if the device was not known to be online
+        """
+        now = time.monotonic() if now is None else now
+        self._last_seen[device_id] = time.time() if wall_time is None else wall_time
+
+        deadline = self._tick(now + self.timeout) + 1
+        if self._last_tick is not None:
+            # Slots already visited are not visited again until the wheel turns
+            deadline = max(deadline, self._last_tick + 1)
+        previous = self._online.get(device_id)
+        if previous == deadline:
+            return False
+
+        if previous is not None:
+            self._wheel[previous % self._slot_count].discard(device_id)
+        self._wheel[deadline % self._slot_count].add(device_id)
+        self._online[device_id] = deadline
+
+        if previous is None:
+            self._record(device_id, ONLINE, reason, wall_time, report)
+            return True
+        return False
+
+    def offline(self, device_id: str, reason: str, wall_time: Optional[float] = None,
+                report: bool = True) -> bool:
+        """
+        Record that a device disconnected
+
+        Args:
+            device_id: Device identifier
+            reason: Source of the information, e.g. will or disconnected
+            wall_time: Wall clock time of the event, defaults to the current time
+            report: Whether a resulting change is reported to Odoo
+
+        Returns:
+            True if the device was known to be online
+        """
+        deadline = self._online.pop(device_id, None)
+        if deadline is None:
+            if report and device_id not in self._changes:
+                # Unknown to this replica, but Odoo may still show the device online
+                self._record(device_id, OFFLINE, reason, wall_time, report)
+            return False
+
+        self._wheel[deadline % self._slot_count].discard(device_id)
+        self._record(device_id, OFFLINE, reason, wall_time, report)
+        return True
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """
+        Find the devices whose heartbeat deadline passed, without marking them offline
+
+        The caller confirms each candidate, e.g. against the last seen time shared
+        by other replicas, then must call offline() or seen() for it: a device left
+        as is stays online until its next message.
+
+        Args:
+            now: Monotonic time, defaults to the current time
+
+        Returns:
+            Device identifiers whose deadline passed
+        """
+        current = self._tick(time.monotonic() if now is None else now)
+        if self._last_tick is None:
+            self._last_tick = current - 1
+        # A long stall visits every slot once rather than looping over the gap
+        first = max(self._last_tick + 1, current - self._slot_count + 1)
+        self._last_tick = current
+
+        expired = []
+        for tick in range(first, current + 1):
+            slot = self._wheel[tick % self._slot_count]
+            due = [device_id for device_id in slot if self._online[device_id] <= current]
+            expired.extend(due)
+        return expired
+
+    def _record(self, device_id: str, status: str, reason: str, wall_time: Optional[float], report: bool):
+        if report:
+            self._changes[device_id] = {
+                "device_id": device_id,
+                "status": status,
+                "reason": reason,
+                "at": time.time() if wall_time is None else wall_time,
+            }
+
+    def drain_changes(self) -> List[Dict[str, object]]:
+        """Return and forget the status changes recorded since the previous call"""
+        changes, self._changes = list(self._changes.values()), {}
+        return changes
+
+    def restore_changes(self, changes: Iterable[Dict[str, object]]):
+        """Put back changes that could not be reported, unless a newer change was recorded since"""
+        for change in changes:
+            self._changes.setdefault(change["device_id"], change)
+
+    def drain_last_seen(self) -> Dict[str, float]:
+        """Return and forget the last seen times recorded since the previous call"""
+        last_seen, self._last_seen = self._last_seen, {}
+        return last_seen
+
+    def is_online(self, device_id: str) -> bool:
+        return device_id in self._online
+
+    @property
+    def online_count(self) -> int:
+        return len(self._online)
+
+    @property
+    def pending_changes(self) -> int:
+        return len(self._changes)
@@ -0,0 +1,169 @@
+"""
+State Store for the Industrial IoT Bridge
+Pluggable key/value storage for device state shared between bridge replicas
+"""
+
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore(ABC):
+    """
+    Base class for device state storage
+
+    State is organised as named hashes of string fields to string values,
+    which maps directly onto Redis hashes, plus plain expiring keys used as
+    short-lived locks. Values are serialized by the caller. Backends implement
+    the abstract methods; hset_many, hmget and hlen fall back to them.
+    """
+
+    @abstractmethod
+    async def hset(self, name: str, key: str, value: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def hset_many(self, name: str, mapping: Dict[str, str]):
+        for key, value in mapping.items():
+            await self.hset(name, key, value)
+
+    async def hmget(self, name: str, keys: List[str]) -> List[Optional[str]]:
+        return [await self.hget(name, key) for key in keys]
+
+    @abstractmethod
+    async def hdel(self, name: str, *keys: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    async def hlen(self, name: str) -> int:
+        return len(await self.hgetall(name))
+
+    @abstractmethod
+    async def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        """Set a key expiring after ttl seconds unless it is already set; True if this call set it"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemoryStateStore(StateStore):
+    """
+    Process-local state store, used by default and for single-instance deployments
+    """
+
+    def __init__(self):
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._keys: Dict[str, Tuple[str, float]] = {}
+
+    async def hset(self, name: str, key: str, value: str):
+        self._hashes.setdefault(name, {})[key] = value
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        return self._hashes.get(name, {}).get(key)
+
+    async def hset_many(self, name: str, mapping: Dict[str, str]):
+        self._hashes.setdefault(name, {}).update(mapping)
+
+    async def hmget(self, name: str, keys: List[str]) -> List[Optional[str]]:
+        values = self._hashes.get(name, {})
+        return [values.get(key) for key in keys]
+
+    async def hdel(self, name: str, *keys: str):
+        values = self._hashes.get(name, {})
+        for key in keys:
+            values.pop(key, None)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        return dict(self._hashes.get(name, {}))
+
+    async def hlen(self, name: str) -> int:
+        return len(self._hashes.get(name, {}))
+
+    async def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        now = time.monotonic()
+        current = self._keys.get(key)
+        if current is not None and current[1] > now:
+            return False
+        self._keys[key] = (value, now + ttl)
+        return True
+
+
+class RedisStateStore(StateStore):
+    """
+    State store backed by a Redis-compatible server, shared by all bridge replicas
+
+    Requires the optional ``redis`` package (redis>=4.2 for redis.asyncio).
+    """
+
+    def __init__(self, url: str, prefix: str = "iiot_bridge:"):
+        """
+        Args:
+            url: Redis connection URL, e.g. redis://localhost:6379/0
+            prefix: Prefix applied to every hash name and key
+        """
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for a redis:// state store URL")
+
+        self.prefix = prefix
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def hset(self, name: str, key: str, value: str):
+        await self._redis.hset(self.prefix + name, key, value)
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        return await self._redis.hget(self.prefix + name, key)
+
+    async def hset_many(self, name: str, mapping: Dict[str, str]):
+        if mapping:
+            await self._redis.hset(self.prefix + name, mapping=mapping)
+
+    async def hmget(self, name: str, keys: List[str]) -> List[Optional[str]]:
+        if not keys:
+            return []
+        return await self._redis.hmget(self.prefix + name, keys)
+
+    async def hdel(self, name: str, *keys: str):
+        if keys:
+            await self._redis.hdel(self.prefix + name, *keys)
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        return await self._redis.hgetall(self.prefix + name)
+
+    async def hlen(self, name: str) -> int:
+        return await self._redis.hlen(self.prefix + name)
+
+    async def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        return bool(await self._redis.set(self.prefix + key, value, nx=True, px=max(1, int(ttl * 1000))))
+
+    async def close(self):
+        await self._redis.close()
+
+
+def create_state_store(url: str) -> StateStore:
+    """
+    Create the state store matching a URL
+
+    Args:
+        url: memory:// for the in-process store, redis:// or rediss:// for Redis
+
+    Returns:
+        State store instance
+    """
+    if not url or url.startswith("memory://"):
+        return InMemoryStateStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        logger.info("Using Redis state store for device state")
+        return RedisStateStore(url)
+    raise ValueError(f"Unsupported state store URL: {url}")
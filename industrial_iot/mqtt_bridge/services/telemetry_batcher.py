@@ -0,0 +1,119 @@
+"""
+Telemetry Batcher for the Industrial IoT Bridge
+Coalesces telemetry messages into size- and time-bounded micro-batches
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Dict, Any, List, Tuple, Callable, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryBatcher:
+    """
+    Service class for grouping telemetry messages into micro-batches
+
+    A batch is flushed as soon as it holds ``max_size`` messages or when
+    ``max_delay`` seconds have elapsed since its first message, whichever
+    comes first. Every submitted message gets its own result back from Odoo.
+    """
+
+    def __init__(self, send_batch: Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, Any]]],
+                 max_size: int = 500, max_delay: float = 0.2):
+        """
+        Args:
+            send_batch: Coroutine function forwarding a list of messages to Odoo
+            max_size: Maximum number of messages per batch
+            max_delay: Maximum time in seconds a message waits before its batch is flushed
+        """
+        self.send_batch = send_batch
+        self.max_size = max(1, max_size)
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = set()
+
+    async def submit(self, device_id: str, topic: str, payload: Any) -> Dict[str, Any]:
+        """
+        Add a telemetry message to the current batch and wait for its result
+
+        Args:
+            device_id: Device identifier
+            topic: MQTT topic where data was received
+            payload: Telemetry data, or a RawJSON document forwarded as is
+
+        Returns:
+            Per-message result from Odoo, e.g. {"id": "...", "status": "success"}
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        message = {
+            "id": uuid.uuid4().hex,
+            "device_id": device_id,
+            "topic": topic,
+            "payload": payload
+        }
+        self._pending.append((message, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush_pending()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_pending)
+
+        return await future
+
+    def pending_count(self) -> int:
+        """Number of messages waiting for the current batch to be flushed"""
+        return len(self._pending)
+
+    async def flush(self):
+        """Flush the current batch and wait for all in-flight batches to complete"""
+        self._flush_pending()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def _flush_pending(self):
+        """Hand the current batch over to a dispatch task"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._dispatch(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        """Send one batch to Odoo and resolve the per-message futures"""
+        messages = [message for message, _ in batch]
+        try:
+            response = await self.send_batch(messages)
+        except Exception as e:
+            logger.error(f"Error sending telemetry batch: {str(e)}")
+            response = {"error": str(e), "status": "error"}
+
+        results = {
+            result.get("id"): result
+            for result in response.get("results") or []
+            if isinstance(result, dict)
+        }
+        logger.debug(f"Telemetry batch of {len(messages)} messages sent, {len(results)} results received")
+
+        for message, future in batch:
+            if future.done():
+                continue
+            result = results.get(message["id"])
+            if result is None:
+                # The batch never reached Odoo or was rejected as a whole: safe to retry
+                result = {
+                    "id": message["id"],
+                    "status": "error",
+                    "error": response.get("error", "No result returned for message"),
+                    "retryable": True
+                }
+            future.set_result(result)
@@ -0,0 +1,203 @@
+"""
+Telemetry Filter for the Industrial IoT Bridge
+Drops telemetry that does not carry a meaningful change, per device and metric
+"""
+
+import json
+import logging
+import time
+import zlib
+from typing import Any, Dict, NamedTuple, Optional
+
+from services.state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+DEADBAND = "deadband"
+MIN_INTERVAL = "min_interval"
+FILTER_STATES_KEY = "telemetry_filter"
+
+
+class FilterSettings(NamedTuple):
+    """Telemetry filter settings of a device profile"""
+    deadband_type: str = "none"
+    deadband_value: float = 0.0
+    min_interval: float = 0.0
+    max_silence: float = 0.0
+
+    @classmethod
+    def from_profile(cls, profile: Dict[str, Any]) -> Optional["FilterSettings"]:
+        """
+        Read the filter settings returned by Odoo for a device profile
+
+        Returns:
+            Filter settings, or None if the profile does not filter its telemetry
+        """
+        filter_settings = cls(
+            deadband_type=profile.get("deadband_type") or "none",
+            deadband_value=float(profile.get("deadband_value") or 0.0),
+            min_interval=float(profile.get("min_interval") or 0.0),
+            max_silence=float(profile.get("max_silence") or 0.0),
+        )
+        return filter_settings if filter_settings.enabled else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.deadband_type in ("absolute", "percent") or self.min_interval > 0
+
+
+class _DeviceState:
+    """Last forwarded metrics of one device"""
+
+    __slots__ = ("forwarded_at", "values")
+
+    def __init__(self, forwarded_at: float, values: Dict[str, Any]):
+        self.forwarded_at = forwarded_at
+        # Numbers as floats, other values as a hash, so state stays small
+        self.values = values
+
+    def dumps(self) -> str:
+        return json.dumps([self.forwarded_at, self.values])
+
+    @classmethod
+    def loads(cls, data: Optional[str]) -> Optional["_DeviceState"]:
+        if not data:
+            return None
+        forwarded_at, values = json.loads(data)
+        return cls(forwarded_at, values)
+
+
+def _snapshot(payload: Dict[str, Any]) -> Dict[str, Any]:
+    values = {}
+    for metric, value in payload.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[metric] = float(value)
+        else:
+            # A stable hash, so replicas sharing the state compare equal values as equal
+            values[metric] = zlib.crc32(repr(value).encode())
+    return values
+
+
+class TelemetryFilter:
+    """
+    Service class deciding which telemetry messages are worth forwarding to Odoo
+
+    For every device, the filter remembers when its last message was forwarded
+    and the metrics it carried. A new message is:
+
+    - forwarded when ``max_silence`` seconds passed since the last forward, as a heartbeat;
+    - dropped when it arrives within ``min_interval`` seconds of the last forward;
+    - dropped when no numeric metric moved by more than the deadband and no
+      other metric changed, if the profile has a deadband;
+    - forwarded otherwise.
+
+    Messages are forwarded as a whole, so Odoo always receives complete payloads.
+    """
+
+    def __init__(self, max_devices: int = 1000000):
+        """
+        Args:
+            max_devices: Maximum number of devices tracked; the least recently forwarded are forgotten first
+        """
+        self.max_devices = max_devices
+        self._states: Dict[str, _DeviceState] = {}
+
+    def check(self, device_id: str, payload: Any, filter_settings: FilterSettings,
+              now: Optional[float] = None) -> Optional[str]:
+        """
+        Decide whether a telemetry message is forwarded, and remember it if it is
+
+        Args:
+            device_id: Device identifier
+            payload: Decoded telemetry payload
+            filter_settings: Filter settings of the device profile
+            now: Monotonic time of the message, defaults to the current time
+
+        Returns:
+            None if the message must be forwarded, otherwise the filter that suppressed it
+        """
+        if not isinstance(payload, dict):
+            return None
+
+        now = time.monotonic() if now is None else now
+        suppressed_by = self._suppressed_by(self._states.get(device_id), payload, filter_settings, now)
+        if suppressed_by is None:
+            self._remember(device_id, _DeviceState(now, _snapshot(payload)))
+        return suppressed_by
+
+    async def check_shared(self, store: StateStore, device_id: str, payload: Any, filter_settings: FilterSettings,
+                           now: Optional[float] = None) -> Optional[str]:
+        """
+        Decide whether a telemetry message is forwarded, with the device state kept in a shared store
+
+        Used when several replicas receive the messages of the same device, so that
+        each message is compared with the last one forwarded by any replica.
+
+        Args:
+            store: State store shared by the bridge replicas
+            device_id: Device identifier
+            payload: Decoded telemetry payload
+            filter_settings: Filter settings of the device profile
+            now: Wall-clock time of the message, defaults to the current time
+
+        Returns:
+            None if the message must be forwarded, otherwise the filter that suppressed it
+        """
+        if not isinstance(payload, dict):
+            return None
+
+        now = time.time() if now is None else now
+        state = _DeviceState.loads(await store.hget(FILTER_STATES_KEY, device_id))
+        suppressed_by = self._suppressed_by(state, payload, filter_settings, now)
+        if suppressed_by is None:
+            await store.hset(FILTER_STATES_KEY, device_id, _DeviceState(now, _snapshot(payload)).dumps())
+        return suppressed_by
+
+    def _suppressed_by(self, state: Optional[_DeviceState], payload: Dict[str, Any],
+                       filter_settings: FilterSettings, now: float) -> Optional[str]:
+        if state is not None:
+            silence = now - state.forwarded_at
+            if not (filter_settings.max_silence and silence >= filter_settings.max_silence):
+                if silence < filter_settings.min_interval:
+                    return MIN_INTERVAL
+                if filter_settings.deadband_type != "none" and not self._changed(state, payload, filter_settings):
+                    return DEADBAND
+        return None
+
+    @staticmethod
+    def _changed(state: _DeviceState, payload: Dict[str, Any], filter_settings: FilterSettings) -> bool:
+        """Check whether any metric of the payload moved outside the deadband of its last forwarded value"""
+        percent = filter_settings.deadband_type == "percent"
+        deadband = filter_settings.deadband_value
+        for metric, value in payload.items():
+            previous = state.values.get(metric)
+            if previous is None:
+                return True
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if not isinstance(previous, float):
+                    return True
+                limit = abs(previous) * deadband / 100.0 if percent else deadband
+                if abs(value - previous) > limit:
+                    return True
+            elif _snapshot({metric: value})[metric] != previous or isinstance(previous, float):
+                return True
+        return False
+
+    def _remember(self, device_id: str, state: _DeviceState):
+        # Re-insert so that devices stay ordered by last forward
+        self._states.pop(device_id, None)
+        self._states[device_id] = state
+        if len(self._states) > self.max_devices:
+            del self._states[next(iter(self._states))]
+
+    def forget(self, device_id: str):
+        """Drop the state of a device, so that its next message is forwarded"""
+        self._states.pop(device_id, None)
+
+    async def forget_shared(self, store: StateStore, device_id: str):
+        """Drop the shared state of a device, so that its next message is forwarded by any replica"""
+        self._states.pop(device_id, None)
+        await store.hdel(FILTER_STATES_KEY, device_id)
+
+    def __len__(self) -> int:
+        return len(self._states)
@@ -0,0 +1,179 @@
+"""
+Telemetry Spool for the Industrial IoT Bridge
+Durable, append-only on-disk buffer for telemetry that could not be forwarded to Odoo
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetrySpool:
+    """
+    Service class for spooling telemetry to a local SQLite database
+
+    Messages are appended to an in-memory buffer (cheap, safe to call from the
+    event loop) and written to disk in a single transaction by flush(). Rows are
+    read back in insertion order and removed once Odoo has accepted them.
+
+    The connection runs in autocommit mode; writes are grouped in explicit
+    transactions by _transaction().
+    """
+
+    def __init__(self, path: str, max_rows: int = 5000000):
+        """
+        Args:
+            path: Path of the SQLite spool file
+            max_rows: Maximum number of rows kept on disk; newer messages are dropped beyond it
+        """
+        self.path = path
+        self.max_rows = max_rows
+        self.dropped = 0
+        self._buffer: List[Tuple[str, str, str, bytes, float]] = []
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "message_id TEXT NOT NULL, "
+            "device_id TEXT NOT NULL, "
+            "topic TEXT NOT NULL, "
+            "payload BLOB NOT NULL, "
+            "received_at REAL NOT NULL)"
+        )
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+        # Spooled messages per device, so newer telemetry of a device can queue behind them
+        self._devices = Counter(dict(self._conn.execute("SELECT device_id, COUNT(*) FROM spool GROUP BY device_id")))
+        self._oldest = self._conn.execute("SELECT MIN(received_at) FROM spool").fetchone()[0]
+        if self._rows:
+            logger.info(f"Telemetry spool {path} opened with {self._rows} pending messages")
+
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements in one transaction, rolled back on error"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def append(self, device_id: str, topic: str, payload: bytes, received_at: Optional[float] = None,
+               message_id: Optional[str] = None):
+        """
+        Buffer a telemetry message for spooling
+
+        Args:
+            device_id: Device identifier
+            topic: MQTT topic where data was received
+            payload: Raw message payload
+            received_at: Epoch time the message was received, defaults to now
+            message_id: Idempotency key already sent to Odoo for this message, generated if omitted
+        """
+        with self._lock:
+            if self._rows + len(self._buffer) >= self.max_rows:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    logger.error(f"Telemetry spool full ({self.max_rows} rows), {self.dropped} messages dropped")
+                return
+            self._buffer.append((message_id or uuid.uuid4().hex, device_id, topic, payload, received_at or time.time()))
+            self._devices[device_id] += 1
+
+    def flush(self) -> int:
+        """
+        Write buffered messages to disk in a single transaction
+
+        Returns:
+            Number of messages written
+        """
+        with self._lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
+            try:
+                with self._transaction():
+                    self._conn.executemany(
+                        "INSERT INTO spool (message_id, device_id, topic, payload, received_at) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+            except sqlite3.Error:
+                # Nothing was written; keep the messages buffered for the next flush
+                self._buffer = rows
+                raise
+            self._rows += len(rows)
+            if self._oldest is None:
+                self._oldest = min(row[4] for row in rows)
+            return len(rows)
+
+    def read(self, limit: int) -> List[Tuple[int, str, str, str, bytes, float]]:
+        """
+        Read the oldest spooled messages
+
+        Args:
+            limit: Maximum number of rows to return
+
+        Returns:
+            List of (id, message_id, device_id, topic, payload, received_at) in insertion order
+        """
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, message_id, device_id, topic, payload, received_at FROM spool ORDER BY id LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def delete_through(self, last_id: int):
+        """
+        Remove all spooled messages up to and including last_id
+
+        Args:
+            last_id: Highest row id that has been replayed
+        """
+        with self._lock:
+            with self._transaction():
+                replayed = self._conn.execute(
+                    "SELECT device_id, COUNT(*) FROM spool WHERE id <= ? GROUP BY device_id", (last_id,)
+                ).fetchall()
+                deleted = self._conn.execute("DELETE FROM spool WHERE id <= ?", (last_id,)).rowcount
+                oldest = self._conn.execute("SELECT MIN(received_at) FROM spool").fetchone()[0]
+            self._devices.subtract(dict(replayed))
+            self._devices = +self._devices
+            self._rows = max(0, self._rows - deleted)
+            self._oldest = oldest
+
+    def depth(self) -> int:
+        """Number of spooled messages, including those not yet written to disk"""
+        return self._rows + len(self._buffer)
+
+    def holds(self, device_id: str) -> bool:
+        """Whether messages of a device are waiting in the spool, including those not yet written to disk"""
+        return self._devices.get(device_id, 0) > 0
+
+    def replay_lag(self) -> float:
+        """Age in seconds of the oldest spooled message, 0 when the spool is empty"""
+        oldest = self._oldest
+        if oldest is None and self._buffer:
+            oldest = self._buffer[0][4]
+        return max(0.0, time.time() - oldest) if oldest is not None else 0.0
+
+    def close(self):
+        """Flush pending messages and close the database"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,213 @@
+"""
+Topic Router for the Industrial IoT Bridge
+Compiles topic templates into a trie and routes MQTT topics to handlers
+"""
+
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = re.compile(r'^(?P<prefix>[^{}]*)\{(?P<name>\w+)\}(?P<suffix>[^{}]*)$')
+
+
+class _Node:
+    """One topic level of the routing trie"""
+
+    __slots__ = ('literals', 'params', 'single', 'multi', 'route')
+
+    def __init__(self):
+        self.literals: Dict[str, '_Node'] = {}
+        # (prefix, suffix, variable name, child) for levels such as {device} or company_{company}
+        self.params: List[Tuple[str, str, str, '_Node']] = []
+        self.single: Optional['_Node'] = None
+        self.multi: Optional[Tuple[Any, str]] = None
+        self.route: Optional[Tuple[Any, str]] = None
+
+
+class TopicRouter:
+    """
+    Service class routing MQTT topics through a compiled topic trie
+
+    Patterns are topic templates whose levels are either literals,
+    placeholders capturing a variable ("{device}", "company_{company}"),
+    or the MQTT wildcards "+" and "#". A lookup walks the trie one level
+    at a time, so its cost depends on the topic depth and not on the
+    number of registered patterns. Literal levels win over placeholders,
+    which win over wildcards.
+
+    Devices publish on the same few topics over and over, so resolved
+    topics are memoised in a bounded cache that is reset whenever a
+    pattern is added.
+    """
+
+    def __init__(self, cache_size: int = 100000):
+        """
+        Args:
+            cache_size: Maximum number of resolved topics kept in the cache, 0 to disable it
+        """
+        self._root = _Node()
+        self._patterns: List[str] = []
+        self._names: Dict[str, str] = {}
+        self._cache: Dict[str, Optional[Tuple[Any, str, Dict[str, str]]]] = {}
+        self.cache_size = cache_size
+
+    def add_route(self, pattern: str, handler: Any, name: str = '') -> bool:
+        """
+        Register a topic pattern
+
+        Args:
+            pattern: Topic template, e.g. company_{company}/telemetry/{device}/data
+            handler: Object returned when a topic matches the pattern
+            name: Route name returned with the match, e.g. telemetry
+
+        Returns:
+            False if the pattern was already registered, in which case the first route is kept
+        """
+        if pattern in self._patterns:
+            return False
+        self._cache.clear()
+
+        node = self._root
+        levels = pattern.split('/')
+        for index, level in enumerate(levels):
+            if level == '#':
+                if index != len(levels) - 1:
+                    raise ValueError(f"'#' must be the last level of a topic pattern: {pattern}")
+                node.multi = (handler, name)
+                self._patterns.append(pattern)
+                self._names[pattern] = name
+                return True
+
+            if level == '+':
+                node.single = node.single or _Node()
+                node = node.single
+                continue
+
+            placeholder = PLACEHOLDER.match(level)
+            if placeholder:
+                prefix, variable, suffix = placeholder.group('prefix', 'name', 'suffix')
+                for param_prefix, param_suffix, param_name, child in node.params:
+                    if (param_prefix, param_suffix, param_name) == (prefix, suffix, variable):
+                        node = child
+                        break
+                else:
+                    child = _Node()
+                    node.params.append((prefix, suffix, variable, child))
+                    # Longest prefixes first so that company_{company} is tried before {device}
+                    node.params.sort(key=lambda param: len(param[0]) + len(param[1]), reverse=True)
+                    node = child
+                continue
+
+            if '{' in level or '}' in level or '+' in level or '#' in level:
+                raise ValueError(f"Invalid topic pattern level '{level}' in {pattern}")
+
+            node = node.literals.setdefault(level, _Node())
+
+        node.route = (handler, name)
+        self._patterns.append(pattern)
+        self._names[pattern] = name
+        return True
+
+    def match(self, topic: str) -> Optional[Tuple[Any, str, Dict[str, str]]]:
+        """
+        Route a topic
+
+        Args:
+            topic: Concrete MQTT topic
+
+        Returns:
+            (handler, route name, extracted variables) or None if no pattern matches
+        """
+        try:
+            resolved = self._cache[topic]
+        except KeyError:
+            levels = topic.split('/')
+            captured: List[Tuple[str, str]] = []
+            route = self._match(self._root, levels, 0, len(levels), captured)
+            resolved = (route[0], route[1], dict(captured)) if route else None
+            if self.cache_size:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[topic] = resolved
+
+        if resolved is None:
+            return None
+        return resolved[0], resolved[1], resolved[2].copy()
+
+    def _match(self, node: _Node, levels: List[str], index: int, depth: int,
+               captured: List[Tuple[str, str]]) -> Optional[Tuple[Any, str]]:
+        if index == depth:
+            # "#" also matches its parent level, so "a/#" matches "a"
+            return node.route or node.multi
+
+        level = levels[index]
+
+        child = node.literals.get(level)
+        if child is not None:
+            route = self._match(child, levels, index + 1, depth, captured)
+            if route:
+                return route
+
+        for prefix, suffix, name, child in node.params:
+            if len(level) > len(prefix) + len(suffix) and level.startswith(prefix) and level.endswith(suffix):
+                captured.append((name, level[len(prefix):len(level) - len(suffix)]))
+                route = self._match(child, levels, index + 1, depth, captured)
+                if route:
+                    return route
+                captured.pop()
+
+        if node.single is not None:
+            route = self._match(node.single, levels, index + 1, depth, captured)
+            if route:
+                return route
+
+        return node.multi
+
+    def subscriptions(self, names: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        MQTT topic filters covering the registered patterns
+
+        Args:
+            names: Only cover the patterns of these routes, all routes if None
+
+        Returns:
+            Deduplicated filters with placeholders replaced by "+"
+        """
+        names = None if names is None else set(names)
+        filters = []
+        for pattern in self._patterns:
+            if names is not None and self._names[pattern] not in names:
+                continue
+            topic_filter = '/'.join(
+                '+' if PLACEHOLDER.match(level) else level for level in pattern.split('/')
+            )
+            if topic_filter not in filters:
+                filters.append(topic_filter)
+        return filters
+
+    @property
+    def patterns(self) -> List[str]:
+        """Registered topic patterns"""
+        return list(self._patterns)
+
+
+def company_scoped(templates: Iterable[str]) -> List[str]:
+    """
+    Expand topic templates with the company prefix added by IiotDevice.get_topic_map
+
+    Args:
+        templates: Topic templates such as telemetry/{device}/data
+
+    Returns:
+        Both the plain and the company_{company}/ prefixed template for each entry
+    """
+    expanded = []
+    for template in templates:
+        if not template:
+            continue
+        for pattern in (template, f"company_{{company}}/{template}"):
+            if pattern not in expanded:
+                expanded.append(pattern)
+    return expanded
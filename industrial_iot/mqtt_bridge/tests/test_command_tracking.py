@@ -0,0 +1,70 @@
+"""
+Tests for the correlation of device commands with their acknowledgements
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.device_manager import DeviceManager
+
+
+class TestCommandTracking(unittest.IsolatedAsyncioTestCase):
+    """Pending-command table of the device manager"""
+
+    async def asyncSetUp(self):
+        self.manager = DeviceManager()
+
+    async def test_acknowledgement_resolves_command(self):
+        """Test that an acknowledgement resolves the future with the round-trip latency"""
+        future = self.manager.register_pending_command("cmd_1", "device_1", "reboot", timeout=5)
+        self.assertEqual(self.manager.pending_command_count(), 1)
+
+        await asyncio.sleep(0.05)
+        result = self.manager.resolve_pending_command("cmd_1", "success", {"uptime": 0})
+
+        self.assertEqual(result["command_id"], "cmd_1")
+        self.assertEqual(result["device_id"], "device_1")
+        self.assertEqual(result["status"], "success")
+        self.assertGreaterEqual(result["latency_ms"], 50)
+        self.assertEqual(await future, result)
+        self.assertEqual(self.manager.pending_command_count(), 0)
+
+        # Duplicate and unknown acknowledgements are ignored
+        self.assertIsNone(self.manager.resolve_pending_command("cmd_1", "success"))
+        self.assertIsNone(self.manager.resolve_pending_command("cmd_unknown", "success"))
+
+    async def test_deadline_times_out_command(self):
+        """Test that commands past their deadline are resolved with a timeout status"""
+        timed_out = self.manager.register_pending_command("cmd_1", "device_1", "reboot", timeout=0.01)
+        acknowledged = self.manager.register_pending_command("cmd_2", "device_2", "reboot", timeout=0.01)
+        waiting = self.manager.register_pending_command("cmd_3", "device_3", "reboot", timeout=60)
+        self.manager.resolve_pending_command("cmd_2", "success")
+
+        self.assertEqual(self.manager.expire_pending_commands(time.monotonic() - 1), [])
+        expired = self.manager.expire_pending_commands(time.monotonic() + 1)
+
+        self.assertEqual([result["command_id"] for result in expired], ["cmd_1"])
+        self.assertEqual((await timed_out)["status"], "timeout")
+        self.assertEqual((await acknowledged)["status"], "success")
+        self.assertFalse(waiting.done())
+        self.assertEqual(self.manager.pending_command_count(), 1)
+
+    async def test_resent_command_gets_new_deadline(self):
+        """Test that re-sending a command id replaces the deadline of the first attempt"""
+        self.manager.register_pending_command("cmd_1", "device_1", "reboot", timeout=0.01)
+        future = self.manager.register_pending_command("cmd_1", "device_1", "reboot", timeout=60)
+
+        self.assertEqual(self.manager.expire_pending_commands(time.monotonic() + 1), [])
+        self.assertFalse(future.done())
+
+
+if __name__ == '__main__':
+    unittest.main()
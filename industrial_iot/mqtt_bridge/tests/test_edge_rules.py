@@ -0,0 +1,59 @@
+"""
+Tests for the evaluation of farm automation rules inside the bridge
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.edge_rules import EdgeRuleset
+
+
+def rule(rule_id, sensor_type='dissolved_oxygen', operator='<', threshold=4.0):
+    return {
+        "id": rule_id, "sensor_type": sensor_type, "operator": operator, "threshold": threshold,
+        "device_id": "pump01", "action": "power_on", "params": {"state": "on"},
+        "topic": "company_1/c/pump01", "payload": {"a": "power_on"}
+    }
+
+
+class TestEdgeRuleset(unittest.TestCase):
+    """Compiled automation rules evaluated against telemetry payloads"""
+
+    def setUp(self):
+        self.ruleset = EdgeRuleset(cooldown=30)
+        self.ruleset.load("v1", [rule(1), rule(2, 'temperature', '>', 30), rule(3, 'ph', '=', 7)])
+
+    def test_thresholds(self):
+        """Test that rules fire on their sensor reading crossing the threshold"""
+        self.assertEqual(self.ruleset.version, "v1")
+        self.assertEqual(self.ruleset.rule_count, 2)
+
+        fired = self.ruleset.evaluate({"dissolved_oxygen": "3.5", "temperature": 31, "ph": 7}, now=0)
+        self.assertEqual(sorted((r["id"], value) for r, value in fired), [(1, 3.5), (2, 31.0)])
+
+        self.assertEqual(self.ruleset.evaluate({"dissolved_oxygen": 4.0, "temperature": 30}, now=100), [])
+        self.assertEqual(self.ruleset.evaluate({"dissolved_oxygen": "n/a", "temperature": None}, now=200), [])
+        self.assertEqual(self.ruleset.evaluate([3.5], now=300), [])
+
+    def test_cooldown(self):
+        """Test that a rule does not fire again within its cooldown, even across reloads"""
+        self.assertEqual(len(self.ruleset.evaluate({"dissolved_oxygen": 3}, now=0)), 1)
+        self.assertEqual(self.ruleset.evaluate({"dissolved_oxygen": 3}, now=10), [])
+
+        self.ruleset.load("v2", [rule(1, threshold=5.0)])
+        self.assertEqual(self.ruleset.evaluate({"dissolved_oxygen": 3}, now=20), [])
+        self.assertEqual(len(self.ruleset.evaluate({"dissolved_oxygen": 3}, now=31)), 1)
+
+    def test_empty_ruleset(self):
+        """Test that nothing fires before a ruleset is loaded"""
+        self.assertEqual(EdgeRuleset().evaluate({"dissolved_oxygen": 0}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
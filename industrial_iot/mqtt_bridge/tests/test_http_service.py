@@ -0,0 +1,60 @@
+"""
+Tests for the retry policy of the Odoo HTTP client
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from services.http_service import HTTPService
+
+
+class TestHTTPServiceRetries(unittest.IsolatedAsyncioTestCase):
+    """Retries of idempotent and non-idempotent calls to Odoo"""
+
+    async def asyncSetUp(self):
+        self.requests = []
+
+        def handler(request):
+            self.requests.append(request)
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        self.service = HTTPService()
+        await self.service.client.aclose()
+        self.service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = patch.multiple(settings, HTTP_RETRY_COUNT=2, HTTP_RETRY_DELAY=0.0,
+                                 HTTP_CIRCUIT_FAILURE_THRESHOLD=100)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.service.client.aclose()
+
+    async def test_idempotent_call_is_retried(self):
+        """Test that telemetry is retried with the same idempotency key"""
+        response = await self.service.send_telemetry("device_1", "t/device_1", {"v": 1}, message_id="msg_1")
+
+        self.assertEqual(response["status"], "error")
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual({request.headers["Idempotency-Key"] for request in self.requests}, {"msg_1"})
+
+    async def test_non_idempotent_calls_are_not_retried(self):
+        """Test that config downloads and commands are sent once even when they time out"""
+        await self.service.get_device_config("SN1", "token")
+        self.assertEqual(len(self.requests), 1)
+
+        await self.service.send_command_to_device("device_1", "reboot")
+        self.assertEqual(len(self.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
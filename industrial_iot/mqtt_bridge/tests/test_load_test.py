@@ -0,0 +1,41 @@
+"""
+Smoke test of the end-to-end load test harness
+
+Runs a short scenario against the real bridge process, so that regressions
+in throughput or message loss on the forwarding path fail the test suite.
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.load_test import LoadTestOptions, run_load_test
+
+
+class TestLoadTest(unittest.TestCase):
+    """Short load test of the bridge with simulated devices"""
+
+    def test_short_scenario_delivers_every_message(self):
+        """Test that every simulated message reaches the fake Odoo server"""
+        report = asyncio.run(run_load_test(LoadTestOptions(
+            devices=20, rate=20, duration=4, warmup=1, companies=2,
+            bridge_env={"TELEMETRY_BATCH_MAX_DELAY_MS": "50"}
+        )))
+
+        self.assertGreater(report["sent"], 1000)
+        self.assertEqual(report["lost"], 0)
+        self.assertEqual(report["bridge_failed"], 0)
+        self.assertGreater(report["sustained_rate"], 300)
+        self.assertLess(report["latency_p99_ms"], 2000)
+        if report["bridge_rss_peak_mb"] is not None:
+            self.assertGreater(report["bridge_rss_peak_mb"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
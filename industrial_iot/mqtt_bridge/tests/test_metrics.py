@@ -0,0 +1,95 @@
+"""
+Tests for the bridge metrics and their text exposition
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.metrics import LogSampler, MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    """Counters, gauges and histograms rendered in the text exposition format"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_per_label(self):
+        """Test that counters are kept per label set and rendered with HELP and TYPE lines"""
+        received = self.registry.counter("messages_received_total", "Messages received", ["topic_class"])
+        received.inc(topic_class="telemetry")
+        received.inc(2, topic_class="telemetry")
+        received.inc(topic_class="ota_status")
+
+        output = self.registry.render()
+        self.assertIn("# HELP messages_received_total Messages received", output)
+        self.assertIn("# TYPE messages_received_total counter", output)
+        self.assertIn('messages_received_total{topic_class="telemetry"} 3', output)
+        self.assertIn('messages_received_total{topic_class="ota_status"} 1', output)
+
+        with self.assertRaises(ValueError):
+            received.inc(-1, topic_class="telemetry")
+        with self.assertRaises(ValueError):
+            received.inc(device="device_1")
+
+    def test_gauge_function(self):
+        """Test that callable gauges are read at scrape time"""
+        depth = [5]
+        gauge = self.registry.gauge("queue_depth", "Queue depth")
+        gauge.set_function(lambda: depth[0])
+        self.assertIn("queue_depth 5", self.registry.render())
+        depth[0] = 7
+        self.assertIn("queue_depth 7", self.registry.render())
+
+    def test_histogram_buckets(self):
+        """Test that histogram buckets are cumulative and end with +Inf"""
+        latency = self.registry.histogram("latency_seconds", "Latency", ["topic_class"], buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value, topic_class="telemetry")
+
+        output = self.registry.render()
+        self.assertIn('latency_seconds_bucket{topic_class="telemetry",le="0.1"} 2', output)
+        self.assertIn('latency_seconds_bucket{topic_class="telemetry",le="1"} 3', output)
+        self.assertIn('latency_seconds_bucket{topic_class="telemetry",le="+Inf"} 4', output)
+        self.assertIn('latency_seconds_count{topic_class="telemetry"} 4', output)
+        self.assertIn('latency_seconds_sum{topic_class="telemetry"} 3.65', output)
+        self.assertEqual(latency.count(topic_class="telemetry"), 4)
+
+    def test_duplicate_metric(self):
+        """Test that a metric name can only be registered once"""
+        self.registry.counter("messages_total", "Messages")
+        with self.assertRaises(ValueError):
+            self.registry.gauge("messages_total", "Messages")
+
+
+class TestLogSampler(unittest.TestCase):
+    """Sampling of per-message log lines"""
+
+    def test_disabled_level_is_never_sampled(self):
+        """Test that nothing is sampled when the log level is disabled"""
+        test_logger = logging.getLogger("test_log_sampler")
+        test_logger.setLevel(logging.INFO)
+        sampler = LogSampler(test_logger, 1.0)
+        self.assertFalse(sampler.sample(logging.DEBUG))
+        self.assertTrue(sampler.sample(logging.INFO))
+
+    def test_sample_rate(self):
+        """Test that roughly the configured share of messages is sampled"""
+        test_logger = logging.getLogger("test_log_sampler_rate")
+        test_logger.setLevel(logging.DEBUG)
+        sampler = LogSampler(test_logger, 0.1)
+        sampled = sum(sampler.sample() for _ in range(20000))
+        self.assertGreater(sampled, 1500)
+        self.assertLess(sampled, 2500)
+        self.assertFalse(LogSampler(test_logger, 0).sample())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Tests for device payload decoding and the JSON forwarding path
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cbor2
+import msgpack
+
+from services import payload_codec
+from services.payload_codec import PayloadDecodeError, RawJSON
+
+TELEMETRY = {"ts": 1700000000, "temperature": 21.5, "humidity": 40, "status": "ok", "values": [1, 2, 3]}
+
+
+class TestPayloadCodec(unittest.TestCase):
+    """Decoding of JSON, CBOR and MessagePack payloads"""
+
+    def test_decode_encodings(self):
+        """Test that every supported encoding decodes to the same payload"""
+        frames = {
+            payload_codec.JSON: json.dumps(TELEMETRY).encode(),
+            payload_codec.CBOR: cbor2.dumps(TELEMETRY),
+            payload_codec.MSGPACK: msgpack.packb(TELEMETRY),
+        }
+        for encoding, frame in frames.items():
+            payload, raw = payload_codec.decode_message(frame, encoding)
+            self.assertEqual(payload, TELEMETRY, encoding)
+            self.assertEqual(json.loads(raw), TELEMETRY, encoding)
+
+    def test_json_passthrough(self):
+        """Test that JSON payloads are forwarded byte for byte"""
+        frame = b'{"temperature": 21.50, "status":"ok"}'
+        _, raw = payload_codec.decode_message(frame, payload_codec.JSON)
+        self.assertIsInstance(raw, RawJSON)
+        self.assertEqual(bytes(raw), frame)
+
+        body = payload_codec.dumps({"messages": [{"id": "m1", "device_id": "device_1", "payload": raw}]})
+        self.assertIn(frame, body)
+        self.assertEqual(json.loads(body)["messages"][0]["payload"], {"temperature": 21.5, "status": "ok"})
+
+    def test_invalid_payloads(self):
+        """Test that invalid frames raise PayloadDecodeError"""
+        with self.assertRaises(PayloadDecodeError):
+            payload_codec.decode_message(b'{"temperature": ', payload_codec.JSON)
+        with self.assertRaises(PayloadDecodeError):
+            payload_codec.decode_message(b'\xff\xff', payload_codec.CBOR)
+        with self.assertRaises(PayloadDecodeError):
+            # Byte strings have no JSON representation
+            payload_codec.decode_message(cbor2.dumps({"blob": b"\x00\x01"}), payload_codec.CBOR)
+
+    def test_non_string_keys(self):
+        """Test that MessagePack maps with integer keys are forwarded as JSON objects"""
+        payload, raw = payload_codec.decode_message(msgpack.packb({1: 21.5, 2: 40}), payload_codec.MSGPACK)
+        self.assertEqual(payload, {1: 21.5, 2: 40})
+        self.assertEqual(json.loads(raw), {"1": 21.5, "2": 40})
+
+    def test_dumps_matches_json(self):
+        """Test that dumps produces the same document as the standard library"""
+        data = {"messages": [{"id": "m1", "payload": TELEMETRY}, {"id": "m2", "payload": [1, "a", None]}]}
+        self.assertEqual(json.loads(payload_codec.dumps(data)), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Tests for device presence tracking and the heartbeat timeout wheel
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.device_manager import DeviceManager
+from services.presence import PresenceTracker, ONLINE, OFFLINE
+
+
+class TestPresenceTracker(unittest.TestCase):
+    """Connection status transitions and heartbeat timeouts"""
+
+    def setUp(self):
+        self.presence = PresenceTracker(timeout=60, resolution=1)
+
+    def test_transitions_are_coalesced(self):
+        """Test that only status changes are reported, once per device and flush"""
+        self.assertTrue(self.presence.seen("d1", now=0, wall_time=1000))
+        self.assertFalse(self.presence.seen("d1", now=1, wall_time=1001))
+        self.assertTrue(self.presence.seen("d2", now=1, wall_time=1001))
+        self.assertEqual(self.presence.online_count, 2)
+
+        # d2 flaps before the flush: only its latest status is reported
+        self.assertTrue(self.presence.offline("d2", "will", wall_time=1002))
+        self.presence.seen("d2", now=3, wall_time=1003)
+        changes = {change["device_id"]: change for change in self.presence.drain_changes()}
+        self.assertEqual({device_id: change["status"] for device_id, change in changes.items()},
+                         {"d1": ONLINE, "d2": ONLINE})
+        self.assertEqual(changes["d2"]["at"], 1003)
+        self.assertEqual(self.presence.drain_changes(), [])
+
+    def test_heartbeat_timeout(self):
+        """Test that devices silent for longer than the timeout expire, and only those"""
+        self.presence.seen("d1", now=0)
+        self.presence.seen("d2", now=0)
+        self.presence.expire(now=0)
+
+        self.presence.seen("d2", now=30)
+        self.assertEqual(self.presence.expire(now=59), [])
+        self.assertEqual(self.presence.expire(now=62), ["d1"])
+        self.presence.offline("d1", "timeout")
+
+        # Slots already visited are not visited again
+        self.assertEqual(self.presence.expire(now=62), [])
+        self.assertEqual(self.presence.expire(now=95), ["d2"])
+        self.assertFalse(self.presence.is_online("d1"))
+
+    def test_expire_after_stall(self):
+        """Test that a gap longer than the wheel still expires every device once"""
+        self.presence.expire(now=0)
+        for index in range(100):
+            self.presence.seen(f"d{index}", now=index / 10)
+        self.assertEqual(len(self.presence.expire(now=1000)), 100)
+
+    def test_rescheduled_in_the_past(self):
+        """Test that a device refreshed with an old time is still expired later"""
+        self.presence.expire(now=100)
+        self.presence.seen("d1", now=0)
+        self.assertEqual(self.presence.expire(now=101), ["d1"])
+
+    def test_unreported_changes(self):
+        """Test that changes seen by a replica that does not own the device are not reported"""
+        self.presence.seen("d1", now=0, report=False)
+        self.presence.offline("d2", "will", report=True)
+        self.presence.offline("d3", "will", report=False)
+        self.assertEqual([(change["device_id"], change["status"]) for change in self.presence.drain_changes()],
+                         [("d2", OFFLINE)])
+        self.assertTrue(self.presence.is_online("d1"))
+
+    def test_restore_changes(self):
+        """Test that changes put back after a failed flush do not override newer ones"""
+        self.presence.seen("d1", now=0)
+        self.presence.seen("d2", now=0)
+        changes = self.presence.drain_changes()
+        self.presence.offline("d1", "will")
+
+        self.presence.restore_changes(changes)
+        restored = {change["device_id"]: change["status"] for change in self.presence.drain_changes()}
+        self.assertEqual(restored, {"d1": OFFLINE, "d2": ONLINE})
+
+
+class TestPresenceStore(unittest.IsolatedAsyncioTestCase):
+    """Bulk presence updates in the shared state store"""
+
+    async def test_bulk_presence_updates(self):
+        """Test that connections and last seen times are written in bulk"""
+        manager = DeviceManager()
+        await manager.apply_presence_changes([
+            {"device_id": "d1", "status": ONLINE, "at": 1000.0},
+            {"device_id": "d2", "status": ONLINE, "at": 1000.0},
+        ])
+        await manager.apply_presence_changes([{"device_id": "d1", "status": OFFLINE, "at": 1001.0}])
+        self.assertEqual(await manager.count_connected_devices(), 1)
+        self.assertTrue(await manager.is_device_connected("d2"))
+
+        await manager.record_last_seen({"d1": 1000.0, "d2": 2000.0})
+        last_seen = await manager.get_last_seen(["d1", "d2", "d3"])
+        self.assertEqual(sorted(last_seen), ["d1", "d2"])
+        self.assertEqual((last_seen["d2"] - last_seen["d1"]).total_seconds(), 1000.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+"""
+Tests for running several bridge replicas on MQTT shared subscriptions
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import paho.mqtt.client as mqtt
+
+from services.cluster import ClusterMembership
+from services.device_manager import DeviceManager
+from services.mqtt_service import MQTTService
+from services.state_store import InMemoryStateStore
+from tools.embedded_broker import EmbeddedBroker
+
+
+class ReplicaCounter:
+    """Collects the messages received by one replica"""
+
+    def __init__(self):
+        self.topics = []
+        self.lock = threading.Lock()
+
+    def on_message(self, client, userdata, msg):
+        with self.lock:
+            self.topics.append(msg.topic)
+
+
+class TestSharedSubscription(unittest.TestCase):
+    """Several replicas consuming one topic through a $share group"""
+
+    def setUp(self):
+        self.broker = EmbeddedBroker()
+        self.port = self.broker.start()
+        self.services = []
+
+    def tearDown(self):
+        for service in self.services:
+            service.stop_loop()
+            service.disconnect()
+        self.broker.stop()
+
+    def _start_replicas(self, count):
+        counters = []
+        for index in range(count):
+            service = MQTTService(
+                client_id=f"replica_{index}", host='127.0.0.1', port=self.port,
+                use_tls=False, shared_group='bridges'
+            )
+            counter = ReplicaCounter()
+            service.client.on_message = counter.on_message
+            service.connect()
+            service.start_loop()
+            service.subscribe(service.shared_topic('telemetry/+/data'))
+            self.services.append(service)
+            counters.append(counter)
+        self._wait_for(lambda: sum(len(members) for members in self.broker._shared.values()) == count)
+        return counters
+
+    def _publish(self, count, devices=50):
+        publisher = mqtt.Client(client_id='publisher')
+        publisher.connect('127.0.0.1', self.port)
+        publisher.loop_start()
+        for index in range(count):
+            publisher.publish(f"telemetry/device_{index % devices}/data", b'{"value": 1}', qos=1)
+        return publisher
+
+    def _wait_for(self, condition, timeout=15.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition(), "Timed out waiting for condition")
+
+    def test_shared_subscription_delivers_each_message_once(self):
+        """Test that every message reaches exactly one replica of the group"""
+        counters = self._start_replicas(3)
+        publisher = self._publish(3000)
+
+        self._wait_for(lambda: sum(len(c.topics) for c in counters) >= 3000)
+        time.sleep(0.2)
+        publisher.loop_stop()
+
+        self.assertEqual(sum(len(c.topics) for c in counters), 3000)
+        for counter in counters:
+            self.assertGreater(len(counter.topics), 800)
+
+    def test_throughput_scales_with_replicas(self):
+        """Test that adding replicas raises consumption throughput almost linearly"""
+        # Each message costs the replica receiving it a fixed processing time, so
+        # the group drains a burst as fast as its busiest replica: the speedup over
+        # a single replica is the burst size over that replica's share of it
+        messages = 600
+        counters = self._start_replicas(3)
+        publisher = self._publish(messages)
+        self._wait_for(lambda: sum(len(c.topics) for c in counters) >= messages)
+        publisher.loop_stop()
+
+        shares = [len(counter.topics) for counter in counters]
+        self.assertEqual(sum(shares), messages)
+        self.assertGreater(messages / max(shares), 2.0)
+
+
+class TestClusterMembership(unittest.TestCase):
+    """Consistent hashing of devices across replicas sharing a state store"""
+
+    def setUp(self):
+        self.store = InMemoryStateStore()
+        self.replicas = [ClusterMembership(self.store, f"bridge_{index}", ttl=15) for index in range(3)]
+
+    def _heartbeat_all(self):
+        async def heartbeat():
+            for replica in self.replicas:
+                await replica.heartbeat()
+            for replica in self.replicas:
+                await replica.heartbeat()
+        asyncio.run(heartbeat())
+
+    def test_each_device_has_exactly_one_owner(self):
+        """Test that every device is owned by one replica and load is spread"""
+        self._heartbeat_all()
+        devices = [f"device_{index}" for index in range(3000)]
+        owned = [sum(replica.owns(device) for replica in self.replicas) for device in devices]
+        self.assertTrue(all(count == 1 for count in owned))
+
+        for replica in self.replicas:
+            share = sum(replica.owns(device) for device in devices)
+            self.assertGreater(share, 600)
+
+    def test_leaving_replica_only_moves_its_devices(self):
+        """Test that removing a replica keeps the other assignments stable"""
+        self._heartbeat_all()
+        devices = [f"device_{index}" for index in range(3000)]
+        before = {device: self.replicas[0].owner_of(device) for device in devices}
+
+        leaving = self.replicas.pop()
+        asyncio.run(leaving.leave())
+        self._heartbeat_all()
+
+        for device in devices:
+            after = self.replicas[0].owner_of(device)
+            if before[device] != leaving.instance_id:
+                self.assertEqual(after, before[device])
+            else:
+                self.assertNotEqual(after, leaving.instance_id)
+
+    def test_device_state_is_shared(self):
+        """Test that device state written by one replica is visible to another"""
+        async def scenario():
+            first = DeviceManager(self.store)
+            second = DeviceManager(self.store)
+            await first.set_device_config('device_1', {'mqtt': {'client_id': 'device_1'}, 'topics': {}})
+            await first.register_device_connection('device_1')
+            return await second.get_device_status('device_1')
+
+        status = asyncio.run(scenario())
+        self.assertTrue(status['connected'])
+        self.assertTrue(status['has_config'])
+        self.assertEqual(status['mqtt_client_id'], 'device_1')
+
+    def test_set_if_absent(self):
+        """Test that only the first replica claims a key until it expires"""
+        async def scenario():
+            return [
+                await self.store.set_if_absent("rule_cooldown:1", "bridge_0", 60),
+                await self.store.set_if_absent("rule_cooldown:1", "bridge_1", 60),
+                await self.store.set_if_absent("rule_cooldown:2", "bridge_1", 0),
+                await self.store.set_if_absent("rule_cooldown:2", "bridge_2", 60),
+            ]
+
+        self.assertEqual(asyncio.run(scenario()), [True, False, True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
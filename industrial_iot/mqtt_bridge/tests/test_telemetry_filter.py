@@ -0,0 +1,102 @@
+"""
+Tests for the per-profile deadband and downsampling of telemetry
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.state_store import InMemoryStateStore
+from services.telemetry_filter import TelemetryFilter, FilterSettings, DEADBAND, MIN_INTERVAL
+
+
+class TestTelemetryFilter(unittest.TestCase):
+    """Forwarding decisions per device and metric"""
+
+    def setUp(self):
+        self.filter = TelemetryFilter()
+
+    def test_absolute_deadband(self):
+        """Test that only moves larger than the deadband are forwarded"""
+        settings = FilterSettings(deadband_type="absolute", deadband_value=0.5)
+        self.assertIsNone(self.filter.check("d1", {"temperature": 20.0, "status": "ok"}, settings, now=0))
+        self.assertEqual(self.filter.check("d1", {"temperature": 20.4, "status": "ok"}, settings, now=1), DEADBAND)
+        self.assertEqual(self.filter.check("d1", {"temperature": 19.6}, settings, now=2), DEADBAND)
+        # Compared with the last forwarded value, not the last received one
+        self.assertIsNone(self.filter.check("d1", {"temperature": 20.6, "status": "ok"}, settings, now=3))
+        # Other devices have their own state
+        self.assertIsNone(self.filter.check("d2", {"temperature": 20.6}, settings, now=3))
+
+    def test_other_metrics_change(self):
+        """Test that new metrics and changed non-numeric metrics are forwarded"""
+        settings = FilterSettings(deadband_type="absolute", deadband_value=1)
+        self.filter.check("d1", {"temperature": 20, "status": "ok", "values": [1, 2]}, settings, now=0)
+        self.assertIsNone(self.filter.check("d1", {"temperature": 20, "status": "alarm", "values": [1, 2]},
+                                            settings, now=1))
+        self.assertIsNone(self.filter.check("d1", {"temperature": 20, "status": "alarm", "values": [1, 3]},
+                                            settings, now=2))
+        self.assertIsNone(self.filter.check("d1", {"temperature": 20, "humidity": 40}, settings, now=3))
+        self.assertEqual(self.filter.check("d1", {"temperature": 20, "humidity": 40}, settings, now=4), DEADBAND)
+
+    def test_percent_deadband(self):
+        """Test that percent deadbands scale with the last forwarded value"""
+        settings = FilterSettings(deadband_type="percent", deadband_value=10)
+        self.filter.check("d1", {"pressure": 200}, settings, now=0)
+        self.assertEqual(self.filter.check("d1", {"pressure": 219}, settings, now=1), DEADBAND)
+        self.assertIsNone(self.filter.check("d1", {"pressure": 221}, settings, now=2))
+
+        self.filter.check("d1", {"pressure": 0}, settings, now=3)
+        self.assertIsNone(self.filter.check("d1", {"pressure": 0.01}, settings, now=4))
+
+    def test_min_interval_and_max_silence(self):
+        """Test rate limiting and the heartbeat of unchanged telemetry"""
+        settings = FilterSettings(deadband_type="absolute", deadband_value=1, min_interval=10, max_silence=60)
+        self.filter.check("d1", {"temperature": 20}, settings, now=0)
+        self.assertEqual(self.filter.check("d1", {"temperature": 30}, settings, now=5), MIN_INTERVAL)
+        self.assertEqual(self.filter.check("d1", {"temperature": 20}, settings, now=30), DEADBAND)
+        self.assertIsNone(self.filter.check("d1", {"temperature": 20}, settings, now=60))
+        self.assertEqual(self.filter.check("d1", {"temperature": 20}, settings, now=61), MIN_INTERVAL)
+
+    def test_max_devices(self):
+        """Test that the least recently forwarded devices are forgotten first"""
+        telemetry_filter = TelemetryFilter(max_devices=2)
+        settings = FilterSettings(deadband_type="absolute", deadband_value=1)
+        for now, device_id in enumerate(["d1", "d2", "d1", "d3"]):
+            telemetry_filter.check(device_id, {"temperature": now * 10}, settings, now=now)
+        self.assertEqual(len(telemetry_filter), 2)
+        self.assertIsNone(telemetry_filter.check("d2", {"temperature": 10}, settings, now=5))
+
+    def test_settings_from_profile(self):
+        """Test that profiles without filter settings do not filter"""
+        self.assertIsNone(FilterSettings.from_profile({"deadband_type": "none", "max_silence": 300}))
+        self.assertEqual(
+            FilterSettings.from_profile({"deadband_type": "percent", "deadband_value": 2, "min_interval": 5}),
+            FilterSettings("percent", 2.0, 5.0, 0.0)
+        )
+
+    def test_shared_state_across_replicas(self):
+        """Test that replicas sharing a store compare with the message forwarded by any of them"""
+        settings = FilterSettings(deadband_type="absolute", deadband_value=0.5)
+        store = InMemoryStateStore()
+        first, second = TelemetryFilter(), TelemetryFilter()
+
+        async def scenario():
+            return [
+                await first.check_shared(store, "d1", {"temperature": 10.0, "status": "ok"}, settings, now=0),
+                await second.check_shared(store, "d1", {"temperature": 20.0, "status": "ok"}, settings, now=1),
+                # Within the deadband of the value the other replica forwarded
+                await first.check_shared(store, "d1", {"temperature": 20.2, "status": "ok"}, settings, now=2),
+                await first.check_shared(store, "d1", {"temperature": 10.1, "status": "ok"}, settings, now=3),
+            ]
+
+        self.assertEqual(asyncio.run(scenario()), [None, None, DEADBAND, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Tests for the on-disk telemetry spool
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.telemetry_spool import TelemetrySpool
+
+
+class TestTelemetrySpool(unittest.TestCase):
+    """Ordering and per-device tracking of the telemetry spool"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "spool.db")
+        self.spool = TelemetrySpool(self.path)
+
+    def tearDown(self):
+        self.spool.close()
+        self.directory.cleanup()
+
+    def test_replay_in_insertion_order(self):
+        """Test that spooled messages are read back in the order they were appended"""
+        for index in range(3):
+            self.spool.append("device_1", "t/device_1", b'{"v": %d}' % index)
+
+        rows = self.spool.read(10)
+        self.assertEqual([row[4] for row in rows], [b'{"v": 0}', b'{"v": 1}', b'{"v": 2}'])
+
+        self.spool.delete_through(rows[1][0])
+        self.assertEqual([row[4] for row in self.spool.read(10)], [b'{"v": 2}'])
+        self.assertEqual(self.spool.depth(), 1)
+
+    def test_holds_device_until_replayed(self):
+        """Test that a device is held while its messages wait in the spool, buffered or on disk"""
+        self.spool.append("device_1", "t/device_1", b'{"v": 1}')
+        self.assertTrue(self.spool.holds("device_1"))
+        self.assertFalse(self.spool.holds("device_2"))
+
+        self.spool.append("device_2", "t/device_2", b'{"v": 2}')
+        rows = self.spool.read(10)
+        self.spool.delete_through(rows[0][0])
+        self.assertFalse(self.spool.holds("device_1"))
+        self.assertTrue(self.spool.holds("device_2"))
+
+    def test_holds_survives_restart(self):
+        """Test that spooled devices are still held after the spool is reopened"""
+        self.spool.append("device_1", "t/device_1", b'{"v": 1}')
+        self.spool.close()
+
+        self.spool = TelemetrySpool(self.path)
+        self.assertTrue(self.spool.holds("device_1"))
+        self.assertEqual(self.spool.depth(), 1)
+
+    def test_failed_flush_writes_nothing(self):
+        """Test that a flush failing part way leaves no partial batch on disk and keeps it buffered"""
+        self.spool.append("device_1", "t/device_1", b'{"v": 1}')
+        self.spool.append("device_1", "t/device_1", None)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.spool.flush()
+
+        self.assertFalse(self.spool._conn.in_transaction)
+        self.assertEqual(self.spool._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0], 0)
+        self.assertEqual(self.spool.depth(), 2)
+        # Drop the bad message so tearDown can close the spool
+        self.spool._buffer.pop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests for the compiled topic router
+
+Run from the mqtt_bridge directory:
+    python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.topic_router import TopicRouter, company_scoped
+
+
+class TestTopicRouter(unittest.TestCase):
+    """Routing of concrete topics through the topic trie"""
+
+    def setUp(self):
+        self.router = TopicRouter()
+        self.router.add_route('iiot/config/request', 'config', 'config_request')
+        for pattern in company_scoped(['telemetry/{device}/data', 'factory/{device}/metrics']):
+            self.router.add_route(pattern, 'telemetry', 'telemetry')
+        for pattern in company_scoped(['ota/{device}/status']):
+            self.router.add_route(pattern, 'ota', 'ota_status')
+
+    def test_company_prefixed_topics(self):
+        """Test that company-prefixed topics from get_topic_map route with their variables"""
+        handler, name, variables = self.router.match('company_7/telemetry/press_01/data')
+        self.assertEqual((handler, name), ('telemetry', 'telemetry'))
+        self.assertEqual(variables, {'company': '7', 'device': 'press_01'})
+
+        handler, name, variables = self.router.match('company_7/ota/press_01/status')
+        self.assertEqual(name, 'ota_status')
+        self.assertEqual(variables['device'], 'press_01')
+
+    def test_plain_and_profile_topics(self):
+        """Test templates without company prefix and custom profile templates"""
+        self.assertEqual(self.router.match('telemetry/press_01/data')[2], {'device': 'press_01'})
+        self.assertEqual(self.router.match('company_2/factory/cnc_9/metrics')[2], {'company': '2', 'device': 'cnc_9'})
+        self.assertEqual(self.router.match('iiot/config/request')[1], 'config_request')
+
+    def test_no_substring_misrouting(self):
+        """Test that topics merely containing a keyword are not routed"""
+        self.assertIsNone(self.router.match('company_7/telemetry/press_01'))
+        self.assertIsNone(self.router.match('alerts/telemetry_failure/press_01/data'))
+        self.assertIsNone(self.router.match('company_7/ota/press_01/status/extra'))
+        self.assertIsNone(self.router.match('company_/telemetry/press_01/data'))
+
+    def test_wildcards(self):
+        """Test that + and # wildcards match with lower priority than literals"""
+        self.router.add_route('ota/+/status', 'any_ota', 'wildcard')
+        self.router.add_route('$SYS/#', 'sys', 'sys')
+        self.assertEqual(self.router.match('ota/press_01/status')[0], 'ota')
+        self.assertEqual(self.router.match('$SYS/broker/clients/connected')[0], 'sys')
+        self.assertEqual(self.router.match('$SYS')[0], 'sys')
+
+        router = TopicRouter()
+        router.add_route('ota/+/status', 'any_ota', 'wildcard')
+        self.assertEqual(router.match('ota/press_01/status')[0], 'any_ota')
+        with self.assertRaises(ValueError):
+            router.add_route('ota/#/status', 'invalid')
+
+    def test_subscriptions(self):
+        """Test that placeholders turn into + in the subscription filters"""
+        subscriptions = self.router.subscriptions()
+        self.assertIn('+/telemetry/+/data', subscriptions)
+        self.assertIn('telemetry/+/data', subscriptions)
+        self.assertIn('iiot/config/request', subscriptions)
+        self.assertEqual(len(subscriptions), len(set(subscriptions)))
+
+        self.assertEqual(self.router.subscriptions(['ota_status']), ['ota/+/status', '+/ota/+/status'])
+
+
+if __name__ == '__main__':
+    unittest.main()
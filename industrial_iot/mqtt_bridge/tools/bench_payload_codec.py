@@ -0,0 +1,99 @@
+"""
+Benchmark of device payload encodings in the Industrial IoT Bridge
+
+For 10k telemetry messages, reports the bytes on the wire per encoding
+(JSON, CBOR, MessagePack), the CPU time to decode them, and the CPU time
+of the forwarding path: the previous json.loads + json.dumps round trip
+versus the codec path that passes JSON payloads through as they are.
+
+Run from the mqtt_bridge directory:
+    python -m tools.bench_payload_codec [--messages 10000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cbor2
+import msgpack
+
+from services import payload_codec
+
+
+def build_payloads(count: int):
+    """Typical field-device telemetry: a timestamp, a few readings and a status"""
+    rng = random.Random(42)
+    return [
+        {
+            "ts": 1700000000 + index,
+            "temperature": round(rng.uniform(-10, 40), 2),
+            "humidity": round(rng.uniform(10, 90), 1),
+            "soil_moisture": round(rng.uniform(0, 1), 3),
+            "battery": rng.randint(0, 100),
+            "status": rng.choice(["ok", "warning", "error"]),
+            "values": [rng.randint(0, 1023) for _ in range(4)],
+        }
+        for index in range(count)
+    ]
+
+
+def cpu_time(function) -> float:
+    """Best process CPU time of three runs"""
+    best = None
+    for _ in range(3):
+        start = time.process_time()
+        function()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=10000)
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.messages)
+    frames = {
+        payload_codec.JSON: [json.dumps(payload).encode() for payload in payloads],
+        payload_codec.CBOR: [cbor2.dumps(payload) for payload in payloads],
+        payload_codec.MSGPACK: [msgpack.packb(payload) for payload in payloads],
+    }
+
+    print(f"{args.messages} telemetry messages")
+    print(f"{'encoding':<10} {'bytes on wire':>14} {'bytes/msg':>10} {'decode CPU ms':>14}")
+    for encoding, encoded in frames.items():
+        size = sum(len(frame) for frame in encoded)
+        decode = cpu_time(lambda: [payload_codec.decode(frame, encoding) for frame in encoded])
+        print(f"{encoding:<10} {size:>14} {size / len(encoded):>10.1f} {decode * 1000:>14.1f}")
+
+    json_frames = frames[payload_codec.JSON]
+
+    def stdlib_forward():
+        messages = [{"id": str(index), "device_id": "device_1", "topic": "telemetry/device_1/data",
+                     "payload": json.loads(frame.decode())} for index, frame in enumerate(json_frames)]
+        json.dumps({"messages": messages}).encode()
+
+    def codec_forward(encoding):
+        def forward():
+            messages = [{"id": str(index), "device_id": "device_1", "topic": "telemetry/device_1/data",
+                         "payload": payload_codec.decode_message(frame, encoding)[1]}
+                        for index, frame in enumerate(frames[encoding])]
+            payload_codec.dumps({"messages": messages})
+        return forward
+
+    print()
+    print(f"{'forwarding path (decode + request body)':<42} {'CPU ms':>8}")
+    print(f"{'json.loads + json.dumps (previous)':<42} {cpu_time(stdlib_forward) * 1000:>8.1f}")
+    for encoding in frames:
+        label = f"codec, {encoding}" + (" passthrough" if encoding == payload_codec.JSON else "")
+        print(f"{label:<42} {cpu_time(codec_forward(encoding)) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Contention Benchmark of the Odoo Telemetry Webhook
+
+Runs N parallel webhook workers (50 by default) against a running Odoo,
+each posting telemetry to /iiot/webhook/<device> as the bridge does, spread
+over a small number of devices so that many requests hit the same device
+rows at once. Before heartbeats were buffered, every request updated its
+device row and concurrent requests of a device queued on the row lock.
+
+Reported: requests per second, latency (p50/p95/p99/max) and failed
+requests, overall and for the hottest device.
+
+The devices must exist in Odoo, e.g. bench_device_0 .. bench_device_4.
+Run the Odoo server with enough workers (--workers) to serve the requests
+in parallel, then from the mqtt_bridge directory:
+    python -m tools.bench_webhook_contention --url http://localhost:8069 --workers 50 --devices 5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from services import payload_codec
+from services.http_service import HTTPService
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_worker(client: httpx.AsyncClient, url: str, device_ids: List[str], deadline: float,
+                     latencies: Dict[str, List[float]], failures: Dict[str, int], seed: int):
+    """Post telemetry of random devices until the deadline, one request at a time"""
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        device_id = rng.choice(device_ids)
+        body = payload_codec.dumps({
+            "topic": f"telemetry/{device_id}/data",
+            "payload": {"temperature": round(rng.uniform(-10, 40), 2), "battery": rng.randint(0, 100)},
+        })
+        headers = {"Content-Type": "application/json", "Idempotency-Key": uuid.uuid4().hex}
+        started = time.monotonic()
+        try:
+            response = await client.post(f"{url}/iiot/webhook/{device_id}", content=body, headers=headers)
+            ok = response.status_code == 200 and HTTPService._parse_response(response).get("status") != "error"
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            latencies[device_id].append(time.monotonic() - started)
+        else:
+            failures[device_id] += 1
+
+
+def report(label: str, latencies: List[float], failed: int, duration: float):
+    if not latencies:
+        print(f"{label:<16} no successful request, {failed} failed")
+        return
+    print(f"{label:<16} {len(latencies) / duration:>8.1f} req/s"
+          f"  p50 {percentile(latencies, 0.50) * 1000:>7.1f} ms"
+          f"  p95 {percentile(latencies, 0.95) * 1000:>7.1f} ms"
+          f"  p99 {percentile(latencies, 0.99) * 1000:>7.1f} ms"
+          f"  max {max(latencies) * 1000:>7.1f} ms"
+          f"  mean {statistics.mean(latencies) * 1000:>7.1f} ms"
+          f"  {failed} failed")
+
+
+async def main_async(args):
+    device_ids = [f"{args.device_prefix}{index}" for index in range(args.devices)]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    failures: Dict[str, int] = defaultdict(int)
+    limits = httpx.Limits(max_connections=args.workers, max_keepalive_connections=args.workers)
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            run_worker(client, args.url, device_ids, deadline, latencies, failures, seed)
+            for seed in range(args.workers)
+        ))
+        duration = time.monotonic() - started
+
+    print(f"{args.workers} workers, {args.devices} devices, {duration:.1f} s")
+    report("all devices", [value for values in latencies.values() for value in values],
+           sum(failures.values()), duration)
+    if latencies:
+        hottest = max(latencies, key=lambda device_id: len(latencies[device_id]))
+        report(hottest, latencies[hottest], failures[hottest], duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8069", help="Odoo base URL")
+    parser.add_argument("--workers", type=int, default=50, help="Parallel webhook workers")
+    parser.add_argument("--devices", type=int, default=5, help="Number of devices the workers share")
+    parser.add_argument("--device-prefix", default="bench_device_")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Request timeout in seconds")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Embedded MQTT Broker stand-in for the Industrial IoT Bridge
+Minimal in-process MQTT 3.1.1 broker used by the bridge tests and load tests
+
+Supported: CONNECT/CONNACK, SUBSCRIBE/UNSUBSCRIBE with + and # wildcards,
+$share/<group>/<filter> shared subscriptions (round-robin per group),
+PUBLISH at QoS 0/1/2 from clients, PINGREQ, DISCONNECT and last-will
+messages on unclean disconnects. Messages are always delivered at QoS 0
+and nothing is retained or persisted.
+"""
+
+import asyncio
+import itertools
+import logging
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HIGH_WATER_MARK = 1024 * 1024
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """Check an MQTT topic against a filter with + and # wildcards"""
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for index, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def _encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def _encode_string(value: bytes) -> bytes:
+    return struct.pack('!H', len(value)) + value
+
+
+def _decode_string(data: bytes, offset: int) -> Tuple[bytes, int]:
+    length = struct.unpack_from('!H', data, offset)[0]
+    start = offset + 2
+    return data[start:start + length], start + length
+
+
+def connect_packet(client_id: str, keepalive: int = 0) -> bytes:
+    """MQTT 3.1.1 CONNECT packet with a clean session, for lightweight test clients"""
+    body = _encode_string(b'MQTT') + b'\x04\x02' + struct.pack('!H', keepalive) + _encode_string(client_id.encode())
+    return b'\x10' + _encode_length(len(body)) + body
+
+
+def publish_packet(topic: str, payload: bytes) -> bytes:
+    """MQTT PUBLISH packet at QoS 0"""
+    body = _encode_string(topic.encode()) + payload
+    return b'\x30' + _encode_length(len(body)) + body
+
+
+class _Session:
+    """Connection state of one client"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.client_id = ''
+        self.will: Optional[Tuple[str, bytes]] = None
+
+    async def send(self, packet: bytes):
+        self.writer.write(packet)
+        if self.writer.transport.get_write_buffer_size() > HIGH_WATER_MARK:
+            await self.writer.drain()
+
+
+class EmbeddedBroker:
+    """
+    In-process MQTT broker running on its own thread and event loop
+
+    Usage:
+        broker = EmbeddedBroker()
+        port = broker.start()
+        ...
+        broker.stop()
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.published = 0
+        self.delivered = 0
+        self._subscriptions: Dict[str, List[_Session]] = {}
+        self._shared: Dict[Tuple[str, str], List[_Session]] = {}
+        self._round_robin: Dict[Tuple[str, str], itertools.count] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def start(self) -> int:
+        """Start the broker thread and return the listening port"""
+        self._thread = threading.Thread(target=self._run, name='embedded-mqtt-broker', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.port
+
+    def stop(self):
+        """Stop the broker and close all client connections"""
+        if self._loop and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def subscription_count(self) -> int:
+        """Number of active subscriptions, shared subscription members included"""
+        return sum(len(members) for members in list(self._subscriptions.values()) + list(self._shared.values()))
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle_client, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        header = (await reader.readexactly(1))[0]
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        body = await reader.readexactly(length) if length else b''
+        return header, body
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = _Session(writer)
+        clean = False
+        try:
+            while True:
+                header, body = await self._read_packet(reader)
+                packet_type = header >> 4
+
+                if packet_type == 1:  # CONNECT
+                    self._parse_connect(session, body)
+                    await session.send(b'\x20\x02\x00\x00')
+                elif packet_type == 3:  # PUBLISH
+                    await self._handle_publish(session, header, body)
+                elif packet_type == 6:  # PUBREL
+                    await session.send(b'\x70\x02' + body[:2])
+                elif packet_type == 8:  # SUBSCRIBE
+                    await self._handle_subscribe(session, body)
+                elif packet_type == 10:  # UNSUBSCRIBE
+                    self._handle_unsubscribe(session, body)
+                    await session.send(b'\xb0\x02' + body[:2])
+                elif packet_type == 12:  # PINGREQ
+                    await session.send(b'\xd0\x00')
+                elif packet_type == 14:  # DISCONNECT
+                    clean = True
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._remove_session(session)
+            if not clean and session.will:
+                await self.publish(*session.will)
+            writer.close()
+
+    def _parse_connect(self, session: _Session, body: bytes):
+        _, offset = _decode_string(body, 0)
+        flags = body[offset + 1]
+        offset += 4  # protocol level, flags, keep-alive
+        client_id, offset = _decode_string(body, offset)
+        session.client_id = client_id.decode()
+        if flags & 0x04:
+            will_topic, offset = _decode_string(body, offset)
+            will_message, offset = _decode_string(body, offset)
+            session.will = (will_topic.decode(), will_message)
+
+    async def _handle_publish(self, session: _Session, header: int, body: bytes):
+        qos = (header >> 1) & 0x03
+        topic, offset = _decode_string(body, 0)
+        packet_id = b''
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+        await self.publish(topic.decode(), body[offset:])
+        if qos == 1:
+            await session.send(b'\x40\x02' + packet_id)
+        elif qos == 2:
+            await session.send(b'\x50\x02' + packet_id)
+
+    async def _handle_subscribe(self, session: _Session, body: bytes):
+        packet_id, offset = body[:2], 2
+        granted = bytearray()
+        while offset < len(body):
+            topic_filter, offset = _decode_string(body, offset)
+            qos = body[offset]
+            offset += 1
+            self._add_subscription(session, topic_filter.decode())
+            granted.append(min(qos, 1))
+        await session.send(b'\x90' + _encode_length(2 + len(granted)) + packet_id + bytes(granted))
+
+    def _handle_unsubscribe(self, session: _Session, body: bytes):
+        offset = 2
+        while offset < len(body):
+            topic_filter, offset = _decode_string(body, offset)
+            self._remove_subscription(session, topic_filter.decode())
+
+    def _add_subscription(self, session: _Session, topic_filter: str):
+        if topic_filter.startswith('$share/'):
+            _, group, shared_filter = topic_filter.split('/', 2)
+            key = (group, shared_filter)
+            members = self._shared.setdefault(key, [])
+            if session not in members:
+                members.append(session)
+            self._round_robin.setdefault(key, itertools.count())
+        else:
+            subscribers = self._subscriptions.setdefault(topic_filter, [])
+            if session not in subscribers:
+                subscribers.append(session)
+
+    def _remove_subscription(self, session: _Session, topic_filter: str):
+        if topic_filter.startswith('$share/'):
+            _, group, shared_filter = topic_filter.split('/', 2)
+            members = self._shared.get((group, shared_filter), [])
+        else:
+            members = self._subscriptions.get(topic_filter, [])
+        if session in members:
+            members.remove(session)
+
+    def _remove_session(self, session: _Session):
+        for members in list(self._subscriptions.values()) + list(self._shared.values()):
+            if session in members:
+                members.remove(session)
+
+    async def publish(self, topic: str, payload: bytes):
+        """Deliver a message to all matching subscribers (broker-side publish)"""
+        self.published += 1
+        encoded_topic = topic.encode()
+        packet_body = _encode_string(encoded_topic) + payload
+        packet = b'\x30' + _encode_length(len(packet_body)) + packet_body
+
+        recipients = []
+        for topic_filter, subscribers in self._subscriptions.items():
+            if subscribers and topic_matches(topic_filter, topic):
+                recipients.extend(subscribers)
+        for (group, topic_filter), members in self._shared.items():
+            if members and topic_matches(topic_filter, topic):
+                index = next(self._round_robin[(group, topic_filter)])
+                recipients.append(members[index % len(members)])
+
+        # A client subscribed through overlapping filters still gets one copy
+        for session in dict.fromkeys(recipients):
+            self.delivered += 1
+            await session.send(packet)
@@ -0,0 +1,426 @@
+"""
+End-to-end Load Test for the Industrial IoT Bridge
+
+Starts the embedded MQTT broker and a fake Odoo webhook server in this
+process, runs the bridge (main.py) as a subprocess against them, and lets
+N simulated devices publish telemetry on the topics IiotDevice.get_topic_map
+gives them (company_<id>/telemetry/<device>/data). Everything runs on
+127.0.0.1, so the test works offline.
+
+Reported: offered and sustained messages per second, end-to-end latency
+from device publish to Odoo receipt (p50/p99/max), lost messages, bridge RSS
+and the bridge's own failure counters. Thresholds make the process exit
+non-zero, so the tool can gate CI.
+
+Run from the mqtt_bridge directory:
+    python -m tools.load_test --devices 500 --rate 2 --duration 30
+    python -m tools.load_test --devices 50 --rate 10 --duration 10 --min-rate 450 --max-p99-ms 1000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+BRIDGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BRIDGE_DIR)
+
+from tools.embedded_broker import EmbeddedBroker, connect_packet, publish_packet
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_TEMPLATE = "company_{company}/telemetry/{device}/data"
+
+
+@dataclass
+class LoadTestOptions:
+    """Load test scenario"""
+    devices: int = 100
+    rate: float = 1.0  # messages per second per device
+    payload_size: int = 128  # approximate JSON payload size in bytes
+    duration: float = 10.0  # seconds of publishing
+    warmup: float = 2.0  # seconds excluded from the sustained rate and latency figures
+    companies: int = 1
+    odoo_latency_ms: float = 0.0  # simulated Odoo processing time per request
+    drain_timeout: float = 15.0
+    bridge_env: Dict[str, str] = field(default_factory=dict)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], percent: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process, read from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class FakeOdoo:
+    """
+    Minimal HTTP/1.1 server answering the bridge's Odoo webhooks
+
+    Accepts every telemetry message and records the end-to-end latency from
+    the "sent_at" timestamp the simulated device put in the payload.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: Seconds every request is delayed, standing in for Odoo processing time
+        """
+        self.latency = latency
+        self.port = 0
+        self.received = 0
+        self.requests = 0
+        self.latencies: List[tuple] = []  # (receipt time, latency in seconds)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle_client, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                path = request_line.decode().split(" ")[1]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                result = await self._route(path, json.loads(body) if body else {})
+                response = json.dumps({"jsonrpc": "2.0", "id": None, "result": result}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: %d\r\n\r\n" % len(response) + response
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if path.endswith("/profiles/topics"):
+            return {"status": "success", "profiles": []}
+        if path.endswith("/webhook_batch"):
+            messages = data.get("messages") or []
+            for message in messages:
+                self._record(message.get("payload"))
+            return {"status": "success", "results": [
+                {"id": message.get("id"), "status": "success"} for message in messages
+            ]}
+        if "/webhook/" in path:
+            self._record(data.get("payload"))
+            return {"status": "success"}
+        return {"status": "error", "error": f"Unsupported endpoint {path}"}
+
+    def _record(self, payload: Any):
+        now = time.time()
+        self.received += 1
+        if isinstance(payload, dict) and "sent_at" in payload:
+            self.latencies.append((now, now - payload["sent_at"]))
+
+
+class SimulatedDevice:
+    """Device publishing telemetry at a fixed rate over its own MQTT connection"""
+
+    def __init__(self, device_id: str, company: int, rate: float, payload_size: int):
+        self.device_id = device_id
+        self.topic = TELEMETRY_TEMPLATE.format(company=company, device=device_id)
+        self.interval = 1.0 / rate
+        self.padding = "x" * max(0, payload_size - 90)
+        self.sent = 0
+
+    async def run(self, port: int, stop_at: float):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(connect_packet(self.device_id))
+        await reader.readexactly(4)  # CONNACK
+
+        # Spread the devices over the first interval so they do not publish in lockstep
+        next_at = time.monotonic() + random.uniform(0, self.interval)
+        try:
+            while True:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if time.time() >= stop_at:
+                    break
+                payload = json.dumps({
+                    "sent_at": time.time(),
+                    "seq": self.sent,
+                    "temperature": round(random.uniform(15, 30), 2),
+                    "humidity": round(random.uniform(30, 70), 1),
+                    "pad": self.padding,
+                }).encode()
+                writer.write(publish_packet(self.topic, payload))
+                self.sent += 1
+                if writer.transport.get_write_buffer_size() > 65536:
+                    await writer.drain()
+                next_at += self.interval
+        finally:
+            writer.write(b"\xe0\x00")  # DISCONNECT
+            await writer.drain()
+            writer.close()
+
+
+class BridgeProcess:
+    """The bridge under test, running main.py in a subprocess"""
+
+    def __init__(self, broker_port: int, odoo_port: int, workdir: str, extra_env: Dict[str, str]):
+        self.http_port = _free_port()
+        self.log_path = os.path.join(workdir, "bridge.log")
+        self.env = dict(os.environ)
+        self.env.update({
+            "MQTT_BROKER_HOST": "127.0.0.1",
+            "MQTT_BROKER_PORT": str(broker_port),
+            "MQTT_USE_TLS": "false",
+            "MQTT_CLIENT_ID": f"load_test_bridge_{os.getpid()}",
+            "ODOO_BASE_URL": f"http://127.0.0.1:{odoo_port}",
+            "HTTP_USE_HTTP2": "false",
+            "HOST": "127.0.0.1",
+            "PORT": str(self.http_port),
+            "SPOOL_PATH": os.path.join(workdir, "spool", "telemetry.db"),
+        })
+        self.env.update(extra_env)
+        self.process: Optional[subprocess.Popen] = None
+        self.peak_rss = 0
+
+    def start(self):
+        self._log = open(self.log_path, "wb")
+        self.process = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=BRIDGE_DIR, env=self.env,
+            stdout=self._log, stderr=subprocess.STDOUT
+        )
+
+    def sample_rss(self) -> Optional[int]:
+        rss = _rss_bytes(self.process.pid) if self.process else None
+        if rss:
+            self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    def running(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    async def metrics(self) -> Dict[str, float]:
+        """Scrape the bridge's /metrics endpoint and sum the samples per metric"""
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.http_port)
+            writer.write(b"GET /metrics HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n")
+            response = (await asyncio.wait_for(reader.read(), timeout=5)).decode()
+            writer.close()
+        except (OSError, asyncio.TimeoutError):
+            return {}
+
+        totals: Dict[str, float] = {}
+        for line in response.split("\r\n\r\n", 1)[-1].splitlines():
+            match = re.match(r"^([a-z_]+)(?:\{[^}]*\})? ([0-9.e+-]+)$", line)
+            if match:
+                totals[match.group(1)] = totals.get(match.group(1), 0.0) + float(match.group(2))
+        return totals
+
+    def stop(self):
+        if self.running():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._log.close()
+
+
+async def _wait_for(condition, timeout: float, interval: float = 0.05) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(interval)
+    return condition()
+
+
+async def run_load_test(options: LoadTestOptions) -> Dict[str, Any]:
+    """
+    Run one load test scenario
+
+    Args:
+        options: Scenario to run
+
+    Returns:
+        Report with throughput, latency, loss and memory figures
+    """
+    broker = EmbeddedBroker()
+    broker_port = broker.start()
+    odoo = FakeOdoo(latency=options.odoo_latency_ms / 1000.0)
+    odoo_port = await odoo.start()
+
+    with tempfile.TemporaryDirectory(prefix="iiot_load_test_") as workdir:
+        bridge = BridgeProcess(broker_port, odoo_port, workdir, options.bridge_env)
+        bridge.start()
+        try:
+            if not await _wait_for(lambda: broker.subscription_count() > 0 or not bridge.running(), 30):
+                raise RuntimeError("Bridge did not subscribe to the broker within 30 seconds")
+            if not bridge.running():
+                with open(bridge.log_path, errors="replace") as log:
+                    raise RuntimeError(f"Bridge exited during startup:\n{log.read()[-2000:]}")
+            idle_rss = bridge.sample_rss()
+
+            devices = [
+                SimulatedDevice(f"device_{index:05d}", index % options.companies + 1,
+                                options.rate, options.payload_size)
+                for index in range(options.devices)
+            ]
+            started = time.time()
+            stop_at = started + options.duration
+            device_tasks = [asyncio.create_task(device.run(broker_port, stop_at)) for device in devices]
+
+            while not all(task.done() for task in device_tasks):
+                bridge.sample_rss()
+                await asyncio.sleep(0.5)
+            await asyncio.gather(*device_tasks)
+            sent = sum(device.sent for device in devices)
+
+            await _wait_for(lambda: odoo.received >= sent, options.drain_timeout)
+            bridge.sample_rss()
+            metrics = await bridge.metrics()
+        finally:
+            bridge.stop()
+            await odoo.stop()
+            broker.stop()
+
+    steady = [latency for received_at, latency in odoo.latencies
+              if started + options.warmup <= received_at <= stop_at]
+    window = max(0.001, options.duration - options.warmup)
+
+    def milliseconds(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "devices": options.devices,
+        "rate_per_device": options.rate,
+        "payload_size": options.payload_size,
+        "duration": options.duration,
+        "sent": sent,
+        "received": odoo.received,
+        "lost": max(0, sent - odoo.received),
+        "offered_rate": round(sent / options.duration, 1),
+        "sustained_rate": round(len(steady) / window, 1),
+        "odoo_requests": odoo.requests,
+        "latency_p50_ms": milliseconds(_percentile(steady, 50)),
+        "latency_p99_ms": milliseconds(_percentile(steady, 99)),
+        "latency_max_ms": milliseconds(max(steady) if steady else None),
+        "bridge_rss_idle_mb": round(idle_rss / 2 ** 20, 1) if idle_rss else None,
+        "bridge_rss_peak_mb": round(bridge.peak_rss / 2 ** 20, 1) if bridge.peak_rss else None,
+        "bridge_failed": metrics.get("iiot_bridge_messages_failed_total", 0),
+        "bridge_spooled": metrics.get("iiot_bridge_messages_spooled_total", 0),
+        "bridge_dropped": metrics.get("iiot_bridge_messages_dropped_total", 0),
+    }
+
+
+def check_thresholds(report: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    """Compare a report with the CI thresholds and return the violations"""
+    violations = []
+    if args.min_rate is not None and report["sustained_rate"] < args.min_rate:
+        violations.append(f"sustained rate {report['sustained_rate']} msg/s below {args.min_rate}")
+    if args.max_p99_ms is not None and (report["latency_p99_ms"] is None or report["latency_p99_ms"] > args.max_p99_ms):
+        violations.append(f"p99 latency {report['latency_p99_ms']} ms above {args.max_p99_ms}")
+    if args.max_rss_mb is not None and (report["bridge_rss_peak_mb"] or 0) > args.max_rss_mb:
+        violations.append(f"bridge RSS {report['bridge_rss_peak_mb']} MB above {args.max_rss_mb}")
+    if args.max_lost is not None and report["lost"] > args.max_lost:
+        violations.append(f"{report['lost']} messages lost, more than {args.max_lost}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test for the IIoT MQTT bridge")
+    parser.add_argument("--devices", type=int, default=100, help="number of simulated devices")
+    parser.add_argument("--rate", type=float, default=1.0, help="messages per second per device")
+    parser.add_argument("--payload-size", type=int, default=128, help="approximate payload size in bytes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of publishing")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds excluded from rate and latency")
+    parser.add_argument("--companies", type=int, default=1, help="number of companies the devices belong to")
+    parser.add_argument("--odoo-latency-ms", type=float, default=0.0, help="simulated Odoo time per request")
+    parser.add_argument("--bridge-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra bridge setting, e.g. TELEMETRY_BATCH_MAX_DELAY_MS=50")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--min-rate", type=float, help="fail below this sustained msgs/sec")
+    parser.add_argument("--max-p99-ms", type=float, help="fail above this p99 latency")
+    parser.add_argument("--max-rss-mb", type=float, help="fail above this bridge peak RSS")
+    parser.add_argument("--max-lost", type=int, default=0, help="fail above this number of lost messages")
+    args = parser.parse_args()
+
+    options = LoadTestOptions(
+        devices=args.devices, rate=args.rate, payload_size=args.payload_size, duration=args.duration,
+        warmup=min(args.warmup, args.duration / 2), companies=max(1, args.companies),
+        odoo_latency_ms=args.odoo_latency_ms,
+        bridge_env=dict(item.split("=", 1) for item in args.bridge_env),
+    )
+    report = asyncio.run(run_load_test(options))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"devices {report['devices']} x {report['rate_per_device']} msg/s, "
+              f"payload ~{report['payload_size']} B, {report['duration']} s")
+        print(f"offered:   {report['offered_rate']} msg/s ({report['sent']} sent)")
+        print(f"sustained: {report['sustained_rate']} msg/s received by Odoo in "
+              f"{report['odoo_requests']} requests")
+        print(f"lost:      {report['lost']}")
+        print(f"latency:   p50 {report['latency_p50_ms']} ms, p99 {report['latency_p99_ms']} ms, "
+              f"max {report['latency_max_ms']} ms")
+        print(f"bridge:    RSS idle {report['bridge_rss_idle_mb']} MB, peak {report['bridge_rss_peak_mb']} MB; "
+              f"failed {report['bridge_failed']:.0f}, spooled {report['bridge_spooled']:.0f}, "
+              f"dropped {report['bridge_dropped']:.0f}")
+
+    violations = check_thresholds(report, args)
+    for violation in violations:
+        print(f"FAIL: {violation}", file=sys.stderr)
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
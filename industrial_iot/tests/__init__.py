@@ -1,4 +1,7 @@
 from . import test_iiot_device
 from . import test_iiot_device_profile
 from . import test_iiot_telemetry_rule
-from . import test_iiot_firmware
\ No newline at end of file
+from . import test_iiot_firmware
+from . import test_iiot_message_receipt
+from . import test_iiot_ota_campaign
+from . import test_iiot_command_outbox
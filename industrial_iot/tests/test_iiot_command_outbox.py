@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from unittest.mock import MagicMock, patch
+from datetime import timedelta
+import json
+
+
+@tagged('industrial_iot', 'iiot_command_outbox', 'post_install', '-at_install')
+class TestIiotCommandOutbox(TransactionCase):
+    """Test suite for the IiotCommandOutbox model"""
+
+    def setUp(self):
+        super().setUp()
+        self.Outbox = self.env['iiot.command.outbox']
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_bridge_url', 'http://bridge.test')
+        self.device_profile = self.env['iiot.device.profile'].create({
+            'name': 'Test Pump Profile',
+            'code': 'pump_v1',
+            'command_topic_template': 'cmd/{device}/request',
+            'command_template': '{"action": "{{ action }}", "params": {{ params | tojson }}}',
+        })
+        self.devices = self.env['iiot.device'].create([{
+            'serial_number': f'SN-OUTBOX-{index}',
+            'device_id': f'pump_{index}',
+            'profile_id': self.device_profile.id,
+        } for index in range(3)])
+
+        self.session = MagicMock()
+        patcher = patch('odoo.addons.industrial_iot.models.iiot_command_outbox._get_sender',
+                        return_value=(MagicMock(), self.session))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _queue(self, device, command_id):
+        return self.Outbox.create({
+            'device_id': device.id,
+            'action': 'power_on',
+            'command_id': command_id,
+            'topic': f'cmd/{device.device_id}/request',
+            'payload': json.dumps({'action': 'power_on'}),
+        })
+
+    def _bridge_results(self, statuses):
+        response = MagicMock()
+        response.json.return_value = {'status': 'success', 'results': [
+            {'command_id': command_id, 'status': status} for command_id, status in statuses.items()
+        ]}
+        self.session.post.return_value = response
+
+    def test_dispatch_publishes_batches(self):
+        """Test that pending commands are published in one request per batch"""
+        commands = self._queue(self.devices[0], 'cmd_1') | self._queue(self.devices[1], 'cmd_2') \
+            | self._queue(self.devices[2], 'cmd_3')
+        self._bridge_results({'cmd_1': 'success', 'cmd_2': 'success', 'cmd_3': 'success'})
+
+        self.assertEqual(self.Outbox._dispatch_pending(batch_size=2, auto_commit=False), 3)
+
+        self.assertEqual(self.session.post.call_count, 2)
+        url = self.session.post.call_args_list[0].args[0]
+        self.assertEqual(url, 'http://bridge.test/publish/batch')
+        messages = self.session.post.call_args_list[0].kwargs['json']['messages']
+        self.assertEqual([message['command_id'] for message in messages], ['cmd_1', 'cmd_2'])
+        self.assertEqual(messages[0]['device_id'], 'pump_0')
+        self.assertEqual(set(commands.mapped('state')), {'sent'})
+        self.assertTrue(all(self.devices.mapped('last_command')))
+
+    def test_dispatch_retries_failures(self):
+        """Test that failed commands are retried with a backoff, then given up"""
+        self.env['ir.config_parameter'].sudo().set_param('iiot.command_max_attempts', '2')
+        sent = self._queue(self.devices[0], 'cmd_1')
+        failed = self._queue(self.devices[1], 'cmd_2')
+        self._bridge_results({'cmd_1': 'success', 'cmd_2': 'error'})
+
+        self.Outbox._dispatch_pending(auto_commit=False)
+        self.assertEqual(sent.state, 'sent')
+        self.assertEqual((failed.state, failed.attempts), ('pending', 1))
+        self.assertGreater(failed.next_attempt, fields.Datetime.now())
+
+        # Not due yet
+        self.assertEqual(self.Outbox._dispatch_pending(auto_commit=False), 0)
+        self.assertEqual(self.session.post.call_count, 1)
+
+        # The bridge cannot be reached on the last attempt
+        failed.next_attempt = fields.Datetime.now() - timedelta(seconds=1)
+        self.session.post.side_effect = ConnectionError('bridge down')
+        self.Outbox._dispatch_pending(auto_commit=False)
+        self.assertEqual((failed.state, failed.attempts), ('failed', 2))
+        self.assertIn('bridge down', failed.last_error)
+
+        failed.action_retry()
+        self.assertEqual((failed.state, failed.attempts), ('pending', 0))
+
+    def test_command_template_cache(self):
+        """Test that the compiled command template is cached per profile and refreshed on change"""
+        Profile = self.env['iiot.device.profile']
+        template = Profile._get_command_template(self.device_profile.id)
+        self.assertIs(Profile._get_command_template(self.device_profile.id), template)
+
+        self.device_profile.command_template = '{"cmd": "{{ action }}"}'
+        topic, payload = self.devices[0]._prepare_command('reboot', {})
+        self.assertEqual(payload, {'cmd': 'reboot'})
+        self.assertEqual(topic, f'company_{self.env.company.id}/cmd/pump_0/request')
@@ -199,10 +199,107 @@ class TestIiotDevice(TransactionCase):
         # This should not raise an exception even if there are no rules
         device.process_telemetry_data(telemetry_data)
 
-        # Check that last telemetry time was updated
+        # Check that last telemetry time was updated by the heartbeat flush
+        self.assertFalse(device.last_telemetry)
+        self.assertEqual(self.env['iiot.device'].flush_heartbeats(), 1)
         self.assertIsNotNone(device.last_telemetry)
         self.assertEqual(device.connection_status, 'online')
 
+    def test_flush_heartbeats(self):
+        """Test that heartbeats are coalesced per device and do not override newer presence changes"""
+        devices = self.env['iiot.device'].create([{
+            'serial_number': f'SN-HEARTBEAT-{index}',
+            'device_id': f'test_heartbeat_{index}',
+            'profile_id': self.device_profile.id,
+        } for index in range(2)])
+        last_update = devices[0].last_update
+
+        for _ in range(5):
+            devices[0].process_telemetry_data({'temperature': 20.0})
+        devices[1].process_telemetry_data({'temperature': 20.0})
+        # The bridge reported the second device offline after its last message
+        self.env['iiot.device'].apply_presence_changes([
+            {'device_id': 'test_heartbeat_1', 'status': 'offline', 'at': '2999-01-01T00:00:00'},
+        ])
+
+        self.assertEqual(self.env['iiot.device'].flush_heartbeats(), 2)
+        self.assertEqual(devices.mapped('connection_status'), ['online', 'offline'])
+        self.assertTrue(all(devices.mapped('last_telemetry')))
+        self.assertEqual(devices[0].last_update, last_update)
+
+        # Nothing is left to flush
+        self.assertEqual(self.env['iiot.device'].flush_heartbeats(), 0)
+
+    def test_apply_presence_changes(self):
+        """Test that presence changes from the MQTT bridge are applied in bulk and in order"""
+        devices = self.env['iiot.device'].create([{
+            'serial_number': f'SN-PRESENCE-{index}',
+            'device_id': f'test_presence_{index}',
+            'profile_id': self.device_profile.id,
+        } for index in range(3)])
+
+        updated = self.env['iiot.device'].apply_presence_changes([
+            {'device_id': 'test_presence_0', 'status': 'online', 'at': '2024-01-01T10:00:00'},
+            {'device_id': 'test_presence_1', 'status': 'online', 'at': '2024-01-01T10:00:00'},
+            {'device_id': 'test_presence_1', 'status': 'offline', 'at': '2024-01-01T10:00:05'},
+            {'device_id': 'unknown_device', 'status': 'online', 'at': '2024-01-01T10:00:00'},
+            {'device_id': 'test_presence_2', 'status': 'error', 'at': '2024-01-01T10:00:00'},
+        ])
+        self.assertEqual(updated, 2)
+        self.assertEqual(devices.mapped('connection_status'), ['online', 'offline', 'offline'])
+        self.assertEqual(str(devices[1].last_connection_change), '2024-01-01 10:00:05')
+
+        # A change older than the recorded one is ignored
+        self.env['iiot.device'].apply_presence_changes([
+            {'device_id': 'test_presence_0', 'status': 'offline', 'at': '2024-01-01T09:59:00'},
+        ])
+        self.assertEqual(devices[0].connection_status, 'online')
+
+    def test_device_lookup_cache(self):
+        """Test that device lookups are served from the cache and invalidated on relevant changes"""
+        Device = self.env['iiot.device']
+        self.assertFalse(Device._get_by_device_id('test_lookup'))
+
+        # Unknown device IDs are cached until a device is created
+        device = Device.create({
+            'serial_number': 'SN-LOOKUP',
+            'device_id': 'test_lookup',
+            'profile_id': self.device_profile.id,
+        })
+        self.assertEqual(Device._get_by_device_id('test_lookup'), device)
+        self.assertEqual(Device._get_by_device_id('test_lookup').env.company, device.company_id)
+
+        queries = self.cr.sql_log_count
+        self.assertEqual(Device._lookup_device('test_lookup'), (device.id, self.device_profile.id, device.company_id.id))
+        self.assertEqual(self.cr.sql_log_count, queries)
+
+        # Telemetry writes keep the cache, renaming the device clears it
+        device.process_telemetry_data({'temperature': 20.0})
+        queries = self.cr.sql_log_count
+        Device._lookup_device('test_lookup')
+        self.assertEqual(self.cr.sql_log_count, queries)
+
+        device.write({'device_id': 'test_lookup_renamed'})
+        self.assertFalse(Device._get_by_device_id('test_lookup'))
+        self.assertEqual(Device._get_by_device_id('test_lookup_renamed'), device)
+
+        device.unlink()
+        self.assertFalse(Device._get_by_device_id('test_lookup_renamed'))
+
+    def test_broker_settings_cache(self):
+        """Test that broker settings are cached until a system parameter changes"""
+        Device = self.env['iiot.device']
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_host', 'broker.test')
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_port', '1883')
+        self.assertEqual(Device._get_broker_settings()[:2], ('broker.test', 1883))
+
+        queries = self.cr.sql_log_count
+        Device._get_broker_settings()
+        self.assertEqual(self.cr.sql_log_count, queries)
+
+        self.env['ir.config_parameter'].sudo().set_param('iiot.mqtt_use_tls', 'False')
+        self.assertEqual(Device._get_broker_settings(), ('broker.test', 1883, False))
+
     def test_write_updates_last_update(self):
         """Test that write method updates last_update field"""
         device = self.env['iiot.device'].create({
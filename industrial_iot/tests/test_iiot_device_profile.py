@@ -128,4 +128,32 @@ class TestIiotDeviceProfile(TransactionCase):
         profiles = self.env['iiot.device.profile'].search([], order='code')
         profile_codes = [p.code for p in profiles]
 
-        self.assertEqual(profile_codes, ['aaa', 'bbb', 'ccc'])
\ No newline at end of file
+        self.assertEqual(profile_codes, ['aaa', 'bbb', 'ccc'])
+
+    def test_device_profile_payload_encoding(self):
+        """Test that profiles default to JSON payloads and accept binary encodings"""
+        profile = self.env['iiot.device.profile'].create({
+            'name': 'Test Default Encoding Profile',
+            'code': 'default_encoding',
+        })
+        self.assertEqual(profile.payload_encoding, 'json')
+
+        profile.payload_encoding = 'cbor'
+        self.assertEqual(profile.payload_encoding, 'cbor')
+
+    def test_device_profile_telemetry_filter(self):
+        """Test that telemetry filter settings default to off and reject invalid values"""
+        profile = self.env['iiot.device.profile'].create({
+            'name': 'Test Filter Profile',
+            'code': 'filter_profile',
+        })
+        self.assertEqual(profile.deadband_type, 'none')
+        self.assertEqual((profile.min_interval, profile.max_silence), (0, 0))
+
+        profile.write({'deadband_type': 'percent', 'deadband_value': 2.5, 'min_interval': 5, 'max_silence': 300})
+        self.assertEqual(profile.deadband_value, 2.5)
+
+        with self.assertRaises(ValidationError):
+            profile.deadband_value = -1
+        with self.assertRaises(ValidationError):
+            profile.write({'min_interval': 600, 'max_silence': 300})
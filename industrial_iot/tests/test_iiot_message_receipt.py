@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('industrial_iot', 'iiot_message_receipt', 'post_install', '-at_install')
+class TestIiotMessageReceipt(TransactionCase):
+    """Test suite for the IiotMessageReceipt model"""
+
+    def setUp(self):
+        super().setUp()
+        self.Receipt = self.env['iiot.message.receipt']
+
+    def test_claim_returns_new_ids(self):
+        """Test that unseen message ids are claimed"""
+        claimed = self.Receipt.claim(['msg_1', 'msg_2'])
+        self.assertEqual(claimed, {'msg_1', 'msg_2'})
+        self.assertEqual(self.Receipt.search_count([('message_id', 'in', ['msg_1', 'msg_2'])]), 2)
+
+    def test_claim_skips_duplicates(self):
+        """Test that ids claimed by an earlier request are reported as duplicates"""
+        self.Receipt.claim(['msg_1'])
+        claimed = self.Receipt.claim(['msg_1', 'msg_3'])
+        self.assertEqual(claimed, {'msg_3'})
+
+    def test_claim_ignores_empty_ids(self):
+        """Test that messages without an id are never claimed"""
+        self.assertEqual(self.Receipt.claim([None, '', False]), set())
+
+    def test_release_allows_retry(self):
+        """Test that a released id can be claimed again by a retried request"""
+        self.Receipt.claim(['msg_1', 'msg_2'])
+        self.Receipt.release(['msg_1', None])
+        self.assertEqual(self.Receipt.claim(['msg_1', 'msg_2']), {'msg_1'})
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from odoo.exceptions import ValidationError
+
+
+@tagged('industrial_iot', 'iiot_ota_campaign', 'post_install', '-at_install')
+class TestIiotOtaCampaign(TransactionCase):
+    """Test suite for the IiotOtaCampaign model"""
+
+    def setUp(self):
+        super().setUp()
+
+        self.device_profile = self.env['iiot.device.profile'].create({
+            'name': 'Test Sensor Profile',
+            'code': 'sensor_v1',
+            'telemetry_topic_template': 'telemetry/{device}/data',
+            'command_topic_template': 'cmd/{device}/request',
+            'ota_notify_topic_template': 'ota/{device}/notify',
+            'ota_status_topic_template': 'ota/{device}/status',
+        })
+        self.firmware = self.env['iiot.firmware'].create({
+            'version': '2.0.0',
+            'profile_code': 'sensor_v1',
+            'url': 'https://example.com/sensor_v2.bin',
+        })
+
+        # 20 devices on site A, 5 on site B
+        self.devices = self.env['iiot.device'].create([{
+            'serial_number': f'OTA-SN-{index:03d}',
+            'device_id': f'ota_device_{index:03d}',
+            'profile_id': self.device_profile.id,
+            'site': 'A' if index < 20 else 'B',
+        } for index in range(25)])
+
+        # Publishing goes through the MQTT bridge, which is not running in tests
+        patcher = patch.object(self.registry['iiot.device'], 'send_command', return_value=True)
+        self.send_command = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_campaign(self, **vals):
+        return self.env['iiot.ota.campaign'].create(dict({
+            'name': 'Sensor v2 rollout',
+            'firmware_id': self.firmware.id,
+            'device_ids': [(6, 0, self.devices.ids)],
+            'canary_size': 2,
+            'wave_percentages': '50,100',
+            'max_concurrent_per_site': 3,
+            'failure_threshold': 20.0,
+        }, **vals))
+
+    def test_campaign_waves(self):
+        """Test that devices are split into a canary wave and cumulative percentage steps"""
+        campaign = self._create_campaign()
+        campaign.action_start()
+
+        self.assertEqual(campaign.state, 'running')
+        self.assertEqual(campaign.wave_count, 3)
+        waves = [campaign.update_ids.filtered(lambda u: u.wave == wave) for wave in (1, 2, 3)]
+        self.assertEqual([len(updates) for updates in waves], [2, 11, 12])
+        self.assertEqual(campaign.total_count, 25)
+        self.assertEqual(campaign.pending_count, 25)
+
+    def test_campaign_wave_steps_validation(self):
+        """Test that wave steps must be increasing percentages"""
+        with self.assertRaises(ValidationError):
+            self._create_campaign(wave_percentages='50,20')
+        with self.assertRaises(ValidationError):
+            self._create_campaign(wave_percentages='ten')
+
+    def test_campaign_site_concurrency(self):
+        """Test that only the canary is sent first and downloads per site stay under the limit"""
+        campaign = self._create_campaign()
+        campaign.action_start()
+        campaign._run_step()
+
+        sent = campaign.update_ids.filtered(lambda u: u.status == 'sent')
+        self.assertEqual(sent.mapped('wave'), [1, 1])
+        self.assertEqual(self.send_command.call_count, 2)
+
+        # Canary succeeds, the next wave starts and is throttled per site
+        sent.update_status_from_device('success', progress=100.0)
+        campaign._run_step()
+        self.assertEqual(campaign.current_wave, 2)
+        active = campaign.update_ids.filtered(lambda u: u.status == 'sent')
+        self.assertEqual(len(active.filtered(lambda u: u.site == 'A')), 3)
+        self.assertEqual(campaign.active_count, len(active))
+
+        # No free slot on site A until a download finishes
+        campaign._run_step()
+        self.assertEqual(len(campaign.update_ids.filtered(lambda u: u.status == 'sent' and u.site == 'A')), 3)
+
+    def test_campaign_pauses_on_failures(self):
+        """Test that the campaign pauses itself when the failure rate crosses the threshold"""
+        campaign = self._create_campaign()
+        campaign.action_start()
+        campaign._run_step()
+
+        canary = campaign.update_ids.filtered(lambda u: u.status == 'sent')
+        canary[0].update_status_from_device('success', progress=100.0)
+        canary[1].update_status_from_device('failed', error_message='Checksum mismatch')
+        campaign._run_step()
+
+        self.assertEqual(campaign.state, 'paused')
+        self.assertEqual(campaign.failure_rate, 50.0)
+        self.assertEqual(campaign.current_wave, 1)
+        self.assertFalse(campaign.update_ids.filtered(lambda u: u.wave == 2 and u.status != 'pending'))
+
+    def test_campaign_progress_and_completion(self):
+        """Test that progress is aggregated from the device updates and the campaign completes"""
+        campaign = self._create_campaign(max_concurrent_per_site=100)
+        campaign.action_start()
+        campaign._run_step()
+
+        canary = campaign.update_ids.filtered(lambda u: u.status == 'sent')
+        canary[0].update_status_from_device('downloading', progress=50.0)
+        campaign._refresh_progress()
+        self.assertAlmostEqual(campaign.progress, 2.0)
+
+        for _wave in range(3):
+            campaign.update_ids.filtered(lambda u: u.status in ('sent', 'downloading')).update_status_from_device(
+                'success', progress=100.0
+            )
+            campaign._run_step()
+
+        self.assertEqual(campaign.state, 'done')
+        self.assertEqual(campaign.success_count, 25)
+        self.assertEqual(campaign.progress, 100.0)
+
+    def test_campaign_cancel(self):
+        """Test that cancelling a campaign cancels the updates not sent yet"""
+        campaign = self._create_campaign()
+        campaign.action_start()
+        campaign._run_step()
+        campaign.action_cancel()
+
+        self.assertEqual(campaign.state, 'cancelled')
+        self.assertEqual(campaign.pending_count, 0)
+        self.assertEqual(len(campaign.update_ids.filtered(lambda u: u.status == 'sent')), 2)
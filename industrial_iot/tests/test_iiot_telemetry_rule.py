@@ -198,4 +198,89 @@ class TestIiotTelemetryRule(TransactionCase):
                 'target_model': 'maintenance.equipment',
                 'target_domain': "[('id', '=', 1)]",
                 'target_field': 'x_data',
-            })
\ No newline at end of file
+            })
+
+    def _create_rules(self, count):
+        """Create telemetry rules writing device readings to the firmware_version of the device itself"""
+        return self.env['iiot.telemetry.rule'].create([{
+            'name': f'Reading {index}',
+            'profile_id': self.device_profile.id,
+            'json_path': f'$.readings[{index}]',
+            'target_model': 'iiot.device',
+            'target_domain': "[('id', '=', {{ device_id }})]",
+            'target_field': 'firmware_version' if index == 0 else 'live_stream_url',
+            'sequence': index,
+        } for index in range(count)])
+
+    def _message_query_count(self, device, telemetry_data):
+        """Number of queries to process one telemetry message, with the rule plan already compiled"""
+        device.process_telemetry_data(telemetry_data)
+        self.env.flush_all()
+        count = self.env.cr.sql_log_count
+        device.process_telemetry_data(telemetry_data)
+        self.env.flush_all()
+        return self.env.cr.sql_log_count - count
+
+    def test_telemetry_plan_queries(self):
+        """Test that the compiled rule plan processes a message with a constant number of queries"""
+        device = self.env['iiot.device'].create({
+            'serial_number': 'SN-PLAN-1',
+            'device_id': 'test_plan_1',
+            'profile_id': self.device_profile.id,
+        })
+        telemetry_data = {'readings': ['v2.0', 'rtsp://cam/1', 'rtsp://cam/2', 'rtsp://cam/3', 'rtsp://cam/4', 'rtsp://cam/5']}
+
+        rules = self._create_rules(1)
+        single_rule_count = self._message_query_count(device, telemetry_data)
+        rules.unlink()
+        self._create_rules(6)
+        many_rules_count = self._message_query_count(device, telemetry_data)
+
+        # One search for the shared target and one UPDATE for the device in its savepoint,
+        # whatever the number of rules
+        self.assertLessEqual(single_rule_count, 5)
+        self.assertEqual(many_rules_count, single_rule_count)
+        self.assertEqual(device.firmware_version, 'v2.0')
+        # Rules writing the same field are applied in sequence order
+        self.assertEqual(device.live_stream_url, 'rtsp://cam/5')
+
+    def test_telemetry_plan_invalidation(self):
+        """Test that the compiled rule plan follows rule changes"""
+        Rule = self.env['iiot.telemetry.rule']
+        rule = self._create_rules(1)
+        plan = Rule._get_telemetry_plan(self.device_profile.id)
+        self.assertEqual(len(plan), 1)
+        self.assertEqual(plan[0].rules[0].field, 'firmware_version')
+        self.assertEqual(Rule._instantiate_domain(plan[0].domain, 42), [('id', '=', 42)])
+        self.assertIs(Rule._get_telemetry_plan(self.device_profile.id), plan)
+
+        rule.target_field = 'live_stream_url'
+        self.assertEqual(Rule._get_telemetry_plan(self.device_profile.id)[0].rules[0].field, 'live_stream_url')
+
+        rule.active = False
+        self.assertEqual(Rule._get_telemetry_plan(self.device_profile.id), ())
+
+    def test_quoted_device_id_domain(self):
+        """Test that quoted and embedded device placeholders keep their previous meaning"""
+        Rule = self.env['iiot.telemetry.rule']
+        rule = self._create_rules(1)
+        rule.target_domain = "[('name', '=', '{{ device_id }}')]"
+        self.assertEqual(Rule._instantiate_domain(rule._compile_target_domain(), 7), [('name', '=', '7')])
+
+        rule.target_domain = "[('name', '=', 'device-{{ device_id }}')]"
+        self.assertIsNone(rule._compile_target_domain())
+        self.assertEqual(rule.evaluate_domain(7), [('name', '=', 'device-7')])
+
+    def test_bad_value_keeps_other_fields(self):
+        """Test that a value failing to write does not discard the other fields of the same target"""
+        device = self.env['iiot.device'].create({
+            'serial_number': 'SN-PLAN-2',
+            'device_id': 'test_plan_2',
+            'profile_id': self.device_profile.id,
+        })
+        rules = self._create_rules(2)
+        rules[1].target_field = 'last_command'
+
+        device.process_telemetry_data({'readings': ['v3.0', 'not a date']})
+        self.assertEqual(device.firmware_version, 'v3.0')
+        self.assertFalse(device.last_command)